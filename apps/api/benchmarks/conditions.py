@@ -0,0 +1,141 @@
+"""Compare full and incremental UserConditions extraction by session length.
+
+For each session length the benchmark measures one refresh after the latest
+exchange, re-reading the whole conversation (full) or sending only the new
+turns plus the current conditions (incremental), and the total cost of
+refreshing after every exchange of the session. Prompt tokens are estimated
+the way context.py does; the fake model's latency grows with prompt size.
+Run from apps/api:
+
+    python -m benchmarks.conditions --turns 10 50 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from contextlib import ExitStack
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from .fakes import structured_output
+
+TOPICS = (
+    "I live in London with my partner and our two kids.",
+    "We're thinking about Portugal, maybe Lisbon or Porto.",
+    "Our budget is around 3000 euros a month.",
+    "What about schools for the children?",
+    "How does healthcare work there?",
+    "I work remotely as a designer.",
+)
+
+
+def conversation(turns: int) -> list[dict]:
+    messages = []
+    for i in range(turns):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": TOPICS[(i // 2) % len(TOPICS)]})
+        else:
+            messages.append({"role": "assistant", "content": (
+                "That's a common question. Portugal has a mix of public and private "
+                "options, and many expats combine both depending on their needs."
+            )})
+    return messages
+
+
+class PromptMeter:
+    """A fake model that charges latency per prompt token and records tokens."""
+
+    def __init__(self, base_latency: float, seconds_per_1k: float):
+        self.base_latency = base_latency
+        self.seconds_per_1k = seconds_per_1k
+        self.tokens = 0
+
+    def model(self) -> FunctionModel:
+        from src.context import estimate_tokens
+
+        async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+            text = "\n".join(
+                str(part.content) for message in messages if isinstance(message, ModelRequest)
+                for part in message.parts if hasattr(part, "content")
+            )
+            tokens = estimate_tokens(text)
+            self.tokens += tokens
+            await asyncio.sleep(self.base_latency + self.seconds_per_1k * tokens / 1000)
+            return ModelResponse(parts=[structured_output(messages, info)])
+
+        return FunctionModel(respond)
+
+
+async def refresh(meter: PromptMeter, func) -> tuple[int, float]:
+    """Tokens and seconds for one refresh."""
+    meter.tokens = 0
+    start = time.perf_counter()
+    await func()
+    return meter.tokens, time.perf_counter() - start
+
+
+async def run(turn_counts: list[int], meter: PromptMeter) -> None:
+    from src import conditions
+    from src.agents import extract_user_conditions
+
+    print(f"{'turns':>6} {'mode':>12} {'tokens':>8} {'latency ms':>11} "
+          f"{'session tokens':>15} {'session s':>10}")
+    for turns in turn_counts:
+        messages = conversation(turns)
+
+        # One refresh after the latest exchange
+        full_tokens, full_seconds = await refresh(
+            meter, lambda: extract_user_conditions(messages)
+        )
+        conditions.materialized.clear()
+        await conditions.get_user_conditions("bench", "s", messages[:-2])
+        inc_tokens, inc_seconds = await refresh(
+            meter, lambda: conditions.get_user_conditions("bench", "s", messages)
+        )
+
+        # Refreshing after every exchange over the whole session
+        session = {"full": [0, 0.0], "incremental": [0, 0.0]}
+        conditions.materialized.clear()
+        for end in range(2, turns + 1, 2):
+            for mode, func in (
+                ("full", lambda: extract_user_conditions(messages[:end])),
+                ("incremental",
+                 lambda: conditions.get_user_conditions("bench", "s", messages[:end])),
+            ):
+                tokens, seconds = await refresh(meter, func)
+                session[mode][0] += tokens
+                session[mode][1] += seconds
+
+        for mode, tokens, seconds in (
+            ("full", full_tokens, full_seconds),
+            ("incremental", inc_tokens, inc_seconds),
+        ):
+            total_tokens, total_seconds = session[mode]
+            print(f"{turns:>6} {mode:>12} {tokens:>8} {seconds * 1000:>11.1f} "
+                  f"{total_tokens:>15} {total_seconds:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--model-latency", type=float, default=0.02,
+                        help="fake model base latency in seconds")
+    parser.add_argument("--seconds-per-1k-tokens", type=float, default=0.01,
+                        help="extra fake model latency per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    from src.agents import agent_registry
+
+    meter = PromptMeter(args.model_latency, args.seconds_per_1k_tokens)
+    model = meter.model()
+    with ExitStack() as stack:
+        for name in ("conditions_extractor", "conditions_updater"):
+            stack.enter_context(agent_registry.get(name).override(model=model))
+        asyncio.run(run(args.turns, meter))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Evaluate the fact extraction pre-classifier on labelled messages.
+
+Reports recall (fact-bearing messages sent to extraction), precision and
+the share of model calls skipped at a range of thresholds. Run from
+apps/api:
+
+    python -m benchmarks.fact_gate
+    python -m benchmarks.fact_gate --samples my_samples.jsonl --min-recall 0.97
+
+Each sample is a JSON line: {"text": "...", "has_facts": true}. Exits
+non-zero if recall at the configured threshold is below --min-recall.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from src.fact_gate import FACT_GATE_THRESHOLD, fact_score
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(__file__), "fact_gate_samples.jsonl")
+THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def load_samples(path: str) -> list[tuple[str, bool]]:
+    with open(path) as f:
+        return [
+            (sample["text"], bool(sample["has_facts"]))
+            for sample in map(json.loads, filter(str.strip, f))
+        ]
+
+
+def evaluate(scored: list[tuple[float, bool]], threshold: float) -> dict:
+    """Confusion counts and rates for one threshold."""
+    tp = sum(1 for score, label in scored if label and score >= threshold)
+    fp = sum(1 for score, label in scored if not label and score >= threshold)
+    fn = sum(1 for score, label in scored if label and score < threshold)
+    positives = tp + fn
+    return {
+        "threshold": threshold,
+        "recall": tp / positives if positives else 1.0,
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "skipped": 1 - (tp + fp) / len(scored),
+        "missed": fn,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES, help="labelled JSONL samples")
+    parser.add_argument("--threshold", type=float, default=FACT_GATE_THRESHOLD,
+                        help="threshold to check against --min-recall")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--show-errors", action="store_true",
+                        help="print misclassified samples at --threshold")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    start = time.perf_counter()
+    scored = [(fact_score(text), label) for text, label in samples]
+    per_message = (time.perf_counter() - start) / len(samples)
+
+    print(f"{len(samples)} samples, {sum(label for _, label in samples)} with facts, "
+          f"{per_message * 1e6:.1f} us per message")
+    print(f"{'threshold':>9} {'recall':>7} {'precision':>9} {'skipped':>8} {'missed':>7}")
+    for threshold in sorted(set(THRESHOLDS) | {args.threshold}):
+        row = evaluate(scored, threshold)
+        marker = " <" if threshold == args.threshold else ""
+        print(f"{threshold:>9.2f} {row['recall']:>7.1%} {row['precision']:>9.1%} "
+              f"{row['skipped']:>8.1%} {row['missed']:>7}{marker}")
+
+    if args.show_errors:
+        for (text, label), (score, _) in zip(samples, scored):
+            if label != (score >= args.threshold):
+                kind = "missed" if label else "extra"
+                print(f"{kind:>6} {score:.2f} {text}")
+
+    recall = evaluate(scored, args.threshold)["recall"]
+    if recall < args.min_recall:
+        print(f"Recall {recall:.1%} at threshold {args.threshold} is below {args.min_recall:.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
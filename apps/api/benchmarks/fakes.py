@@ -0,0 +1,200 @@
+"""Local stand-ins for SuperMemory, ZEP and the Gemini model.
+
+The fake upstream server implements the endpoints used by memory.py and
+zep.py under /supermemory and /zep. The fake model is a pydantic-ai
+FunctionModel. Both inject configurable latency and error rates.
+"""
+
+import asyncio
+import json
+import random
+import re
+import socket
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+
+@dataclass
+class Fault:
+    """Latency and error injection for one fake dependency."""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    async def delay(self) -> None:
+        wait = self.latency + random.uniform(0, self.jitter)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+REPLY = (
+    "Portugal is a popular choice for relocation thanks to its mild climate, "
+    "reasonable cost of living and the D7 passive income visa. Lisbon and Porto "
+    "have large international communities, and healthcare is good value."
+)
+
+FACTS = {
+    "facts": [
+        {"type": "current_location", "value": "London", "confidence": 0.95},
+        {"type": "destination_preference", "value": "Portugal", "confidence": 0.8,
+         "requires_confirmation": True, "context": "considering Portugal"},
+    ],
+    "has_changes": True,
+    "summary": "User lives in London and is considering Portugal.",
+}
+
+CONDITIONS = {
+    "destination_preferences": [
+        {"country": "Portugal", "priority": 8, "reasons": ["climate", "D7 visa"]},
+    ],
+    "family_condition": {"has_partner": True, "has_children": True, "children_ages": [6, 9]},
+    "budget": {"monthly_max": 3000, "currency": "EUR"},
+    "current_location": "London",
+}
+
+ARTICLES = [
+    {"type": "article", "id": f"a{i}", "title": f"Moving to Portugal, part {i}",
+     "slug": f"moving-to-portugal-{i}", "summary": "Visas, costs and healthcare.",
+     "score": 1.0 - i / 10, "tags": ["portugal", "visa"]}
+    for i in range(5)
+]
+
+MEMORIES = [
+    "User mentioned they work remotely as a designer",
+    "User has two children aged 6 and 9",
+]
+
+
+def create_upstream_app(fault: Fault) -> FastAPI:
+    """A FastAPI app implementing the SuperMemory and ZEP endpoints we call."""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        await fault.delay()
+        if fault.should_fail():
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+        return await call_next(request)
+
+    @app.post("/supermemory/memory")
+    async def store_memory() -> dict:
+        return {"status": "stored"}
+
+    @app.get("/supermemory/memory")
+    async def list_memories(offset: int = 0) -> dict:
+        return {"results": MEMORIES[offset:]}
+
+    @app.post("/supermemory/memory/search")
+    async def search_memory() -> dict:
+        return {"results": MEMORIES}
+
+    @app.post("/zep/graphs/{graph_id}/search")
+    async def search_graph(graph_id: str) -> dict:
+        return {"results": ARTICLES}
+
+    @app.get("/zep/graphs/{graph_id}/users/{user_id}")
+    async def get_user_graph(graph_id: str, user_id: str) -> dict:
+        return {"user_id": user_id, "facts": FACTS["facts"]}
+
+    @app.post("/zep/graphs/{graph_id}/users/{user_id}/facts")
+    async def sync_facts(graph_id: str, user_id: str) -> dict:
+        return {"status": "synced"}
+
+    @app.post("/zep/graphs/{graph_id}/users/{user_id}/memory")
+    async def add_memory(graph_id: str, user_id: str) -> dict:
+        return {"status": "stored"}
+
+    return app
+
+
+def structured_output(messages: list[ModelMessage], info: AgentInfo) -> ToolCallPart:
+    """Canned arguments for the agent's output tool.
+
+    Batch extraction gets one result per numbered text in the prompt.
+    """
+    tool = info.output_tools[0]
+    properties = tool.parameters_json_schema.get("properties", {})
+    if "destination_preferences" in properties:
+        return ToolCallPart(tool.name, CONDITIONS)
+    if "results" not in properties:
+        return ToolCallPart(tool.name, FACTS)
+    prompt = " ".join(
+        part.content for message in messages if isinstance(message, ModelRequest)
+        for part in message.parts if isinstance(part, UserPromptPart)
+    )
+    count = len(re.findall(r"^Text \d+:", prompt, re.MULTILINE))
+    return ToolCallPart(tool.name, {"results": [FACTS] * count})
+
+
+def create_model(fault: Fault, token_delay: float = 0.0) -> FunctionModel:
+    """A fake model that answers text prompts and structured-output calls."""
+
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await fault.delay()
+        if fault.should_fail():
+            raise RuntimeError("injected model failure")
+        if info.output_tools:
+            return ModelResponse(parts=[structured_output(messages, info)])
+        return ModelResponse(parts=[TextPart(REPLY)])
+
+    async def stream(messages: list[ModelMessage], info: AgentInfo):
+        await fault.delay()
+        if fault.should_fail():
+            raise RuntimeError("injected model failure")
+        if info.output_tools:
+            call = structured_output(messages, info)
+            yield {0: DeltaToolCall(name=call.tool_name, json_args=json.dumps(call.args))}
+            return
+        for word in REPLY.split(" "):
+            if token_delay:
+                await asyncio.sleep(token_delay)
+            yield word + " "
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+def free_port() -> int:
+    """Pick an unused localhost port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on the current event loop."""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self._task = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def __aenter__(self) -> "BackgroundServer":
+        self._task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.server.should_exit = True
+        await self._task
@@ -0,0 +1,272 @@
+"""Offline load benchmark for the Quest API.
+
+Boots the app against local fake upstreams and a fake model, drives the main
+endpoints at fixed concurrency levels and reports latency percentiles,
+throughput and (optionally) traced memory. Run from apps/api:
+
+    python -m benchmarks.load --concurrency 1 10 50 --requests 200
+    python -m benchmarks.load --json results.json
+    python -m benchmarks.load --compare results.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+
+import httpx
+
+from .fakes import BackgroundServer, Fault, create_model, create_upstream_app, free_port
+
+SCENARIOS = ("chat", "chat_complete", "extract_facts", "extract_facts_batch")
+
+USER_MESSAGE = "I'm moving from London to Portugal with my partner and two kids next spring."
+
+
+@dataclass
+class Result:
+    """Measurements for one scenario at one concurrency level."""
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int = 0
+    seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+    peak_kib: float | None = None
+    retained_kib: float | None = None
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[int(p) - 1]
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario}@{self.concurrency}"
+
+    def summary(self) -> dict:
+        data = asdict(self)
+        del data["latencies"]
+        data.update(
+            throughput=round(self.throughput, 2),
+            p50_ms=round(self.percentile(50) * 1000, 2),
+            p95_ms=round(self.percentile(95) * 1000, 2),
+            p99_ms=round(self.percentile(99) * 1000, 2),
+        )
+        return data
+
+
+def conversation(turns: int) -> list[dict]:
+    """A chat history with ``turns`` earlier exchanges and a new user message."""
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i} about visas and schools."})
+        messages.append({"role": "assistant", "content": f"Answer {i} covering the D7 visa."})
+    messages.append({"role": "user", "content": USER_MESSAGE})
+    return messages
+
+
+def make_requests(
+    client: httpx.AsyncClient, turns: int
+) -> dict[str, Callable[[int], Awaitable[None]]]:
+    """One coroutine factory per scenario; each raises on a failed request."""
+    messages = conversation(turns)
+
+    async def chat(i: int) -> None:
+        body = {"messages": messages, "user_id": f"bench-{i % 50}", "app_type": "relocation"}
+        async with client.stream("POST", "/chat", json=body) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+
+    async def chat_complete(i: int) -> None:
+        body = {"messages": messages, "user_id": f"bench-{i % 50}", "app_type": "relocation"}
+        response = await client.post("/chat/complete", json=body)
+        response.raise_for_status()
+
+    async def extract_facts(i: int) -> None:
+        response = await client.post(
+            "/extract-facts", params={"text": USER_MESSAGE, "user_id": f"bench-{i % 50}"}
+        )
+        response.raise_for_status()
+
+    async def extract_facts_batch(i: int) -> None:
+        items = [{"text": USER_MESSAGE, "user_id": f"bench-{(i + n) % 50}"} for n in range(16)]
+        response = await client.post("/extract-facts/batch", json={"items": items})
+        response.raise_for_status()
+
+    return {
+        "chat": chat,
+        "chat_complete": chat_complete,
+        "extract_facts": extract_facts,
+        "extract_facts_batch": extract_facts_batch,
+    }
+
+
+async def run_scenario(
+    name: str,
+    send: Callable[[int], Awaitable[None]],
+    concurrency: int,
+    total: int,
+    trace_allocations: bool,
+) -> Result:
+    """Send ``total`` requests with at most ``concurrency`` in flight."""
+    result = Result(name, concurrency, total)
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await send(i)
+            except Exception:
+                result.errors += 1
+            result.latencies.append(time.perf_counter() - start)
+
+    if trace_allocations:
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(concurrency):
+            tg.create_task(worker())
+    result.seconds = time.perf_counter() - started
+    if trace_allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result.peak_kib = round((peak - before) / 1024, 1)
+        result.retained_kib = round((current - before) / 1024, 1)
+    return result
+
+
+def print_table(results: list[Result]) -> None:
+    header = (
+        f"{'scenario':<22}{'conc':>6}{'reqs':>7}{'errs':>6}{'rps':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    if any(r.peak_kib is not None for r in results):
+        header += f"{'peak KiB':>11}{'kept KiB':>11}"
+    print(header)
+    for r in results:
+        s = r.summary()
+        line = (
+            f"{r.scenario:<22}{r.concurrency:>6}{r.requests:>7}{r.errors:>6}"
+            f"{s['throughput']:>9.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+        )
+        if r.peak_kib is not None:
+            line += f"{r.peak_kib:>11.1f}{r.retained_kib:>11.1f}"
+        print(line)
+
+
+def compare(results: list[Result], baseline_path: str, tolerance: float) -> list[str]:
+    """Scenarios whose p95 or throughput regressed beyond ``tolerance``."""
+    with open(baseline_path) as f:
+        baseline = {f"{r['scenario']}@{r['concurrency']}": r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r.key)
+        if base is None:
+            continue
+        s = r.summary()
+        if s["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r.key}: p95 {base['p95_ms']}ms -> {s['p95_ms']}ms")
+        if s["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{r.key}: throughput {base['throughput']} -> {s['throughput']} rps")
+    return regressions
+
+
+def configure_environment(upstream_url: str, data_dir: str) -> None:
+    """Point the app at the fake upstreams; must run before importing src.main."""
+    os.environ.update({
+        "SUPERMEMORY_API_URL": f"{upstream_url}/supermemory",
+        "SUPERMEMORY_API_KEY": "bench",
+        "ZEP_API_URL": f"{upstream_url}/zep",
+        "ZEP_API_KEY": "bench",
+        "ZEP_RELOCATION_GRAPH_ID": "bench-relocation",
+        "ZEP_PLACEMENT_GRAPH_ID": "bench-placement",
+        "ZEP_USERS_GRAPH_ID": "bench-users",
+        "ARTICLE_INDEX_DIR": data_dir,
+        "ARTICLE_INDEX_REFRESH_INTERVAL": "0",
+        "MEMORY_MIRROR_ENABLED": "true",
+        "MEMORY_MIRROR_PATH": os.path.join(data_dir, "memory_mirror.db"),
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+
+async def main(args: argparse.Namespace) -> int:
+    upstream_fault = Fault(args.upstream_latency, args.jitter, args.upstream_error_rate)
+    model_fault = Fault(args.model_latency, args.jitter, args.model_error_rate)
+    upstream_port, api_port = free_port(), free_port()
+
+    with tempfile.TemporaryDirectory() as data_dir, ExitStack() as stack:
+        configure_environment(f"http://127.0.0.1:{upstream_port}", data_dir)
+        from src import agents
+        from src.main import app
+
+        model = create_model(model_fault, args.token_delay)
+        for name in agents.agent_registry.names():
+            stack.enter_context(agents.agent_registry.get(name).override(model=model))
+
+        async with BackgroundServer(create_upstream_app(upstream_fault), upstream_port), \
+                BackgroundServer(app, api_port) as api:
+            limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+            async with httpx.AsyncClient(base_url=api.url, timeout=60, limits=limits) as client:
+                requests = make_requests(client, args.turns)
+                results = []
+                for name in args.scenarios:
+                    # Warm caches and connection pools before measuring
+                    await run_scenario(name, requests[name], 4, args.warmup, False)
+                    for concurrency in args.concurrency:
+                        results.append(await run_scenario(
+                            name, requests[name], concurrency, args.requests, args.trace_allocations
+                        ))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": [r.summary() for r in results]}, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="earlier exchanges per chat")
+    parser.add_argument("--upstream-latency", type=float, default=0.02)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--model-latency", type=float, default=0.2)
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--trace-allocations", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
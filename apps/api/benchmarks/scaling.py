@@ -0,0 +1,112 @@
+"""Throughput scaling from 1 to N worker processes on a CPU-bound request mix.
+
+Each worker process runs what a multi-worker deployment does per request,
+minus the network: validate a large ChatRequest body, look the user up in
+the memory search cache (shared across workers in sqlite mode), then build
+and serialize a ChatResponse. Workers start together and run for a fixed
+time; the report shows total requests per second, the speedup over one
+worker and the scaling efficiency. Run from apps/api:
+
+    python -m benchmarks.scaling --workers 1 2 4 8 --backend sqlite
+    python -m benchmarks.scaling --messages 500 --backend local
+
+Scaling is capped by the cores available (os.cpu_count() here).
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from .serialization import chat_body, chat_response
+
+
+def worker(
+    backend: str, path: str, messages: int, users: int, seconds: float,
+    ready: multiprocessing.Barrier, results: multiprocessing.Queue,
+) -> None:
+    from src.cache import AsyncCache
+    from src.responses import FastJSONResponse
+    from src.schemas import ChatRequest
+    from src.shared_state import SharedCache, SharedState
+
+    raw = chat_body(messages)
+    response = chat_response(10)
+    if backend == "sqlite":
+        cache = SharedCache("memory_search", users, 60, SharedState(path))
+    else:
+        cache = AsyncCache("memory_search", users, 60)
+    rng = random.Random(os.getpid())
+
+    async def memories(user_id: str) -> list[str]:
+        return [f"{user_id} lives in Lisbon", f"{user_id} has a budget of 3000 EUR a month"]
+
+    async def run() -> int:
+        count = 0
+        ready.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            request = ChatRequest.model_validate_json(raw)
+            user_id = f"{request.user_id}-{rng.randrange(users)}"
+            await cache.get_or_load(
+                (user_id, "where", 5), lambda: memories(user_id), tags=(f"user:{user_id}",)
+            )
+            FastJSONResponse(response)
+            count += 1
+        return count
+
+    results.put(asyncio.run(run()))
+
+
+def measure(workers: int, args: argparse.Namespace, path: str) -> float:
+    """Requests per second across ``workers`` processes."""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            args.backend, path, args.messages, args.users, args.seconds, ready, results,
+        ))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / args.seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cpus = os.cpu_count() or 1
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({n for n in (1, 2, 4, 8, 16) if n <= cpus} | {cpus}))
+    parser.add_argument("--backend", choices=("local", "sqlite"), default="sqlite",
+                        help="cache state: per process, or shared by the workers")
+    parser.add_argument("--messages", type=int, default=200, help="history length per request")
+    parser.add_argument("--users", type=int, default=1000, help="distinct users looked up")
+    parser.add_argument("--seconds", type=float, default=3.0, help="run time per worker count")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    print(f"{cpus} cores, backend={args.backend}, {args.messages} messages per request")
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'efficiency':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        if args.backend == "sqlite":
+            from src.shared_state import SharedState
+            asyncio.run(SharedState(path).start())
+        baseline = None
+        for workers in args.workers:
+            rps = measure(workers, args, path)
+            baseline = baseline or rps / workers
+            speedup = rps / baseline
+            print(f"{workers:>7} {rps:>10.0f} {speedup:>7.2f}x {speedup / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
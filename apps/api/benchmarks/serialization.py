@@ -0,0 +1,139 @@
+"""Microbenchmark for request parsing and response serialization.
+
+Measures CPU time per request for the old and new code paths as the chat
+history grows. Run from apps/api:
+
+    python -m benchmarks.serialization --messages 10 100 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.routing import APIRoute, serialize_response
+from starlette.responses import JSONResponse
+
+from src.responses import FastJSONResponse
+from src.schemas import (
+    ChatRequest,
+    ChatResponse,
+    ExtractedFact,
+    FactExtractionBatchResponse,
+    FactExtractionResult,
+    FactType,
+    PendingConfirmation,
+)
+
+
+def chat_body(messages: int) -> bytes:
+    """A /chat request body with a history of ``messages`` turns."""
+    turns = [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Turn {i}: what would it cost to move a family of four to Lisbon? " * 3,
+        }
+        for i in range(messages - 1)
+    ]
+    turns.append({"role": "user", "content": "And how long does the D7 visa take?"})
+    return json.dumps({"messages": turns, "user_id": "u1", "app_type": "relocation"}).encode()
+
+
+def parse_before(raw: bytes) -> list[dict]:
+    # Old /chat path: decode to dicts, then re-read every field by hand
+    body = json.loads(raw)
+    messages = body.get("messages", [])
+    last = messages[-1]
+    if last.get("role") != "user":
+        raise ValueError
+    return [{"role": m.get("role", "user"), "content": m.get("content", "")} for m in messages]
+
+
+def parse_after(raw: bytes) -> list[dict]:
+    body = ChatRequest.model_validate_json(raw)
+    if body.messages[-1]["role"] != "user":
+        raise ValueError
+    return body.messages
+
+
+def chat_response(items: int) -> ChatResponse:
+    facts = [
+        ExtractedFact(type=FactType.CUSTOM, value=f"fact {i}", confidence=0.9, context="ctx")
+        for i in range(items)
+    ]
+    pending = [
+        PendingConfirmation(
+            user_id="u1", fact_type=FactType.CUSTOM, new_value=f"fact {i}",
+            confidence=0.6, context="ctx",
+        )
+        for i in range(items)
+    ]
+    return ChatResponse(content="Portugal is a popular choice. " * 20,
+                        extracted_facts=facts, pending_confirmations=pending)
+
+
+def batch_response(items: int) -> FactExtractionBatchResponse:
+    fact = ExtractedFact(type=FactType.CURRENT_LOCATION, value="London", confidence=0.95)
+    return FactExtractionBatchResponse(
+        results=[FactExtractionResult(facts=[fact] * 3, has_changes=True) for _ in range(items)]
+    )
+
+
+def render_before(route: APIRoute) -> Callable[[Any], bytes]:
+    """FastAPI's path for a returned model: validate, dump, then json.dumps."""
+    loop = asyncio.new_event_loop()
+
+    def render(model: Any) -> bytes:
+        content = loop.run_until_complete(
+            serialize_response(field=route.response_field, response_content=model)
+        )
+        return JSONResponse(content).body
+
+    return render
+
+
+def render_after(model: Any) -> bytes:
+    return FastJSONResponse(model).body
+
+
+def cpu_per_call(func: Callable[[Any], Any], arg: Any, min_time: float = 0.2) -> float:
+    """CPU seconds per call, averaged over at least ``min_time`` of CPU."""
+    func(arg)
+    calls, start = 0, time.process_time()
+    while time.process_time() - start < min_time:
+        func(arg)
+        calls += 1
+    return (time.process_time() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000],
+                        help="history lengths (and response item counts) to measure")
+    args = parser.parse_args()
+
+    async def endpoint() -> None: ...
+
+    routes = {
+        "chat_complete": APIRoute("/", endpoint, response_model=ChatResponse),
+        "extract_facts_batch": APIRoute("/", endpoint, response_model=FactExtractionBatchResponse),
+    }
+    cases = []
+    for n in args.messages:
+        raw = chat_body(n)
+        cases.append(("chat request", n, parse_before, parse_after, raw))
+        cases.append(("chat_complete response", n, render_before(routes["chat_complete"]),
+                      render_after, chat_response(n)))
+        cases.append(("batch response", n, render_before(routes["extract_facts_batch"]),
+                      render_after, batch_response(n)))
+
+    print(f"{'case':24} {'n':>6} {'before us':>11} {'after us':>11} {'speedup':>8}")
+    for name, n, before, after, arg in sorted(cases, key=lambda c: (c[0], c[1])):
+        b, a = cpu_per_call(before, arg), cpu_per_call(after, arg)
+        print(f"{name:24} {n:>6} {b * 1e6:>11.1f} {a * 1e6:>11.1f} {b / a:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,6 @@
 """Quest API package."""
+
+import time
+
+# Recorded before any submodule is imported, so main can report import time
+import_started = time.perf_counter()
@@ -0,0 +1,241 @@
+"""Admission control: bounded concurrency per upstream with priority lanes."""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+import httpx
+from fastapi import HTTPException
+
+from . import metrics
+from .resilience import remaining
+
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "32"))
+ADMISSION_QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", "128"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5"))
+# Background work may only fill this share of a queue, keeping room for users
+ADMISSION_BACKGROUND_QUEUE_SHARE = float(os.getenv("ADMISSION_BACKGROUND_QUEUE_SHARE", "0.5"))
+
+INTERACTIVE, BACKGROUND = "interactive", "background"
+LANE_PRIORITY = {INTERACTIVE: 0, BACKGROUND: 1}
+
+# Route prefixes served in the background lane; everything else is interactive
+BACKGROUND_ROUTES = ("/extract-facts",)
+
+wait_time = metrics.histogram(
+    "quest_admission_wait_seconds",
+    "Time spent queued for an upstream slot",
+    labels=("limiter", "lane", "outcome"),
+)
+rejections = metrics.counter(
+    "quest_admission_rejections_total",
+    "Calls rejected by admission control",
+    labels=("limiter", "lane", "reason"),
+)
+inflight = metrics.gauge(
+    "quest_admission_inflight", "Calls holding an upstream slot", labels=("limiter",)
+)
+queued = metrics.gauge(
+    "quest_admission_queued", "Calls waiting for an upstream slot", labels=("limiter",)
+)
+
+_lane: ContextVar[str] = ContextVar("lane", default=INTERACTIVE)
+
+
+class Overloaded(HTTPException):
+    """Rejected for lack of capacity: 503 for interactive work, 429 for background."""
+
+    def __init__(self, message: str, retry_after: int, lane: str):
+        super().__init__(
+            status_code=429 if lane == BACKGROUND else 503,
+            detail=message,
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.retry_after = retry_after
+
+
+class UpstreamBusy(httpx.HTTPError):
+    """An upstream's queue is full; callers degrade as for any upstream error."""
+
+    def __init__(self, message: str, retry_after: int, lane: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    """Run the block, and tasks started from it, in a priority lane."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def route_lane(path: str) -> str:
+    """The lane a request path is served in."""
+    return BACKGROUND if path.startswith(BACKGROUND_ROUTES) else INTERACTIVE
+
+
+class Limiter:
+    """A concurrency limit with a bounded, priority-ordered wait queue.
+
+    Slots are handed to waiters strictly by lane priority, then arrival
+    order. Calls are rejected straight away when their lane's share of the
+    queue is full, and after ``max_wait`` (or the request deadline) if no
+    slot frees up in time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        error: Callable[[str, int, str], Exception] = Overloaded,
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.error = error
+        self.active = 0
+        self.avg_hold = 1.0  # EWMA of seconds a slot is held, for Retry-After
+        self._waiters: list[tuple[int, int, str, asyncio.Future]] = []
+        self._queued = dict.fromkeys(LANE_PRIORITY, 0)
+        self._order = itertools.count()
+
+    def queued(self, lane: str | None = None) -> int:
+        """Calls waiting for a slot, in one lane or all."""
+        return self._queued[lane] if lane else sum(self._queued.values())
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        backlog = (self.queued() + 1) / max(self.limit, 1)
+        return max(1, math.ceil(backlog * self.avg_hold))
+
+    def _reject(self, lane: str, reason: str) -> Exception:
+        rejections.inc(limiter=self.name, lane=lane, reason=reason)
+        return self.error(f"{self.name} is at capacity, retry later", self.retry_after(), lane)
+
+    def admit(self, lane: str | None = None) -> None:
+        """Fail fast if a call in this lane would be rejected for a full queue."""
+        lane = lane or current_lane()
+        if self.active < self.limit and not self.queued():
+            return
+        cap = self.max_queue
+        if lane == BACKGROUND:
+            cap = int(cap * ADMISSION_BACKGROUND_QUEUE_SHARE)
+        if self.queued() >= cap:
+            raise self._reject(lane, "queue_full")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one slot for the duration of the block."""
+        lane = current_lane()
+        start = time.perf_counter()
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+            outcome = "immediate"
+        else:
+            self.admit(lane)
+            await self._wait(lane, start)
+            outcome = "queued"
+        acquired = time.perf_counter()
+        wait_time.observe(acquired - start, limiter=self.name, lane=lane, outcome=outcome)
+        inflight.set(self.active, limiter=self.name)
+        try:
+            yield
+        finally:
+            self.avg_hold += 0.1 * (time.perf_counter() - acquired - self.avg_hold)
+            self._release()
+
+    @asynccontextmanager
+    async def spare_slot(self) -> AsyncIterator[None]:
+        """Hold a slot only if one is free right now; raises ``self.error`` otherwise.
+
+        For optional extra work, such as a hedged request, which must neither
+        queue nor take a slot a waiting call could have had.
+        """
+        if self.active >= self.limit or self.queued():
+            raise self.error(f"{self.name} has no spare slot", self.retry_after(), current_lane())
+        self.active += 1
+        inflight.set(self.active, limiter=self.name)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait(self, lane: str, start: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (LANE_PRIORITY[lane], next(self._order), lane, future))
+        self._queued[lane] += 1
+        queued.set(self.queued(), limiter=self.name)
+        timeout = self.max_wait
+        left = remaining()
+        if left is not None:
+            timeout = max(min(timeout, left), 0)
+        try:
+            async with asyncio.timeout(timeout):
+                await future
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                future.cancel()
+                self._queued[lane] -= 1
+                queued.set(self.queued(), limiter=self.name)
+            if isinstance(e, TimeoutError):
+                wait_time.observe(
+                    time.perf_counter() - start, limiter=self.name, lane=lane, outcome="timeout"
+                )
+                raise self._reject(lane, "timeout") from None
+            raise
+
+    def _release(self) -> None:
+        # Hand the slot straight to the highest-priority live waiter
+        while self._waiters:
+            _, _, lane, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._queued[lane] -= 1
+            queued.set(self.queued(), limiter=self.name)
+            future.set_result(None)
+            return
+        self.active -= 1
+        inflight.set(self.active, limiter=self.name)
+
+
+_limiters: dict[str, Limiter] = {}
+
+
+def limiter(name: str, error: Callable[[str, int, str], Exception] = Overloaded) -> Limiter:
+    """The limiter for an upstream, created on first use.
+
+    Limits come from ``{NAME}_CONCURRENCY`` and ``{NAME}_QUEUE_LIMIT``,
+    falling back to the ADMISSION_* defaults.
+    """
+    if name not in _limiters:
+        prefix = name.upper()
+        _limiters[name] = Limiter(
+            name,
+            int(os.getenv(f"{prefix}_CONCURRENCY", ADMISSION_CONCURRENCY)),
+            int(os.getenv(f"{prefix}_QUEUE_LIMIT", ADMISSION_QUEUE_LIMIT)),
+            error=error,
+        )
+    return _limiters[name]
+
+
+# Model calls are the scarcest resource; overflow is reported to the client
+model_limiter = limiter("model")
@@ -1,22 +1,127 @@
 """Pydantic AI agents for Quest."""
 
+import asyncio
+import importlib
 import os
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
+import time
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING
+
+from . import metrics
+from .admission import model_limiter
+from .batching import MicroBatcher
+from .context import assemble_context, render_turn
+from .fact_gate import should_extract
+from .metrics import track_upstream
+from .schemas import (
+    BatchFactExtractionResult,
+    ExtractedFact,
+    FactExtractionResult,
+    UserConditions,
+)
+from .semantic_cache import cache_question, response_cache
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+
+
+# Fact extraction batching: texts per model call, and how long live requests
+# wait for others to share a call with (only when micro-batching is enabled)
+FACT_MICRO_BATCHING = os.getenv("FACT_MICRO_BATCHING", "false").lower() == "true"
+FACT_BATCH_MAX_SIZE = int(os.getenv("FACT_BATCH_MAX_SIZE", "8"))
+FACT_BATCH_MAX_WAIT = float(os.getenv("FACT_BATCH_MAX_WAIT", "0.05"))
+FACT_BATCH_CONCURRENCY = int(os.getenv("FACT_BATCH_CONCURRENCY", "4"))
 
-from .schemas import ExtractedFact, FactExtractionResult, UserConditions
+
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "true").lower() == "true"
+
+agent_build_seconds = metrics.gauge(
+    "quest_agent_build_seconds", "Time taken to construct each agent", labels=("agent",)
+)
 
 
 # Initialize models
-def get_model():
+def get_model(model_name: str | None = None):
     """Get the configured AI model."""
-    model_name = os.getenv("AI_MODEL", "gemini-2.0-flash")
-    return GeminiModel(model_name)
+    from pydantic_ai.models.gemini import GeminiModel
+
+    return GeminiModel(model_name or os.getenv("AI_MODEL", "gemini-2.0-flash"))
+
+
+class AgentRegistry:
+    """Builds agents on first use, so importing the app stays cheap.
+
+    Each agent's model comes from ``AI_MODEL_<NAME>`` (e.g.
+    AI_MODEL_PLACEMENT), falling back to ``AI_MODEL``. ``start_warm_up``
+    builds every agent in the background so the first request doesn't pay
+    for it.
+    """
+
+    def __init__(self):
+        self._specs: dict[str, dict] = {}
+        self._agents: dict[str, Agent] = {}
+        self._warm_up: asyncio.Task | None = None
+        self.warm_up_seconds: float | None = None
+
+    def register(self, name: str, system_prompt: str, result_type: type = str) -> None:
+        """Declare an agent without building it."""
+        self._specs[name] = {"system_prompt": system_prompt, "result_type": result_type}
+
+    def names(self) -> list[str]:
+        return list(self._specs)
+
+    def model_name(self, name: str) -> str:
+        """The model an agent uses."""
+        return (
+            os.getenv(f"AI_MODEL_{name.upper()}")
+            or os.getenv("AI_MODEL", "gemini-2.0-flash")
+        )
+
+    def get(self, name: str) -> "Agent":
+        """Get an agent, building it on first use."""
+        agent = self._agents.get(name)
+        if agent is None:
+            from pydantic_ai import Agent
+
+            start = time.perf_counter()
+            agent = Agent(get_model(self.model_name(name)), **self._specs[name])
+            agent_build_seconds.set(time.perf_counter() - start, agent=name)
+            self._agents[name] = agent
+        return agent
+
+    async def warm_up(self) -> None:
+        """Build every agent, yielding to the event loop in between."""
+        start = time.perf_counter()
+        # The import is the slow part, and is safe to do off the loop
+        await asyncio.to_thread(importlib.import_module, "pydantic_ai.models.gemini")
+        for name in self._specs:
+            self.get(name)
+            await asyncio.sleep(0)
+        self.warm_up_seconds = time.perf_counter() - start
+        print(f"Agents warmed up in {self.warm_up_seconds:.3f}s")
+
+    def start_warm_up(self) -> None:
+        """Warm up in a background task."""
+        if self._warm_up is None:
+            self._warm_up = asyncio.create_task(self.warm_up())
+
+    async def stop(self) -> None:
+        """Cancel an unfinished warm-up."""
+        task, self._warm_up = self._warm_up, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+agent_registry = AgentRegistry()
 
 
 # Relocation Assistant Agent
-relocation_agent = Agent(
-    get_model(),
+agent_registry.register(
+    "relocation",
     system_prompt="""You are Quest, a friendly and knowledgeable relocation assistant.
 
 Your role is to help users plan their international relocation by:
@@ -41,8 +146,8 @@ Always be encouraging and supportive of their relocation journey.""",
 
 
 # Placement Assistant Agent (for job seekers)
-placement_agent = Agent(
-    get_model(),
+agent_registry.register(
+    "placement",
     system_prompt="""You are Quest, a professional career placement assistant.
 
 Your role is to help users with their international job search by:
@@ -66,9 +171,8 @@ Always be supportive and provide actionable advice.""",
 
 
 # Fact Extraction Agent
-fact_extractor = Agent(
-    get_model(),
-    system_prompt="""You are a fact extraction assistant. Your job is to analyze conversations
+FACT_EXTRACTION_PROMPT = """\
+You are a fact extraction assistant. Your job is to analyze conversations
 and extract structured facts about the user.
 
 For each fact you extract, determine:
@@ -85,13 +189,31 @@ Be conservative with confidence scores:
 - Below 0.5: Uncertain, should require confirmation
 
 Changes to existing user preferences (like changing destination from Portugal to Spain)
-should always require confirmation.""",
+should always require confirmation."""
+
+agent_registry.register(
+    "fact_extractor",
+    result_type=FactExtractionResult,
+    system_prompt=FACT_EXTRACTION_PROMPT,
+)
+
+
+# Batch Fact Extraction Agent
+agent_registry.register(
+    "batch_fact_extractor",
+    result_type=BatchFactExtractionResult,
+    system_prompt=FACT_EXTRACTION_PROMPT + """
+
+You will be given several numbered texts, each from a different conversation.
+Extract facts from each text independently and return exactly one result per
+text, in the same order as the texts.""",
 )
 
 
 # User Conditions Extractor
-conditions_extractor = Agent(
-    get_model(),
+agent_registry.register(
+    "conditions_extractor",
+    result_type=UserConditions,
     system_prompt="""Extract structured user conditions from the conversation.
 Focus on:
 - Destination preferences (countries, priorities, reasons)
@@ -104,63 +226,218 @@ Focus on:
 Return structured data following the UserConditions schema.""",
 )
 
+# Incremental conditions: only new turns plus the current structured state
+agent_registry.register(
+    "conditions_updater",
+    result_type=UserConditions,
+    system_prompt="""You maintain structured user conditions for a relocation assistant.
+You are given the user's current conditions as JSON and the newest conversation turns.
+Return ONLY conditions that the new turns state, change or add:
+- Destination preferences mentioned in the new turns (with updated priority and reasons)
+- Family, job, budget, timeline or location details that are new or different
+Leave every other field empty or null; they are kept from the current conditions.""",
+)
 
-async def get_relocation_response(messages: list[dict], context: str = "") -> str:
-    """Get a response from the relocation agent."""
-    # Build conversation history
-    conversation = "\n".join([
-        f"{m['role']}: {m['content']}"
-        for m in messages[-10:]  # Last 10 messages for context
-    ])
 
-    prompt = f"""Context: {context}
+def build_conversation_prompt(
+    messages: list[dict], context: str, assistant: str, conversation: str | None = None
+) -> str:
+    """Build the agent prompt from messages and memory context.
+
+    Callers that already assembled the conversation (see context.py) pass it
+    in; otherwise the messages are packed into the default token budget.
+    """
+    if conversation is None:
+        conversation = assemble_context([
+            render_turn(m["role"], m["content"]) for m in messages
+        ]).conversation
+
+    return f"""Context: {context}
 
 Conversation:
 {conversation}
 
-Respond as Quest, the relocation assistant."""
-
-    result = await relocation_agent.run(prompt)
+Respond as Quest, the {assistant} assistant."""
+
+
+async def _respond(
+    agent: "Agent",
+    app_type: str,
+    messages: list[dict],
+    context: str,
+    conversation: str | None = None,
+) -> str:
+    """Run an assistant agent, answering generic questions from the cache."""
+    question = cache_question(app_type, messages, context)
+    if question is not None:
+        cached = response_cache.lookup(app_type, question)
+        if cached is not None:
+            return cached
+
+    prompt = build_conversation_prompt(messages, context, app_type, conversation)
+    async with model_limiter.slot():
+        with track_upstream("model", app_type):
+            result = await agent.run(prompt)
+    if question is not None:
+        response_cache.store(app_type, question, result.data)
     return result.data
 
 
-async def get_placement_response(messages: list[dict], context: str = "") -> str:
+async def _stream(
+    agent: "Agent",
+    app_type: str,
+    messages: list[dict],
+    context: str,
+    conversation: str | None = None,
+) -> AsyncIterator[str]:
+    """Stream an assistant agent's text deltas, using the cache when possible."""
+    question = cache_question(app_type, messages, context)
+    if question is not None:
+        cached = response_cache.lookup(app_type, question)
+        if cached is not None:
+            yield cached
+            return
+
+    prompt = build_conversation_prompt(messages, context, app_type, conversation)
+    parts = []
+    async with model_limiter.slot():
+        with track_upstream("model", f"{app_type}_stream"):
+            async with agent.run_stream(prompt) as result:
+                async for delta in result.stream_text(delta=True, debounce_by=None):
+                    parts.append(delta)
+                    yield delta
+    if question is not None:
+        response_cache.store(app_type, question, "".join(parts))
+
+
+async def get_relocation_response(
+    messages: list[dict], context: str = "", conversation: str | None = None
+) -> str:
+    """Get a response from the relocation agent."""
+    return await _respond(
+        agent_registry.get("relocation"), "relocation", messages, context, conversation
+    )
+
+
+async def get_placement_response(
+    messages: list[dict], context: str = "", conversation: str | None = None
+) -> str:
     """Get a response from the placement agent."""
-    conversation = "\n".join([
-        f"{m['role']}: {m['content']}"
-        for m in messages[-10:]
-    ])
+    return await _respond(
+        agent_registry.get("placement"), "placement", messages, context, conversation
+    )
 
-    prompt = f"""Context: {context}
 
-Conversation:
-{conversation}
+def stream_relocation_response(
+    messages: list[dict], context: str = "", conversation: str | None = None
+) -> AsyncIterator[str]:
+    """Stream text deltas from the relocation agent as they are generated."""
+    return _stream(agent_registry.get("relocation"), "relocation", messages, context, conversation)
 
-Respond as Quest, the placement assistant."""
 
-    result = await placement_agent.run(prompt)
-    return result.data
+def stream_placement_response(
+    messages: list[dict], context: str = "", conversation: str | None = None
+) -> AsyncIterator[str]:
+    """Stream text deltas from the placement agent as they are generated."""
+    return _stream(agent_registry.get("placement"), "placement", messages, context, conversation)
 
 
-async def extract_facts(text: str, existing_facts: list[ExtractedFact] = None) -> FactExtractionResult:
-    """Extract facts from text."""
-    existing_context = ""
-    if existing_facts:
-        existing_context = "Existing facts:\n" + "\n".join([
-            f"- {f.type.value}: {f.value}" for f in existing_facts
-        ])
+def _existing_context(existing_facts: list[ExtractedFact] | None) -> str:
+    if not existing_facts:
+        return ""
+    return "Existing facts:\n" + "\n".join([
+        f"- {f.type.value}: {f.value}" for f in existing_facts
+    ])
+
 
-    prompt = f"""{existing_context}
+async def _extract_one(
+    text: str, existing_facts: list[ExtractedFact] | None = None
+) -> FactExtractionResult:
+    prompt = f"""{_existing_context(existing_facts)}
 
 New text to analyze:
 {text}
 
 Extract any new or changed facts about the user."""
 
-    result = await fact_extractor.run(prompt)
+    async with model_limiter.slot():
+        with track_upstream("model", "fact_extraction"):
+            result = await agent_registry.get("fact_extractor").run(prompt)
     return result.data
 
 
+async def _extract_batch(
+    items: list[tuple[str, list[ExtractedFact] | None]]
+) -> list[FactExtractionResult]:
+    """Extract facts for several texts with one model call."""
+    if len(items) == 1:
+        return [await _extract_one(*items[0])]
+
+    sections = []
+    for number, (text, existing_facts) in enumerate(items, 1):
+        lines = [f"Text {number}:", _existing_context(existing_facts), text]
+        sections.append("\n".join(line for line in lines if line))
+    prompt = "\n\n".join(sections) + f"""
+
+Extract any new or changed facts about the user from each text.
+Return exactly {len(items)} results, one per text, in order."""
+
+    async with model_limiter.slot():
+        with track_upstream("model", "fact_extraction_batch"):
+            result = await agent_registry.get("batch_fact_extractor").run(prompt)
+    if len(result.data.results) == len(items):
+        return result.data.results
+    # The model lost count; fall back to one call per text
+    return list(await asyncio.gather(*[_extract_one(*item) for item in items]))
+
+
+fact_batcher = MicroBatcher(
+    "fact_extraction", _extract_batch, FACT_BATCH_MAX_SIZE, FACT_BATCH_MAX_WAIT
+)
+
+
+async def extract_facts(
+    text: str, existing_facts: list[ExtractedFact] = None
+) -> FactExtractionResult:
+    """Extract facts from text.
+
+    Messages the pre-classifier finds fact-free skip the model entirely.
+    When the micro-batcher is running, concurrent calls share a model call.
+    """
+    if not should_extract(text):
+        return FactExtractionResult()
+    return await fact_batcher.submit((text, existing_facts))
+
+
+async def extract_facts_batch(
+    texts: list[str], existing_facts: list[list[ExtractedFact] | None] | None = None
+) -> list[FactExtractionResult]:
+    """Extract facts from many texts, FACT_BATCH_MAX_SIZE texts per model call.
+
+    ``existing_facts``, if given, holds the known facts for each text.
+    Texts the pre-classifier finds fact-free get an empty result.
+    """
+    results = [FactExtractionResult() for _ in texts]
+    wanted = [i for i, text in enumerate(texts) if should_extract(text)]
+    known = existing_facts or [None] * len(texts)
+    items = [(texts[i], known[i]) for i in wanted]
+    slots = asyncio.Semaphore(FACT_BATCH_CONCURRENCY)
+
+    async def run_chunk(
+        chunk: list[tuple[str, list[ExtractedFact] | None]],
+    ) -> list[FactExtractionResult]:
+        async with slots:
+            return await _extract_batch(chunk)
+
+    chunks = await asyncio.gather(*[
+        run_chunk(items[i:i + FACT_BATCH_MAX_SIZE])
+        for i in range(0, len(items), FACT_BATCH_MAX_SIZE)
+    ])
+    for i, result in zip(wanted, (result for chunk in chunks for result in chunk)):
+        results[i] = result
+    return results
+
+
 async def extract_user_conditions(messages: list[dict]) -> UserConditions:
     """Extract structured user conditions from conversation history."""
     conversation = "\n".join([
@@ -172,5 +449,45 @@ async def extract_user_conditions(messages: list[dict]) -> UserConditions:
 
 {conversation}"""
 
-    result = await conditions_extractor.run(prompt)
+    async with model_limiter.slot():
+        with track_upstream("model", "conditions"):
+            result = await agent_registry.get("conditions_extractor").run(prompt)
     return result.data
+
+
+async def extract_conditions_update(
+    current: UserConditions, messages: list[dict]
+) -> UserConditions:
+    """Extract what new turns change about a user's conditions.
+
+    Only the new turns and the current state are sent, so the prompt stays
+    the same size however long the conversation gets. Fields the new turns
+    don't mention come back unset; merge the result into ``current``.
+    """
+    conversation = "\n".join(render_turn(m["role"], m["content"]) for m in messages)
+    prompt = f"""Current conditions:
+{current.model_dump_json(exclude_none=True)}
+
+New conversation turns:
+{conversation}"""
+
+    async with model_limiter.slot():
+        with track_upstream("model", "conditions_update"):
+            result = await agent_registry.get("conditions_updater").run(prompt)
+    return result.data
+
+
+# Module-level names the agents used to be importable under
+_LEGACY_AGENTS = {
+    "relocation_agent": "relocation",
+    "placement_agent": "placement",
+    "fact_extractor": "fact_extractor",
+    "batch_fact_extractor": "batch_fact_extractor",
+    "conditions_extractor": "conditions_extractor",
+}
+
+
+def __getattr__(name: str):
+    if name in _LEGACY_AGENTS:
+        return agent_registry.get(_LEGACY_AGENTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
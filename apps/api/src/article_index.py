@@ -0,0 +1,220 @@
+"""Local, memory-mapped article index for in-process recommendations.
+
+Each graph type (relocation, placement) has an embedding matrix saved as
+``<graph>.<version>.npy`` (memory-mapped on load) and a metadata sidecar
+``<graph>.<version>.json``. ``<graph>.current`` names the live version and is
+replaced atomically, so a refresh never exposes a half-written index.
+
+Build or refresh from ZEP:
+
+    python -m src.article_index build --graph all
+    python -m src.article_index search "visa for portugal"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .embeddings import embed, embed_batch
+
+ARTICLE_INDEX_DIR = Path(os.getenv("ARTICLE_INDEX_DIR", "data/article_index"))
+# Seconds between background rebuilds from ZEP; 0 only reloads files built offline
+ARTICLE_INDEX_REFRESH_INTERVAL = float(os.getenv("ARTICLE_INDEX_REFRESH_INTERVAL", "0"))
+ARTICLE_INDEX_POLL_INTERVAL = float(os.getenv("ARTICLE_INDEX_POLL_INTERVAL", "60"))
+GRAPH_TYPES = ("relocation", "placement")
+KEEP_VERSIONS = 2
+
+# Fetches every article for a graph type, e.g. from ZEP
+ArticleFetcher = Callable[[str], Awaitable[list[dict]]]
+
+
+def article_text(article: dict) -> str:
+    """Text that represents an article in the index."""
+    return " ".join([
+        article.get("title", ""),
+        article.get("summary", ""),
+        " ".join(article.get("tags", [])),
+    ])
+
+
+class ArticleIndex:
+    """An immutable embedding matrix plus article metadata."""
+
+    def __init__(self, embeddings: np.ndarray, articles: list[dict], version: str):
+        self.embeddings = embeddings
+        self.articles = articles
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    @classmethod
+    def load(cls, directory: Path, graph_type: str) -> Optional["ArticleIndex"]:
+        """Load the current version for a graph type, or None if not built."""
+        pointer = directory / f"{graph_type}.current"
+        if not pointer.exists():
+            return None
+        version = pointer.read_text().strip()
+        embeddings = np.load(directory / f"{graph_type}.{version}.npy", mmap_mode="r")
+        articles = json.loads((directory / f"{graph_type}.{version}.json").read_text())
+        return cls(embeddings, articles, version)
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Top-k articles by cosine similarity to the query."""
+        if not self.articles:
+            return []
+        scores = self.embeddings @ embed(query, self.embeddings.shape[1])
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**self.articles[i], "relevance_score": float(scores[i])}
+            for i in top
+            if scores[i] > 0
+        ]
+
+
+def write_index(directory: Path, graph_type: str, articles: list[dict]) -> str:
+    """Write a new index version and make it current. Returns the version."""
+    directory.mkdir(parents=True, exist_ok=True)
+    version = str(time.time_ns())
+    embeddings = embed_batch([article_text(a) for a in articles])
+    np.save(directory / f"{graph_type}.{version}.npy", embeddings)
+    (directory / f"{graph_type}.{version}.json").write_text(json.dumps(articles))
+
+    pointer = directory / f"{graph_type}.current"
+    tmp = directory / f"{graph_type}.current.tmp"
+    tmp.write_text(version)
+    os.replace(tmp, pointer)
+
+    # Old versions may still be mapped by readers; the OS keeps them alive
+    versions = sorted(
+        {p.name.split(".")[1] for p in directory.glob(f"{graph_type}.*.npy")},
+        key=int,
+    )
+    for old in versions[:-KEEP_VERSIONS]:
+        for suffix in ("npy", "json"):
+            (directory / f"{graph_type}.{old}.{suffix}").unlink(missing_ok=True)
+    return version
+
+
+class ArticleIndexStore:
+    """Holds the live index per graph type and swaps in new versions.
+
+    Loading and building happen off the event loop; requests keep reading the
+    previous index until the new one is ready, then the reference is swapped.
+    """
+
+    def __init__(self, directory: Path = ARTICLE_INDEX_DIR):
+        self.directory = directory
+        self._indexes: dict[str, ArticleIndex] = {}
+        self._task: asyncio.Task | None = None
+
+    def get(self, graph_type: str) -> ArticleIndex | None:
+        """The live index for a graph type, if one is loaded."""
+        return self._indexes.get(graph_type)
+
+    def reload(self) -> list[str]:
+        """Load any graph whose current version changed on disk."""
+        swapped = []
+        for graph_type in GRAPH_TYPES:
+            pointer = self.directory / f"{graph_type}.current"
+            if not pointer.exists():
+                continue
+            current = self._indexes.get(graph_type)
+            if current and current.version == pointer.read_text().strip():
+                continue
+            index = ArticleIndex.load(self.directory, graph_type)
+            if index is not None:
+                self._indexes[graph_type] = index
+                swapped.append(graph_type)
+        return swapped
+
+    async def refresh(self, fetch: ArticleFetcher, graph_types=GRAPH_TYPES) -> None:
+        """Rebuild indexes from the source and swap them in."""
+        for graph_type in graph_types:
+            articles = await fetch(graph_type)
+            if articles:
+                await asyncio.to_thread(write_index, self.directory, graph_type, articles)
+        await asyncio.to_thread(self.reload)
+
+    async def start(self, fetch: ArticleFetcher) -> None:
+        """Load what's on disk and start the background refresh loop."""
+        try:
+            await asyncio.to_thread(self.reload)
+        except (OSError, ValueError) as e:
+            print(f"Article index not loaded: {e}")
+        self._task = asyncio.create_task(self._run(fetch))
+
+    async def stop(self) -> None:
+        """Stop the background refresh loop."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, fetch: ArticleFetcher) -> None:
+        last_build = time.monotonic()
+        while True:
+            await asyncio.sleep(ARTICLE_INDEX_POLL_INTERVAL)
+            try:
+                if (ARTICLE_INDEX_REFRESH_INTERVAL
+                        and time.monotonic() - last_build >= ARTICLE_INDEX_REFRESH_INTERVAL):
+                    await self.refresh(fetch)
+                    last_build = time.monotonic()
+                else:
+                    await asyncio.to_thread(self.reload)
+            except Exception as e:
+                print(f"Article index refresh failed: {e}")
+
+
+article_indexes = ArticleIndexStore()
+
+
+def main() -> None:
+    """CLI to build, refresh and query the local article index."""
+    from .zep import fetch_articles
+
+    parser = argparse.ArgumentParser(prog="python -m src.article_index")
+    parser.add_argument("--dir", type=Path, default=ARTICLE_INDEX_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build or refresh the index from ZEP")
+    build.add_argument("--graph", choices=[*GRAPH_TYPES, "all"], default="all")
+    search = commands.add_parser("search", help="query the local index")
+    search.add_argument("query")
+    search.add_argument("--graph", choices=GRAPH_TYPES, default="relocation")
+    search.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    store = ArticleIndexStore(args.dir)
+    if args.command == "build":
+        graph_types = GRAPH_TYPES if args.graph == "all" else (args.graph,)
+        asyncio.run(store.refresh(fetch_articles, graph_types))
+        for graph_type in graph_types:
+            index = store.get(graph_type)
+            print(f"{graph_type}: {len(index) if index else 0} articles")
+    else:
+        store.reload()
+        index = store.get(args.graph)
+        if index is None:
+            parser.error(f"No {args.graph} index in {args.dir}")
+        start = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for article in results:
+            print(f"{article['relevance_score']:.3f}  {article['title']}")
+        print(f"({elapsed:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Micro-batching of concurrent calls into one batched call."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Takes a batch of items and returns one result per item, in order
+BatchHandler = Callable[[list[T]], Awaitable[list[R]]]
+
+# Queued by stop(): the worker dispatches what it has collected and exits
+_STOP = object()
+
+batch_sizes = metrics.histogram(
+    "quest_batch_size",
+    "Items per dispatched micro-batch",
+    labels=("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collect items submitted concurrently and hand them to one batched call.
+
+    A batch is dispatched once it reaches ``max_size`` items or ``max_wait``
+    seconds after its first item arrived, whichever comes first. Batches are
+    dispatched without waiting for the previous one to finish. When the
+    worker isn't running, items are handled inline as a batch of one.
+    """
+
+    def __init__(self, name: str, handler: BatchHandler, max_size: int, max_wait: float):
+        self.name = name
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._dispatches: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        """Start the background batching worker."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop collecting and wait for every submitted item to be handled.
+
+        The worker dispatches the batch it is collecting before it exits;
+        items submitted from now on are handled inline.
+        """
+        if not self.running:
+            return
+        worker, self._worker = self._worker, None
+        self._queue.put_nowait(_STOP)
+        await asyncio.gather(worker, return_exceptions=True)
+        # Only left if the worker was cancelled: handle them as one last batch
+        leftover = []
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is not _STOP:
+                leftover.append(entry)
+        self._dispatch(leftover)
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def submit(self, item: T) -> R:
+        """Add an item to the next batch and wait for its result."""
+        if not self.running:
+            batch_sizes.observe(1, batcher=self.name)
+            return (await self.handler([item]))[0]
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self, batch: list[tuple[T, asyncio.Future]]) -> bool:
+        """Fill ``batch`` with the next batch's items; True once stop() was called."""
+        entry = await self._queue.get()
+        if entry is _STOP:
+            return True
+        batch.append(entry)
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), remaining)
+            except TimeoutError:
+                break
+            if entry is _STOP:
+                return True
+            batch.append(entry)
+        return False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[tuple[T, asyncio.Future]] = []
+            try:
+                stopping = await self._collect(batch)
+            finally:
+                # Also when cancelled: items taken off the queue still get handled
+                self._dispatch(batch)
+
+    def _dispatch(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        # Callers that gave up don't need a slot in the batch
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        task = asyncio.create_task(self._handle(batch))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _handle(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        batch_sizes.observe(len(batch), batcher=self.name)
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"{self.name} handler returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,175 @@
+"""Async TTL/LRU cache with single-flight request coalescing."""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from typing import Any
+
+from . import metrics
+
+requests = metrics.counter(
+    "quest_cache_requests_total",
+    "Cache lookups by result (hit, miss, coalesced)",
+    labels=("cache", "result"),
+)
+evictions = metrics.counter(
+    "quest_cache_evictions_total",
+    "Cache entries removed by reason (size, expired, invalidated)",
+    labels=("cache", "reason"),
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different phrasings share a key."""
+    return _WHITESPACE.sub(" ", query.lower()).strip(" ?!.,;:")
+
+
+class _Load:
+    """An in-flight load shared by concurrent callers."""
+
+    def __init__(self, future: asyncio.Future, tags: tuple[str, ...]):
+        self.future = future
+        self.tags = tags
+        self.stale = False
+
+
+class AsyncCache:
+    """Size-bounded LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent lookups for a missing key share one in-flight load. Entries
+    carry tags (e.g. "user:<id>") so writes can invalidate everything derived
+    from a user's data; a load that overlaps an invalidation of one of its
+    tags is returned to its callers but not stored.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expires_at, value, tags)
+        self._entries: OrderedDict[Hashable, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[Hashable]] = {}
+        self._inflight: dict[Hashable, _Load] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """Return (found, value) for a fresh entry without loading."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            evictions.inc(cache=self.name, reason="expired")
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        tags = tuple(tags)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            evictions.inc(cache=self.name, reason="size")
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Return a cached value, or load it once for all concurrent callers."""
+        found, value = await self._lookup(key)
+        if found:
+            requests.inc(cache=self.name, result="hit")
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            requests.inc(cache=self.name, result="coalesced")
+            try:
+                return await asyncio.shield(inflight.future)
+            except asyncio.CancelledError:
+                # Re-raise our own cancellation; if only the leading caller
+                # was cancelled, load the value ourselves instead.
+                if asyncio.current_task().cancelling() or not inflight.future.cancelled():
+                    raise
+                return await self.get_or_load(key, loader, tags)
+
+        requests.inc(cache=self.name, result="miss")
+        future = asyncio.get_running_loop().create_future()
+        load = self._inflight[key] = _Load(future, tuple(tags))
+        try:
+            await self._begin_load(load)
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn if there were none
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            await self._finish_load(key, value, load)
+            return value
+        finally:
+            del self._inflight[key]
+
+    # Storage hooks for get_or_load; a subclass keeping entries elsewhere
+    # overrides them. The load is registered before _begin_load runs, so
+    # concurrent callers coalesce onto it even while the hook awaits.
+
+    async def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        return self.get(key)
+
+    async def _begin_load(self, load: _Load) -> None:
+        pass
+
+    async def _finish_load(self, key: Hashable, value: Any, load: _Load) -> None:
+        """Store a loaded value unless an invalidation overlapped the load."""
+        if not load.stale:
+            self.set(key, value, load.tags)
+
+    def invalidate(self, tag: str) -> int:
+        """Drop every entry carrying a tag. Returns the number removed."""
+        for load in self._inflight.values():
+            if tag in load.tags:
+                load.stale = True
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self._remove(key)
+        if keys:
+            evictions.inc(len(keys), cache=self.name, reason="invalidated")
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        for load in self._inflight.values():
+            load.stale = True
+        self._entries.clear()
+        self._tags.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,229 @@
+"""Shared HTTP clients for upstream services (SuperMemory, ZEP)."""
+
+import asyncio
+import os
+import time
+from typing import Any
+
+import httpx
+
+from .admission import UpstreamBusy, limiter
+from .resilience import (
+    CLOSED,
+    HEDGE_MIN_DELAY,
+    HEDGE_PERCENTILE,
+    HEDGED_READS_ENABLED,
+    DeadlineExceeded,
+    LatencyWindow,
+    bounded_timeout,
+    breaker,
+    hedged,
+    remaining,
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float from the environment, falling back to a default."""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an int from the environment, falling back to a default."""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Pool configuration (shared by every upstream unless overridden per upstream)
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE = _env_int("HTTP_MAX_KEEPALIVE", 20)
+HTTP_KEEPALIVE_EXPIRY = _env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Per-operation timeouts in seconds: reads sit on the chat critical path,
+# writes happen after the response is ready and can afford to wait longer.
+DEFAULT_TIMEOUTS = {
+    "read": 10.0,
+    "write": 30.0,
+}
+
+
+class UpstreamConfig:
+    """Connection settings for one upstream service."""
+
+    def __init__(self, name: str, base_url: str, headers: dict | None = None):
+        prefix = name.upper()
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.limits = httpx.Limits(
+            max_connections=_env_int(f"{prefix}_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=_env_int(f"{prefix}_MAX_KEEPALIVE", HTTP_MAX_KEEPALIVE),
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeouts = {
+            operation: _env_float(f"{prefix}_{operation.upper()}_TIMEOUT", default)
+            for operation, default in DEFAULT_TIMEOUTS.items()
+        }
+
+    def timeout(self, operation: str, total: float | None = None) -> httpx.Timeout:
+        """Get the timeout for an operation ("read" or "write"), optionally capped."""
+        if total is None:
+            total = self.timeouts.get(operation, DEFAULT_TIMEOUTS["write"])
+        return httpx.Timeout(total, connect=min(HTTP_CONNECT_TIMEOUT, total))
+
+
+class ClientRegistry:
+    """Owns one long-lived, pooled AsyncClient per upstream.
+
+    Clients are opened in the FastAPI lifespan and closed on shutdown. If a
+    module is used outside the app (scripts, REPL), the client is created
+    lazily on first use so callers never have to care.
+    """
+
+    def __init__(self):
+        self._configs: dict[str, UpstreamConfig] = {}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._latencies: dict[tuple[str, str], LatencyWindow] = {}
+
+    def register(self, config: UpstreamConfig) -> None:
+        """Register an upstream. Must happen before its client is opened."""
+        self._configs[config.name] = config
+        breaker(config.name)
+        limiter(config.name, error=UpstreamBusy)
+
+    def config(self, name: str) -> UpstreamConfig:
+        """Get the configuration for a registered upstream."""
+        return self._configs[name]
+
+    def _open(self, name: str) -> httpx.AsyncClient:
+        config = self._configs[name]
+        try:
+            client = httpx.AsyncClient(
+                base_url=config.base_url,
+                headers=config.headers,
+                limits=config.limits,
+                timeout=config.timeout("write"),
+                http2=HTTP2_ENABLED,
+            )
+        except ImportError:
+            # http2=True needs the optional h2 package; fall back to HTTP/1.1 keep-alive
+            client = httpx.AsyncClient(
+                base_url=config.base_url,
+                headers=config.headers,
+                limits=config.limits,
+                timeout=config.timeout("write"),
+            )
+        self._clients[name] = client
+        return client
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Get the pooled client for an upstream, opening it if needed."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._open(name)
+        return client
+
+    def timeout(self, name: str, operation: str) -> httpx.Timeout:
+        """Get the per-operation timeout for an upstream."""
+        return self._configs[name].timeout(operation)
+
+    async def request(
+        self,
+        name: str,
+        method: str,
+        url: str,
+        *,
+        kind: str = "read",
+        operation: str = "",
+        hedge: bool = False,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Send a request to an upstream and raise for error statuses.
+
+        The wait is bounded by the operation timeout or the remaining request
+        deadline, whichever is shorter. Calls go through the upstream's
+        circuit breaker. With ``hedge`` set (idempotent reads only) and
+        HEDGED_READS_ENABLED, a second request is raced against one that is
+        slower than the recent p95. Concurrency is capped per upstream by
+        admission control. Every failure is an httpx.HTTPError.
+        """
+        config = self._configs[name]
+        limit = config.timeouts.get(kind, DEFAULT_TIMEOUTS["write"])
+        total = bounded_timeout(limit)
+        circuit = breaker(name)
+        circuit.allow()
+        client = self.get(name)
+        window = self._latencies.setdefault((name, operation or url), LatencyWindow())
+
+        async def send() -> httpx.Response:
+            start = time.perf_counter()
+            try:
+                async with asyncio.timeout(total):
+                    response = await client.request(
+                        method, url, timeout=config.timeout(kind, total), **kwargs
+                    )
+            except (TimeoutError, httpx.TimeoutException) as e:
+                left = remaining()
+                if left is not None and left <= 0.01:
+                    raise DeadlineExceeded(f"Request deadline exceeded waiting for {name}") from e
+                if isinstance(e, httpx.TimeoutException):
+                    raise
+                raise httpx.TimeoutException(
+                    f"{name} {method} {url} timed out after {total:.2f}s"
+                ) from e
+            response.raise_for_status()
+            window.add(time.perf_counter() - start)
+            return response
+
+        async def send_hedge() -> httpx.Response:
+            # A hedge holds its own slot, but only a spare one: it never queues
+            async with limiter(name).spare_slot():
+                return await send()
+
+        delay = window.percentile(HEDGE_PERCENTILE) if hedge and HEDGED_READS_ENABLED else None
+        left = remaining()
+        try:
+            async with limiter(name).slot():
+                if delay is not None and circuit.state == CLOSED and (left is None or left > delay):
+                    response = await hedged(
+                        send, max(delay, HEDGE_MIN_DELAY), name, operation, send_hedge
+                    )
+                else:
+                    response = await send()
+        except UpstreamBusy:
+            circuit.release()
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                circuit.record_failure()
+            else:
+                circuit.record_success()
+            raise
+        except DeadlineExceeded:
+            # Our budget ran out, which says nothing about the upstream's health
+            circuit.release()
+            raise
+        except httpx.TransportError:
+            circuit.record_failure()
+            raise
+        except BaseException:
+            circuit.release()
+            raise
+        circuit.record_success()
+        return response
+
+    async def start(self) -> None:
+        """Open clients for every registered upstream."""
+        for name in self._configs:
+            self.get(name)
+
+    async def close(self) -> None:
+        """Close all open clients and release their connections."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+registry = ClientRegistry()
@@ -0,0 +1,167 @@
+"""UserConditions per conversation, materialized incrementally from new turns."""
+
+import asyncio
+import os
+import time
+import weakref
+
+from pydantic import BaseModel
+
+from . import metrics
+from .agents import extract_conditions_update, extract_user_conditions
+from .cache import AsyncCache, normalize_query
+from .schemas import DestinationPreference, UserConditions
+
+CONDITIONS_CACHE_SIZE = int(os.getenv("CONDITIONS_CACHE_SIZE", "10000"))
+CONDITIONS_TTL = float(os.getenv("CONDITIONS_TTL", "86400"))
+# Drift correction: re-read the whole conversation after this many
+# incrementally merged turns, or once the last full rebuild is this old
+CONDITIONS_REBUILD_TURNS = int(os.getenv("CONDITIONS_REBUILD_TURNS", "40"))
+CONDITIONS_REBUILD_INTERVAL = float(os.getenv("CONDITIONS_REBUILD_INTERVAL", "3600"))
+# Last merged turns kept to find where they sit in a later history
+TAIL_TURNS = 4
+
+condition_updates = metrics.counter(
+    "quest_conditions_updates_total",
+    "UserConditions refreshes by how they were computed",
+    labels=("mode",),
+)
+condition_turns = metrics.histogram(
+    "quest_conditions_turns",
+    "Conversation turns sent to the model per UserConditions refresh",
+    labels=("mode",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+class MaterializedConditions:
+    """The conditions from one conversation and how much of it they reflect."""
+
+    def __init__(self, conditions: UserConditions):
+        self.conditions = conditions
+        self.tail: list[tuple[str, str]] = []  # (role, content) of the last merged turns
+        self.merged_turns = 0  # turns merged incrementally since the last rebuild
+        self.rebuilt_at = time.monotonic()
+
+    def due_for_rebuild(self) -> bool:
+        return (
+            self.merged_turns >= CONDITIONS_REBUILD_TURNS
+            or time.monotonic() - self.rebuilt_at >= CONDITIONS_REBUILD_INTERVAL
+        )
+
+    def unmerged(self, messages: list[dict]) -> list[dict] | None:
+        """The turns of ``messages`` after the last merged ones.
+
+        The history is matched on content rather than position, since a
+        session only keeps its most recent turns. Returns None when the
+        merged turns can't be found in it (the history was edited, or has
+        moved on past them).
+        """
+        if not self.tail:
+            return list(messages)
+        keys = [(m["role"], m["content"]) for m in messages]
+        for end in range(len(keys), len(self.tail) - 1, -1):
+            if keys[end - len(self.tail):end] == self.tail:
+                return list(messages[end:])
+        return None
+
+    def merged(self, messages: list[dict]) -> None:
+        """Record ``messages`` as the end of the conversation merged so far."""
+        self.tail = [(m["role"], m["content"]) for m in messages[-TAIL_TURNS:]]
+
+
+# Materialized conditions per (user, session): a rebuild re-reads exactly
+# the conversation the state was built from
+materialized = AsyncCache("user_conditions", CONDITIONS_CACHE_SIZE, CONDITIONS_TTL)
+_locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _overlay(current: BaseModel | None, update: BaseModel | None) -> BaseModel | None:
+    """The fields the model actually returned in ``update``, laid over ``current``."""
+    if update is None or not update.model_fields_set:
+        return current
+    if current is None:
+        return update
+    return current.model_copy(
+        update={name: getattr(update, name) for name in update.model_fields_set}
+    )
+
+
+def _merge_destinations(
+    current: list[DestinationPreference], update: list[DestinationPreference]
+) -> list[DestinationPreference]:
+    """Merge destinations by country: new priorities win, reasons accumulate."""
+    merged = {normalize_query(d.country): d for d in current}
+    for destination in update:
+        key = normalize_query(destination.country)
+        known = merged.get(key)
+        if known is not None:
+            reasons = known.reasons + [r for r in destination.reasons if r not in known.reasons]
+            destination = _overlay(known, destination).model_copy(
+                update={"country": known.country, "reasons": reasons}
+            )
+        merged[key] = destination
+    return list(merged.values())
+
+
+def merge_conditions(current: UserConditions, update: UserConditions) -> UserConditions:
+    """Merge an incremental update into materialized conditions, field by field.
+
+    Destinations merge by country; family and budget take the sub-fields the
+    update set; scalar fields are replaced only when the update has a value.
+    """
+    merged = current.model_copy(update={
+        "destination_preferences": _merge_destinations(
+            current.destination_preferences, update.destination_preferences
+        ),
+        "family_condition": _overlay(current.family_condition, update.family_condition),
+        "budget": _overlay(current.budget, update.budget),
+    })
+    for name in ("job_status", "timeline", "current_location"):
+        value = getattr(update, name)
+        if value is not None:
+            merged = merged.model_copy(update={name: value})
+    return merged
+
+
+async def get_user_conditions(
+    user_id: str,
+    session_id: str,
+    messages: list[dict],
+    rebuild: bool = False,
+) -> UserConditions:
+    """Bring the materialized conditions of a user's conversation up to date.
+
+    ``messages`` is the session's history, or its most recent turns. Only
+    turns not yet merged go to the model, with the current conditions as
+    context. The whole conversation is re-read on first sight of the
+    session, when a rebuild is due, when asked to, or if the merged turns
+    can't be found in the history.
+    """
+    key = (user_id, session_id)
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    async with lock:
+        found, state = materialized.get(key)
+        rebuild = rebuild or not found or state.due_for_rebuild()
+        new = None if rebuild else state.unmerged(messages)
+        if new == []:
+            condition_updates.inc(mode="unchanged")
+            return state.conditions
+        if new is None:
+            conditions = await extract_user_conditions(messages) if messages else UserConditions()
+            state = MaterializedConditions(conditions)
+            mode, turns = "rebuild", len(messages)
+        else:
+            update = await extract_conditions_update(state.conditions, new)
+            state.conditions = merge_conditions(state.conditions, update)
+            state.merged_turns += len(new)
+            mode, turns = "incremental", len(new)
+        state.merged(messages)
+        materialized.set(key, state)
+        condition_updates.inc(mode=mode)
+        condition_turns.observe(turns, mode=mode)
+        return state.conditions
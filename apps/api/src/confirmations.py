@@ -0,0 +1,332 @@
+"""Human-in-the-loop fact confirmations, persisted to Postgres when configured."""
+
+import os
+import uuid
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from . import db, shared_state
+from .schemas import FactType, PendingConfirmation
+
+CONFIRMATION_PAGE_MAX = 100
+# Most confirmations the in-memory store keeps; resolved ones are evicted first
+CONFIRMATION_MEMORY_MAX = int(os.getenv("CONFIRMATION_MEMORY_MAX", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hitl_confirmations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    fact_type TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT NOT NULL,
+    confidence DOUBLE PRECISION NOT NULL,
+    context TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    resolved_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS hitl_confirmations_user_status_idx
+    ON hitl_confirmations (user_id, status, created_at DESC, id DESC);
+"""
+
+# The same table in the shared state database, for multi-worker deployments
+# without Postgres; created_at is kept as integer microseconds so keyset
+# comparisons are exact
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hitl_confirmations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    fact_type TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    context TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at INTEGER NOT NULL,
+    resolved_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS hitl_confirmations_user_status_idx
+    ON hitl_confirmations (user_id, status, created_at DESC, id DESC);
+"""
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+COLUMNS = "id, user_id, fact_type, old_value, new_value, confidence, context, status, created_at"
+
+
+def _prepare(confirmation: PendingConfirmation) -> PendingConfirmation:
+    """Assign a new id and timestamp, ignoring any sent by the client.
+
+    Server-assigned created_at keeps newest-first keyset paging consistent.
+    """
+    return confirmation.model_copy(update={
+        "id": str(uuid.uuid4()),
+        "status": "pending",
+        "created_at": datetime.now(UTC),
+    })
+
+
+def encode_cursor(confirmation: PendingConfirmation) -> str:
+    """Opaque keyset cursor pointing just past a confirmation."""
+    return f"{confirmation.created_at.isoformat()}|{confirmation.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Split a cursor into its (created_at, id) key; raises ValueError if malformed."""
+    created_at, _, confirmation_id = cursor.partition("|")
+    if not confirmation_id:
+        raise ValueError("Malformed cursor")
+    return datetime.fromisoformat(created_at), confirmation_id
+
+
+class ConfirmationStore:
+    """In-memory confirmations, for development without a database.
+
+    Holds at most ``maxsize``; when full, resolved confirmations go first,
+    then the oldest pending ones.
+    """
+
+    def __init__(self, maxsize: int = CONFIRMATION_MEMORY_MAX):
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, PendingConfirmation] = OrderedDict()
+
+    async def start(self) -> None:
+        """Prepare the backend."""
+
+    async def create_many(
+        self, confirmations: list[PendingConfirmation]
+    ) -> list[PendingConfirmation]:
+        """Store new confirmations and return them with ids assigned."""
+        created = [_prepare(c) for c in confirmations]
+        for confirmation in created:
+            self._items[confirmation.id] = confirmation
+        self._evict()
+        return created
+
+    def _evict(self) -> None:
+        excess = len(self._items) - self.maxsize
+        if excess <= 0:
+            return
+        resolved = [id_ for id_, c in self._items.items() if c.status != "pending"]
+        for confirmation_id in resolved[:excess]:
+            del self._items[confirmation_id]
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def create(self, confirmation: PendingConfirmation) -> PendingConfirmation:
+        """Store one new confirmation."""
+        return (await self.create_many([confirmation]))[0]
+
+    async def list_for_user(
+        self,
+        user_id: str,
+        status: str = "pending",
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[PendingConfirmation], str | None]:
+        """A page of a user's confirmations, newest first, and the next cursor."""
+        items = sorted(
+            (c for c in self._items.values() if c.user_id == user_id and c.status == status),
+            key=lambda c: (c.created_at, c.id),
+            reverse=True,
+        )
+        if cursor:
+            key = decode_cursor(cursor)
+            items = [c for c in items if (c.created_at, c.id) < key]
+        return _page(items[:limit + 1], limit)
+
+    async def resolve(
+        self, confirmation_id: str, user_id: str, status: str
+    ) -> PendingConfirmation | None:
+        """Move a pending confirmation to ``status``; None if there is no such pending item."""
+        confirmation = self._items.get(confirmation_id)
+        if (
+            confirmation is None
+            or confirmation.user_id != user_id
+            or confirmation.status != "pending"
+        ):
+            return None
+        confirmation.status = status
+        return confirmation
+
+
+class PostgresConfirmationStore(ConfirmationStore):
+    """Confirmations in Postgres, queried through the shared pool off the event loop."""
+
+    async def start(self) -> None:
+        await db.execute(SCHEMA)
+
+    async def create_many(
+        self, confirmations: list[PendingConfirmation]
+    ) -> list[PendingConfirmation]:
+        created = [_prepare(c) for c in confirmations]
+        if not created:
+            return created
+
+        def _insert(conn) -> None:
+            with conn.cursor() as cur:
+                # One multi-row INSERT for the whole batch
+                execute_values(
+                    cur,
+                    f"INSERT INTO hitl_confirmations ({COLUMNS}) VALUES %s",
+                    [(
+                        c.id, c.user_id, c.fact_type.value, c.old_value, c.new_value,
+                        c.confidence, c.context, c.status, c.created_at,
+                    ) for c in created],
+                    page_size=len(created),
+                )
+
+        await db.run(_insert)
+        return created
+
+    async def list_for_user(
+        self,
+        user_id: str,
+        status: str = "pending",
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[PendingConfirmation], str | None]:
+        where = "user_id = %s AND status = %s"
+        params: list = [user_id, status]
+        if cursor:
+            where += " AND (created_at, id) < (%s, %s)"
+            params.extend(decode_cursor(cursor))
+        params.append(limit + 1)
+
+        def _select(conn) -> list[tuple]:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""SELECT {COLUMNS} FROM hitl_confirmations WHERE {where}
+                    ORDER BY created_at DESC, id DESC LIMIT %s""",
+                    params,
+                )
+                return cur.fetchall()
+
+        rows = await db.run(_select)
+        return _page([_from_row(row) for row in rows], limit)
+
+    async def resolve(
+        self, confirmation_id: str, user_id: str, status: str
+    ) -> PendingConfirmation | None:
+        def _update(conn) -> tuple | None:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""UPDATE hitl_confirmations SET status = %s, resolved_at = now()
+                    WHERE id = %s AND user_id = %s AND status = 'pending'
+                    RETURNING {COLUMNS}""",
+                    (status, confirmation_id, user_id),
+                )
+                return cur.fetchone()
+
+        row = await db.run(_update)
+        return _from_row(row) if row else None
+
+
+class SharedConfirmationStore(ConfirmationStore):
+    """Confirmations in the shared state database, visible to every worker."""
+
+    async def start(self) -> None:
+        await shared_state.state.execute_script(SHARED_SCHEMA)
+
+    async def create_many(
+        self, confirmations: list[PendingConfirmation]
+    ) -> list[PendingConfirmation]:
+        created = [_prepare(c) for c in confirmations]
+        if not created:
+            return created
+
+        def _insert(conn) -> None:
+            conn.executemany(
+                f"INSERT INTO hitl_confirmations ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(
+                    c.id, c.user_id, c.fact_type.value, c.old_value, c.new_value,
+                    c.confidence, c.context, c.status, _to_micros(c.created_at),
+                ) for c in created],
+            )
+
+        await shared_state.state.run(_insert, write=True)
+        return created
+
+    async def list_for_user(
+        self,
+        user_id: str,
+        status: str = "pending",
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[PendingConfirmation], str | None]:
+        where = "user_id = ? AND status = ?"
+        params: list = [user_id, status]
+        if cursor:
+            created_at, confirmation_id = decode_cursor(cursor)
+            where += " AND (created_at, id) < (?, ?)"
+            params.extend((_to_micros(created_at), confirmation_id))
+        params.append(limit + 1)
+
+        def _select(conn) -> list[tuple]:
+            return conn.execute(
+                f"""SELECT {COLUMNS} FROM hitl_confirmations WHERE {where}
+                ORDER BY created_at DESC, id DESC LIMIT ?""",
+                params,
+            ).fetchall()
+
+        rows = await shared_state.state.run(_select)
+        return _page([_from_shared_row(row) for row in rows], limit)
+
+    async def resolve(
+        self, confirmation_id: str, user_id: str, status: str
+    ) -> PendingConfirmation | None:
+        def _update(conn) -> tuple | None:
+            return conn.execute(
+                f"""UPDATE hitl_confirmations SET status = ?, resolved_at = ?
+                WHERE id = ? AND user_id = ? AND status = 'pending'
+                RETURNING {COLUMNS}""",
+                (status, _to_micros(datetime.now(UTC)), confirmation_id, user_id),
+            ).fetchone()
+
+        row = await shared_state.state.run(_update, write=True)
+        return _from_shared_row(row) if row else None
+
+
+def _to_micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_shared_row(row: tuple) -> PendingConfirmation:
+    return _from_row((*row[:-1], _EPOCH + timedelta(microseconds=row[-1])))
+
+
+def _from_row(row: tuple) -> PendingConfirmation:
+    id_, user_id, fact_type, old_value, new_value, confidence, context, status, created_at = row
+    return PendingConfirmation(
+        id=id_,
+        user_id=user_id,
+        fact_type=FactType(fact_type),
+        old_value=old_value,
+        new_value=new_value,
+        confidence=confidence,
+        context=context,
+        status=status,
+        created_at=created_at,
+    )
+
+
+def _page(
+    items: list[PendingConfirmation], limit: int
+) -> tuple[list[PendingConfirmation], str | None]:
+    """Trim a limit+1 fetch to a page and derive the next cursor."""
+    if len(items) > limit:
+        items = items[:limit]
+        return items, encode_cursor(items[-1])
+    return items, None
+
+
+if db.is_configured():
+    confirmations = PostgresConfirmationStore()
+elif shared_state.is_shared():
+    confirmations = SharedConfirmationStore()
+else:
+    confirmations = ConfirmationStore()
@@ -0,0 +1,196 @@
+"""Token-budgeted assembly of conversation history and user context."""
+
+import asyncio
+import os
+import re
+
+from . import metrics
+from .memory import search_memory_prefetched
+from .zep import get_user_facts
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Caps as fractions of the budget for the lower-priority sections
+CONTEXT_FACTS_SHARE = float(os.getenv("CONTEXT_FACTS_SHARE", "0.15"))
+CONTEXT_MEMORY_SHARE = float(os.getenv("CONTEXT_MEMORY_SHARE", "0.25"))
+CONTEXT_SUMMARY_SHARE = float(os.getenv("CONTEXT_SUMMARY_SHARE", "0.10"))
+CONTEXT_MEMORY_LIMIT = int(os.getenv("CONTEXT_MEMORY_LIMIT", "5"))
+SUMMARY_SNIPPET_CHARS = 80
+
+SECTIONS = ("message", "history", "facts", "memories", "summary")
+
+section_tokens = metrics.histogram(
+    "quest_context_tokens",
+    "Estimated prompt tokens per context section",
+    labels=("section",),
+    buckets=(0, 50, 100, 250, 500, 1000, 2000, 4000, 8000),
+)
+
+_WORD = re.compile(r"\S+")
+_SENTENCE_END = re.compile(r"(?<=[.?!])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: the larger of ~4 chars/token and ~0.75 words/token."""
+    return max(len(text) // 4, len(_WORD.findall(text)) * 4 // 3) + 1
+
+
+def render_turn(role: str, content: str) -> str:
+    """Render a turn the way it appears in the prompt."""
+    return f"{role}: {content}"
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut text down to roughly a token count."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    return text[:max(tokens * 4 - 3, 0)] + "..."
+
+
+def _summarize(turns: list[str], budget: int) -> str:
+    """Extractive summary of dropped turns: the opening of each user turn."""
+    snippets = []
+    for line in turns:
+        role, _, content = line.partition(": ")
+        if role != "user":
+            continue
+        first = _SENTENCE_END.split(content.strip(), maxsplit=1)[0]
+        snippets.append(_truncate(first, SUMMARY_SNIPPET_CHARS // 4))
+    if not snippets:
+        return ""
+
+    header = f"Earlier in the conversation ({len(turns)} turns omitted), the user asked about:"
+    lines = [header]
+    used = estimate_tokens(header)
+    # Keep the most recent omitted topics when the budget is tight
+    kept = []
+    for snippet in reversed(snippets):
+        cost = estimate_tokens(snippet) + 1
+        if used + cost > budget:
+            break
+        kept.append(f"- {snippet}")
+        used += cost
+    if not kept:
+        return ""
+    return "\n".join(lines + kept[::-1])
+
+
+class AssembledContext:
+    """Prompt pieces packed into a token budget, with per-section usage."""
+
+    def __init__(self, context: str, conversation: str, usage: dict[str, int], budget: int):
+        self.context = context
+        self.conversation = conversation
+        self.usage = usage
+        self.budget = budget
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.usage.values())
+
+
+def assemble_context(
+    history: list[str],
+    memories: list[str] | None = None,
+    facts: list[str] | None = None,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    history_tokens: list[int] | None = None,
+) -> AssembledContext:
+    """Pack history, memory snippets and graph facts into a token budget.
+
+    ``history`` is rendered turns, oldest first; the last one is the current
+    message. Priority order: the current message, the previous exchange, user
+    facts, memory snippets, older history (newest first), then a summary of
+    whatever history didn't fit. Pass ``history_tokens`` to reuse estimates.
+    """
+    memories = memories or []
+    facts = facts or []
+    if history_tokens is None:
+        history_tokens = [estimate_tokens(line) for line in history]
+    usage = dict.fromkeys(SECTIONS, 0)
+    remaining = budget
+
+    # Current message always goes in, truncated only if it alone exceeds the budget
+    kept_history: list[str] = []
+    if history:
+        message = _truncate(history[-1], budget)
+        usage["message"] = min(history_tokens[-1], budget)
+        remaining -= usage["message"]
+        kept_history.append(message)
+
+    def take_history(index: int) -> bool:
+        nonlocal remaining
+        if history_tokens[index] > remaining:
+            return False
+        kept_history.append(history[index])
+        usage["history"] += history_tokens[index]
+        remaining -= history_tokens[index]
+        return True
+
+    # The previous exchange is what the current message most often refers to
+    older = list(range(len(history) - 2, -1, -1))
+    cursor = 0
+    while cursor < min(2, len(older)) and take_history(older[cursor]):
+        cursor += 1
+
+    def take_list(items: list[str], cap: int, section: str) -> list[str]:
+        nonlocal remaining
+        taken = []
+        for item in items:
+            cost = estimate_tokens(item) + 1
+            if usage[section] + cost > cap or cost > remaining:
+                break
+            taken.append(item)
+            usage[section] += cost
+            remaining -= cost
+        return taken
+
+    kept_facts = take_list(facts, int(budget * CONTEXT_FACTS_SHARE), "facts")
+    kept_memories = take_list(memories, int(budget * CONTEXT_MEMORY_SHARE), "memories")
+
+    # Older history, newest first, leaving room for the summary
+    summary_reserve = int(budget * CONTEXT_SUMMARY_SHARE)
+    if cursor == min(2, len(older)):
+        remaining -= summary_reserve
+        while cursor < len(older) and take_history(older[cursor]):
+            cursor += 1
+        remaining += summary_reserve
+    dropped = [history[i] for i in sorted(older[cursor:])]
+
+    summary = ""
+    if dropped:
+        summary = _summarize(dropped, min(summary_reserve, remaining))
+        usage["summary"] = estimate_tokens(summary) if summary else 0
+
+    conversation_lines = kept_history[::-1]
+    if summary:
+        conversation_lines.insert(0, summary)
+
+    context_parts = []
+    if kept_facts:
+        context_parts.append("Known facts about the user:\n" + "\n".join(
+            f"- {fact}" for fact in kept_facts
+        ))
+    if kept_memories:
+        context_parts.append("Previous relevant context:\n" + "\n".join(
+            f"- {memory}" for memory in kept_memories
+        ))
+
+    for section, tokens in usage.items():
+        section_tokens.observe(tokens, section=section)
+    return AssembledContext(
+        "\n\n".join(context_parts), "\n".join(conversation_lines), usage, budget
+    )
+
+
+async def gather_user_context(user_id: str | None, query: str) -> tuple[list[str], list[str]]:
+    """Fetch memory snippets and graph facts for a user concurrently.
+
+    Both come from caches when the user's context was prefetched.
+    """
+    if not user_id:
+        return [], []
+    memories, facts = await asyncio.gather(
+        search_memory_prefetched(user_id, query, CONTEXT_MEMORY_LIMIT),
+        get_user_facts(user_id),
+    )
+    return [str(memory) for memory in memories], facts
@@ -0,0 +1,67 @@
+"""Pooled Postgres access that runs off the event loop."""
+
+import asyncio
+import os
+import threading
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from psycopg2.extensions import connection
+from psycopg2.pool import ThreadedConnectionPool
+
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+T = TypeVar("T")
+
+_pool: ThreadedConnectionPool | None = None
+# ThreadedConnectionPool raises when exhausted; this makes callers wait instead
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_pool_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    """Whether a database URL is set."""
+    return bool(DATABASE_URL)
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Get the shared connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
+        return _pool
+
+
+def _with_connection(fn: Callable[[connection], T]) -> T:
+    with _slots:
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn:  # commits on success, rolls back on error
+                return fn(conn)
+        finally:
+            pool.putconn(conn)
+
+
+async def run(fn: Callable[[connection], T]) -> T:
+    """Run fn(conn) with a pooled connection in a worker thread."""
+    return await asyncio.to_thread(_with_connection, fn)
+
+
+async def execute(sql: str, params: Any = None) -> None:
+    """Execute a statement in its own transaction."""
+    def _execute(conn: connection) -> None:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+    await run(_execute)
+
+
+def close_pool() -> None:
+    """Close every pooled connection."""
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
@@ -0,0 +1,42 @@
+"""Local text embeddings for in-process similarity search.
+
+Vectors come from signed feature hashing of word unigrams and bigrams, so they
+are deterministic across processes, need no model download or network call,
+and cost microseconds per query. They capture lexical overlap, which is what
+article titles/summaries and repeated questions mostly share.
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> list[str]:
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Embed text as an L2-normalized float32 vector."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode())
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def embed_batch(texts: list[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Embed several texts as rows of a float32 matrix."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        matrix[i] = embed(text, dim)
+    return matrix
@@ -0,0 +1,188 @@
+"""Cheap rule-and-lexicon gate in front of fact extraction.
+
+Most chat turns ("thanks!", "what about healthcare?") say nothing about the
+user, yet each one would cost a full fact_extractor model call. This module
+scores a message for signs of the FactType categories (places, family, work,
+money, dates, languages, visas) plus self-reference, in microseconds and
+without any model, so extraction can be skipped below a threshold. Short
+answers to the assistant's intake questions ("Portugal", "Married with two
+kids") count as self-reference: they describe the user without saying "I".
+"""
+
+import os
+import re
+
+from . import metrics
+from .schemas import FactType
+
+FACT_GATE_ENABLED = os.getenv("FACT_GATE_ENABLED", "true").lower() == "true"
+# Messages scoring below this skip extraction; lower it to trade calls for recall
+FACT_GATE_THRESHOLD = float(os.getenv("FACT_GATE_THRESHOLD", "0.5"))
+
+gate_decisions = metrics.counter(
+    "quest_fact_gate_total",
+    "Fact extraction requests by pre-classifier decision",
+    labels=("decision",),
+)
+
+
+def _words(*words: str) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(words) + r")\b")
+
+
+# The user talking about themselves or their household ("me" is left out:
+# it is mostly "tell me ...", which asks rather than tells)
+SELF_REFERENCE = _words(
+    "i", "i'm", "im", "i've", "i'd", "i'll", "my", "mine", "myself",
+    "we", "we're", "we've", "we'd", "we'll", "us", "our", "ours",
+)
+
+# Short statements up to this many words read as answers to the assistant's
+# last question, unless they open like a question or a request
+SHORT_ANSWER_WORDS = 8
+REQUEST_OPENERS = _words(
+    "what", "what's", "whats", "which", "where", "when", "why", "who", "how", "is", "are",
+    "can", "could", "would", "should", "do", "does", "tell", "show", "give", "list",
+    "explain", "compare", "describe", "summarise", "summarize", "please", "thanks",
+    "thank", "ok", "okay",
+)
+
+COUNTRIES = (
+    "portugal", "spain", "france", "italy", "germany", "greece", "ireland", "uk",
+    "united kingdom", "england", "scotland", "wales", "netherlands", "belgium",
+    "switzerland", "austria", "sweden", "norway", "denmark", "finland", "poland",
+    "croatia", "cyprus", "malta", "usa", "united states", "america", "canada",
+    "mexico", "costa rica", "panama", "colombia", "brazil", "argentina", "chile",
+    "uruguay", "ecuador", "peru", "australia", "new zealand", "japan", "thailand",
+    "vietnam", "indonesia", "bali", "malaysia", "singapore", "philippines", "india",
+    "uae", "dubai", "turkey", "morocco", "south africa", "china", "korea",
+)
+CITIES = (
+    "lisbon", "porto", "madrid", "barcelona", "valencia", "paris", "berlin", "rome",
+    "milan", "amsterdam", "dublin", "london", "manchester", "edinburgh", "new york",
+    "san francisco", "los angeles", "chicago", "toronto", "vancouver", "sydney",
+    "melbourne", "tokyo", "bangkok", "chiang mai", "mexico city", "medellin",
+    "buenos aires", "athens", "prague", "vienna", "zurich", "copenhagen", "stockholm",
+)
+LANGUAGES = (
+    "english", "spanish", "portuguese", "french", "german", "italian", "dutch",
+    "greek", "japanese", "mandarin", "chinese", "thai", "arabic", "russian", "polish",
+)
+
+# Per category: (weak signals, strong signals). Weak signals (a country name,
+# "visa") appear in questions too; strong ones almost only in statements.
+SIGNALS: dict[FactType, tuple[re.Pattern, re.Pattern]] = {
+    FactType.CURRENT_LOCATION: (
+        _words(*COUNTRIES, *CITIES),
+        re.compile(r"\b(?:live|living|based|staying|reside|residing|grew up) "
+                   r"(?:in|near|outside)\b"
+                   r"|\b(?:i'm|i am|we're|we are) (?:from|in)\b"
+                   r"|\b(?:currently|presently|right now) (?:in|living|based|staying)\b"),
+    ),
+    FactType.DESTINATION_PREFERENCE: (
+        _words("move", "moving", "relocate", "relocating", "retire to", "settle",
+               "prefer", "considering", "thinking about", "interested in", "dream"),
+        re.compile(r"\b(?:move|moving|relocate|relocating|retire|emigrate|emigrating) "
+                   r"(?:to|abroad)\b"
+                   r"|\b(?:want|plan|planning|hope|hoping|would like|'d like) to "
+                   r"(?:live|move|relocate|retire)\b"
+                   r"|\b(?:prefer|love|leaning towards|set on|decided on)\b"),
+    ),
+    FactType.FAMILY_STATUS: (
+        _words("family", "married", "single", "divorced", "widowed", "pregnant",
+               "kids", "children", "baby", "toddler", "teenager"),
+        re.compile(r"\b(?:my|our) (?:wife|husband|partner|spouse|kids?|children|son|daughter|"
+                   r"family|parents?|mum|mom|dad|dog|cat|pets?|girlfriend|boyfriend|fianc[ée]e?)\b"
+                   r"|\b(?:i|we) have (?:a|an|one|two|three|\d+) (?:dog|cat|pets?|kids?|children|"
+                   r"sons?|daughters?|baby|toddler)\b"
+                   r"|\b(?:family of|\d+ (?:kids|children))\b"),
+    ),
+    FactType.JOB_STATUS: (
+        _words("job", "work", "working", "employer", "remote", "freelance", "freelancer",
+               "self-employed", "contractor", "retired", "retiring", "unemployed", "laid off",
+               "business", "career", "salary"),
+        re.compile(r"\b(?:i|we) (?:work|am working|'m working)\b"
+                   r"|\b(?:i'm|i am|we're|we are) (?:an? |self-employed|retired|unemployed|"
+                   r"freelanc|working|between jobs|looking for work)"
+                   r"|\bmy (?:job|employer|company|boss|salary|business|career)\b"),
+    ),
+    FactType.BUDGET_RANGE: (
+        _words("budget", "afford", "savings", "income", "pension", "rent", "mortgage",
+               "usd", "eur", "gbp", "dollars", "euros", "pounds"),
+        re.compile(r"[$€£]\s?\d|\b\d[\d,.]*\s?(?:k|usd|eur|gbp|dollars|euros|pounds)\b"
+                   r"|\b(?:my|our) (?:budget|savings|income|pension)\b"
+                   r"|\b(?:per|a|/) ?month\b.*\d|\d.*\b(?:per|a|/) ?month\b"),
+    ),
+    FactType.TIMELINE: (
+        _words("january", "february", "march", "april", "june", "july", "august",
+               "september", "october", "november", "december", "spring", "summer",
+               "autumn", "fall", "winter", "soon", "asap"),
+        re.compile(r"\b(?:next|this) (?:year|month|spring|summer|autumn|fall|winter)\b"
+                   r"|\b(?:in|within) (?:\d+|a few|a couple of|two|three|six) "
+                   r"(?:weeks|months|years)\b"
+                   r"|\b20[2-4]\d\b|\bby (?:the )?(?:end of|spring|summer|autumn|fall|winter)\b"),
+    ),
+    FactType.LANGUAGE: (
+        _words(*LANGUAGES),
+        re.compile(r"\b(?:speak|fluent|native speaker|learning|bilingual)\b"),
+    ),
+    FactType.VISA_REQUIREMENT: (
+        _words("visa", "passport", "citizen", "citizenship", "nationality", "residency",
+               "green card", "work permit"),
+        re.compile(r"\b(?:i|we) (?:have|hold|got|need)\b.*\b(?:visa|passport|citizenship|"
+                   r"residency|permit)\b|\b(?:citizen|national) of\b|\b(?:eu|uk|us) citizens?\b"),
+    ),
+    # Age has no category of its own; the extractor records it as a custom fact
+    FactType.CUSTOM: (
+        _words("age", "aged"),
+        re.compile(r"\b\d{1,2} years? old\b|\b(?:i'm|i am|aged?) \d{1,2}\b"),
+    ),
+}
+
+WEAK, STRONG, SELF = 0.3, 0.6, 0.3
+
+
+def fact_signals(text: str) -> dict[FactType, float]:
+    """Signal strength per fact category found in a message."""
+    lowered = text.lower().replace("’", "'")
+    found = {}
+    for fact_type, (weak, strong) in SIGNALS.items():
+        if strong.search(lowered):
+            found[fact_type] = STRONG
+        elif weak.search(lowered):
+            found[fact_type] = WEAK
+    return found
+
+
+def is_short_answer(text: str) -> bool:
+    """Whether a message reads as a terse reply ("Lisbon or Porto") rather than a request."""
+    lowered = text.lower().replace("’", "'").strip()
+    return (
+        "?" not in lowered
+        and len(lowered.split()) <= SHORT_ANSWER_WORDS
+        and not REQUEST_OPENERS.match(lowered)
+    )
+
+
+def fact_score(text: str) -> float:
+    """Rough likelihood (0-1) that a message states facts about the user.
+
+    The strongest category signal plus a bonus for a second category, plus
+    another when the user talks about themselves or gives a short answer.
+    """
+    signals = sorted(fact_signals(text).values(), reverse=True)
+    if not signals:
+        return 0.0
+    score = signals[0] + (0.1 if len(signals) > 1 else 0.0)
+    if SELF_REFERENCE.search(text.lower().replace("’", "'")) or is_short_answer(text):
+        score += SELF
+    return min(score, 1.0)
+
+
+def should_extract(text: str, threshold: float = FACT_GATE_THRESHOLD) -> bool:
+    """Whether a message is worth a fact extraction call; counts the decision."""
+    if not FACT_GATE_ENABLED or fact_score(text) >= threshold:
+        gate_decisions.inc(decision="extract")
+        return True
+    gate_decisions.inc(decision="skip")
+    return False
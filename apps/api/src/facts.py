@@ -0,0 +1,169 @@
+"""Per-user fact state, so only new or changed facts reach the ZEP graph."""
+
+import os
+
+import httpx
+
+from . import metrics
+from .agents import extract_facts
+from .cache import AsyncCache, normalize_query
+from .confirmations import confirmations
+from .schemas import ExtractedFact, FactExtractionResult, FactType, PendingConfirmation
+from .writeback import queue_fact_sync
+from .zep import USERS_GRAPH_ID, ZEP_API_KEY, load_user_graph
+
+FACT_STATE_CACHE_SIZE = int(os.getenv("FACT_STATE_CACHE_SIZE", "10000"))
+FACT_STATE_TTL = float(os.getenv("FACT_STATE_TTL", "1800"))
+
+fact_changes = metrics.counter(
+    "quest_fact_changes_total",
+    "Extracted facts by how they compare with the user's known facts",
+    labels=("change",),
+)
+
+# Known facts per user, keyed by fact_key; loaded from the user graph on a miss
+fact_states = AsyncCache("fact_state", FACT_STATE_CACHE_SIZE, FACT_STATE_TTL)
+
+
+def fact_payload(fact: ExtractedFact) -> dict:
+    """A fact as sent to the ZEP user graph."""
+    return {"type": fact.type.value, "value": fact.value, "confidence": fact.confidence}
+
+
+def fact_key(fact_type: FactType, value: str) -> str:
+    """State key for a fact: its type, or type and value for custom facts."""
+    if fact_type == FactType.CUSTOM:
+        return f"{fact_type.value}:{normalize_query(value)}"
+    return fact_type.value
+
+
+class FactDelta:
+    """How extracted facts differ from what is already known about a user."""
+
+    def __init__(self):
+        self.added: list[ExtractedFact] = []
+        self.changed: list[tuple[ExtractedFact, ExtractedFact]] = []  # (old, new)
+        self.unchanged: list[ExtractedFact] = []
+        self.facts: list[ExtractedFact] = []  # every fact, in extraction order
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed)
+
+    @property
+    def accepted(self) -> list[ExtractedFact]:
+        """New or changed facts that can be stored without asking the user."""
+        return [
+            fact for fact in self.added + [new for _, new in self.changed]
+            if not fact.requires_confirmation
+        ]
+
+    def confirmations(self, user_id: str) -> list[PendingConfirmation]:
+        """Pending confirmations for facts that need the user's approval."""
+        old_values = {id(new): old.value for old, new in self.changed}
+        return [
+            PendingConfirmation(
+                user_id=user_id,
+                fact_type=fact.type,
+                old_value=old_values.get(id(fact)),
+                new_value=fact.value,
+                confidence=fact.confidence,
+                context=fact.context,
+            )
+            for fact in self.added + [new for _, new in self.changed]
+            if fact.requires_confirmation
+        ]
+
+
+def diff_facts(state: dict[str, ExtractedFact], facts: list[ExtractedFact]) -> FactDelta:
+    """Compare extracted facts with known state.
+
+    Each fact keeps the extractor's ``requires_confirmation`` flag; a changed
+    fact that needs confirmation carries the known value as ``old_value``.
+    """
+    delta = FactDelta()
+    for fact in facts:
+        known = state.get(fact_key(fact.type, fact.value))
+        if known is None:
+            delta.added.append(fact)
+        elif normalize_query(known.value) == normalize_query(fact.value):
+            delta.unchanged.append(fact)
+        else:
+            delta.changed.append((known, fact))
+        delta.facts.append(fact)
+    fact_changes.inc(len(delta.added), change="added")
+    fact_changes.inc(len(delta.changed), change="changed")
+    fact_changes.inc(len(delta.unchanged), change="unchanged")
+    return delta
+
+
+async def _load_state(user_id: str) -> dict[str, ExtractedFact]:
+    graph = await load_user_graph(user_id)
+    state = {}
+    for raw in (graph or {}).get("facts", []):
+        if not isinstance(raw, dict):
+            continue
+        try:
+            fact = ExtractedFact(
+                type=FactType(raw.get("type")),
+                value=str(raw.get("value", "")),
+                confidence=raw.get("confidence", 1.0),
+            )
+        except ValueError:
+            continue
+        state[fact_key(fact.type, fact.value)] = fact
+    return state
+
+
+async def get_fact_state(user_id: str) -> dict[str, ExtractedFact]:
+    """Known facts for a user, from the cache or the user graph.
+
+    If the graph can't be read, returns no facts without caching that.
+    """
+    if not ZEP_API_KEY or not USERS_GRAPH_ID:
+        return {}
+    try:
+        return await fact_states.get_or_load(user_id, lambda: _load_state(user_id))
+    except httpx.HTTPError:
+        return {}
+
+
+def apply_facts(user_id: str, facts: list[ExtractedFact]) -> None:
+    """Record facts as known for a user once they've been queued for sync."""
+    if not facts:
+        return
+    found, state = fact_states.get(user_id)
+    if not found:
+        # Not cached: the next read loads fresh state from the graph
+        return
+    state = dict(state)
+    for fact in facts:
+        state[fact_key(fact.type, fact.value)] = fact
+    fact_states.set(user_id, state)
+
+
+async def extract_fact_changes(
+    user_id: str | None, text: str
+) -> tuple[FactExtractionResult, FactDelta]:
+    """Extract facts with the user's known facts as context, and diff them.
+
+    ``has_changes`` on the result reflects the diff, not the model's opinion.
+    """
+    state = await get_fact_state(user_id) if user_id else {}
+    result = await extract_facts(text, list(state.values()) or None)
+    delta = diff_facts(state, result.facts)
+    return result.model_copy(update={"facts": delta.facts, "has_changes": delta.has_changes}), delta
+
+
+async def commit_fact_changes(user_id: str, deltas: list[FactDelta]) -> list[PendingConfirmation]:
+    """Sync accepted facts, record them as known, and store pending confirmations.
+
+    Accepted facts from every delta go out in one queued write; facts that
+    need approval are stored as confirmations carrying the old value.
+    """
+    accepted = [fact for delta in deltas for fact in delta.accepted]
+    if accepted:
+        await queue_fact_sync(user_id, [fact_payload(fact) for fact in accepted])
+        apply_facts(user_id, accepted)
+    pending = [c for delta in deltas for c in delta.confirmations(user_id)]
+    return await confirmations.create_many(pending) if pending else []
@@ -0,0 +1,265 @@
+"""Idempotency keys for the expensive chat endpoints.
+
+Frontends retry /chat and /chat/complete on network hiccups. A request that
+carries an ``Idempotency-Key`` header runs once per key: a retry arriving
+while the original is still running attaches to the same task (and, for
+streams, replays what was sent so far before following along live), and a
+retry after it finished gets the stored response. So a retry never re-runs
+the agent, fact extraction or conversation storage. A stream nobody is
+reading any more is cancelled after IDEMPOTENCY_ABANDON_GRACE seconds, long
+enough for a retry to attach, so the model isn't kept busy for a client
+that went away.
+
+Completed responses are kept in a shared cache, so every worker can replay
+them; in-flight work is only visible to the worker running it.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+from starlette.responses import Response, StreamingResponse
+
+from . import metrics
+from .shared_state import shared_cache
+from .streaming import DATA_STREAM_HEADER, stream_failed
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "5000"))
+IDEMPOTENCY_ABANDON_GRACE = float(os.getenv("IDEMPOTENCY_ABANDON_GRACE", "10"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+idempotent_requests = metrics.counter(
+    "quest_idempotent_requests_total",
+    "Requests with an idempotency key by outcome (new, attached, replayed, conflict)",
+    labels=("route", "outcome"),
+)
+
+# Headers that describe one particular transfer of the body
+_TRANSFER_HEADERS = {"content-length", "transfer-encoding"}
+
+
+def fingerprint(body: bytes | str) -> str:
+    """Hash of a request body, to reject a key reused for a different request."""
+    return hashlib.sha256(body.encode() if isinstance(body, str) else body).hexdigest()
+
+
+def _headers(response: Response) -> dict[str, str]:
+    return {
+        name: value for name, value in response.headers.items()
+        if name not in _TRANSFER_HEADERS
+    }
+
+
+class Execution:
+    """One run of a request handler, shared by the original request and its retries.
+
+    The handler runs in its own task, so a client disconnecting doesn't stop
+    it. Streamed bodies are drained into a buffer that every attached
+    request replays from the start; once no request has followed the stream
+    for IDEMPOTENCY_ABANDON_GRACE seconds, the run is cancelled.
+    """
+
+    def __init__(self, request_fingerprint: str):
+        self.fingerprint = request_fingerprint
+        self.started: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.chunks: list[bytes] = []
+        self.done = False
+        self.failed = False
+        self._changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self._followers = 0
+        self._abandon: asyncio.TimerHandle | None = None
+
+    async def run(self, handler: Callable[[], Awaitable[Response]]) -> None:
+        try:
+            response = await handler()
+        except asyncio.CancelledError:
+            self.started.cancel()
+            self._finish()
+            raise
+        except Exception as e:
+            self.started.set_exception(e)
+            # Attached requests re-raise it; don't warn if there were none
+            self.started.exception()
+            self._finish()
+            return
+        self.started.set_result(response)
+        try:
+            if isinstance(response, StreamingResponse):
+                async for chunk in response.body_iterator:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode(response.charset)
+                    self._append(chunk)
+            else:
+                self._append(response.body)
+        except asyncio.CancelledError:
+            self.failed = True
+            raise
+        except Exception as e:
+            self.failed = True
+            print(f"Idempotent request failed mid-response: {e}")
+        finally:
+            self._finish()
+
+    def _append(self, chunk: bytes) -> None:
+        self.chunks.append(chunk)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _finish(self) -> None:
+        self.done = True
+        self._changed.set()
+        if self._abandon is not None:
+            self._abandon.cancel()
+
+    def _watch(self) -> None:
+        """Cancel the run if nobody follows it IDEMPOTENCY_ABANDON_GRACE from now."""
+        if self.done:
+            return
+        if self._abandon is not None:
+            self._abandon.cancel()
+        self._abandon = asyncio.get_running_loop().call_later(
+            IDEMPOTENCY_ABANDON_GRACE, self._abandon_if_idle
+        )
+
+    def _abandon_if_idle(self) -> None:
+        if not self.done and not self._followers and self.task is not None:
+            self.task.cancel()
+
+    async def replay(self) -> AsyncIterator[bytes]:
+        """Everything sent so far, then each new chunk until the body is complete."""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                return
+            await changed.wait()
+
+    async def _follow(self) -> AsyncIterator[bytes]:
+        """``replay`` for one client, counted while the client is reading."""
+        self._followers += 1
+        try:
+            async for chunk in self.replay():
+                yield chunk
+        finally:
+            self._followers -= 1
+            if not self._followers:
+                self._watch()
+
+    async def response(self) -> Response:
+        """A response for one attached request, following the shared run."""
+        original: Response = await asyncio.shield(self.started)
+        if isinstance(original, StreamingResponse):
+            # Covers a client that is gone before it starts reading
+            self._watch()
+            return StreamingResponse(
+                self._follow(), status_code=original.status_code, headers=_headers(original)
+            )
+        body = b"".join([chunk async for chunk in self.replay()])
+        return Response(body, original.status_code, _headers(original))
+
+    def record(self) -> dict | None:
+        """The finished response to store for replays, if it should be stored."""
+        if self.failed or self.started.cancelled() or self.started.exception() is not None:
+            return None
+        original: Response = self.started.result()
+        body = b"".join(self.chunks).decode()
+        # Only successful responses are final; a retry after an error runs again
+        if original.status_code >= 400:
+            return None
+        if DATA_STREAM_HEADER in original.headers and stream_failed(body):
+            return None
+        return {
+            "fingerprint": self.fingerprint,
+            "status": original.status_code,
+            "headers": _headers(original),
+            "body": body,
+        }
+
+
+class IdempotencyStore:
+    """Completed responses by key, and the executions still running."""
+
+    def __init__(self):
+        self.results = shared_cache("idempotency", IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL)
+        self._inflight: dict[tuple[str, str, str], Execution] = {}
+
+    async def run(
+        self,
+        route: str,
+        key: str | None,
+        scope: str | None,
+        request_fingerprint: str,
+        handler: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """Run ``handler`` once per (route, scope, key); without a key, just run it.
+
+        ``scope`` (the user id) keeps one client's keys from matching
+        another's. Reusing a key for a different request body is a 422.
+        """
+        if not key:
+            return await handler()
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} is too long")
+
+        cache_key = (route, scope or "", key)
+        found, record = await self.results.aget(cache_key)
+        if found:
+            self._check(route, record["fingerprint"], request_fingerprint)
+            idempotent_requests.inc(route=route, outcome="replayed")
+            return Response(
+                record["body"], record["status"],
+                {**record["headers"], "Idempotent-Replayed": "true"},
+            )
+
+        execution = self._inflight.get(cache_key)
+        if execution is not None:
+            self._check(route, execution.fingerprint, request_fingerprint)
+            idempotent_requests.inc(route=route, outcome="attached")
+            return await execution.response()
+
+        idempotent_requests.inc(route=route, outcome="new")
+        execution = self._inflight[cache_key] = Execution(request_fingerprint)
+        execution.task = asyncio.create_task(self._execute(cache_key, execution, handler))
+        return await execution.response()
+
+    def _check(self, route: str, expected: str, actual: str) -> None:
+        if expected != actual:
+            idempotent_requests.inc(route=route, outcome="conflict")
+            raise HTTPException(
+                status_code=422,
+                detail=f"{IDEMPOTENCY_HEADER} was already used for a different request",
+            )
+
+    async def _execute(
+        self,
+        cache_key: tuple[str, str, str],
+        execution: Execution,
+        handler: Callable[[], Awaitable[Response]],
+    ) -> None:
+        # Stored before leaving _inflight, so a retry always finds one of them
+        try:
+            await execution.run(handler)
+            record = execution.record()
+            if record is not None:
+                await self.results.aset(cache_key, record)
+        finally:
+            if self._inflight.get(cache_key) is execution:
+                del self._inflight[cache_key]
+
+    async def stop(self) -> None:
+        """Cancel executions still running."""
+        tasks = [e.task for e in self._inflight.values() if e.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+idempotency = IdempotencyStore()
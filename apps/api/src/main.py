@@ -1,42 +1,119 @@
 """Quest API - FastAPI + Pydantic AI."""
 
+import asyncio
 import os
+import time
 import uuid
-from contextlib import asynccontextmanager
-from typing import Optional
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Optional
 
-import logfire
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import ValidationError
 from starlette.requests import Request
-from starlette.responses import Response
-from pydantic_ai.messages import ModelMessage, UserPromptPart
+from starlette.responses import Response, StreamingResponse
 
+from . import db, import_started, metrics
+from .admission import lane, model_limiter, route_lane
+from .agents import (
+    AGENT_WARMUP,
+    FACT_MICRO_BATCHING,
+    agent_registry,
+    extract_facts_batch,
+    fact_batcher,
+    get_relocation_response,
+    stream_placement_response,
+    stream_relocation_response,
+)
+from .article_index import article_indexes
+from .clients import registry as http_clients
+from .conditions import get_user_conditions
+from .confirmations import CONFIRMATION_PAGE_MAX, confirmations
+from .context import AssembledContext, assemble_context, gather_user_context, render_turn
+from .facts import (
+    FactDelta,
+    apply_facts,
+    commit_fact_changes,
+    diff_facts,
+    extract_fact_changes,
+    fact_key,
+    fact_payload,
+    get_fact_state,
+)
+from .idempotency import IDEMPOTENCY_HEADER, fingerprint, idempotency
+from .memory_mirror import memory_mirror
+from .prefetch import prefetcher
+from .resilience import circuit_states, deadline
+from .responses import FastJSONResponse
 from .schemas import (
     ChatRequest,
     ChatResponse,
+    ConditionsRequest,
     ExtractedFact,
+    FactExtractionBatchRequest,
+    FactExtractionBatchResponse,
     FactExtractionResult,
     PendingConfirmation,
+    PrefetchRequest,
+    UserConditions,
+    article_recommendations_adapter,
+    extracted_facts_adapter,
+    pending_confirmations_adapter,
 )
-from .agents import (
-    relocation_agent,
-    placement_agent,
-    extract_facts,
-    get_relocation_response,
-    get_placement_response,
+from .sessions import (
+    SESSION_BACKEND,
+    Session,
+    new_turns,
+    record_exchange,
+    record_reply,
+    sessions,
 )
-from .memory import get_relevant_context, store_conversation
-from .zep import get_article_recommendations, sync_user_facts
+from .shared_state import STATE_BACKEND, WEB_CONCURRENCY, is_shared
+from .shared_state import state as shared_state
+from .stages import StageGraph
+from .streaming import DATA_STREAM_HEADERS, data_stream
+from .writeback import queue_conversation, queue_fact_sync, writer
+from .zep import fetch_articles, get_article_recommendations
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Logfire for AI monitoring
+# Initialize Logfire for AI monitoring (imported only when used; it is slow to import)
 logfire_token = os.getenv("LOGFIRE_TOKEN")
 if logfire_token:
+    import logfire
+
     logfire.configure(token=logfire_token)
+    metrics.enable_tracing(logfire.span)
+
+# Per-stage deadlines (seconds) for /chat/complete
+CONTEXT_STAGE_TIMEOUT = float(os.getenv("CONTEXT_STAGE_TIMEOUT", "5"))
+RESPONSE_STAGE_TIMEOUT = float(os.getenv("RESPONSE_STAGE_TIMEOUT", "60"))
+FACTS_STAGE_TIMEOUT = float(os.getenv("FACTS_STAGE_TIMEOUT", "20"))
+RECOMMENDATIONS_STAGE_TIMEOUT = float(os.getenv("RECOMMENDATIONS_STAGE_TIMEOUT", "5"))
+# Overall budget for a request's upstream calls; clients may ask for less
+# with an X-Request-Timeout header (seconds)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "60"))
+
+
+startup_phases = metrics.gauge(
+    "quest_startup_phase_seconds", "Time spent in each startup phase", labels=("phase",)
+)
+startup_timings: dict[str, float] = {}
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Time a startup phase for the startup log line and /metrics."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+        startup_phases.set(startup_timings[name], phase=name)
 
 
 @asynccontextmanager
@@ -44,9 +121,49 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     print("Quest API starting up...")
+    with startup_phase("http_clients"):
+        await http_clients.start()
+    if is_shared():
+        with startup_phase("shared_state"):
+            await shared_state.start()
+    elif WEB_CONCURRENCY > 1:
+        print(f"Warning: {WEB_CONCURRENCY} workers with STATE_BACKEND={STATE_BACKEND}; "
+              "caches and HITL confirmations are per worker")
+    if WEB_CONCURRENCY > 1 and SESSION_BACKEND == "memory":
+        print("Warning: in-memory sessions are per worker; route a session to one "
+              "worker or send the full history")
+    with startup_phase("writeback"):
+        await writer.start()
+    with startup_phase("sessions"):
+        await sessions.start()
+    with startup_phase("confirmations"):
+        await confirmations.start()
+    with startup_phase("memory_mirror"):
+        await memory_mirror.start()
+    if FACT_MICRO_BATCHING:
+        await fact_batcher.start()
+    with startup_phase("article_index"):
+        await article_indexes.start(fetch_articles)
+    # Agents are built on first use; warming up just moves that off the first request
+    if AGENT_WARMUP:
+        agent_registry.start_warm_up()
+    print("Startup phases: " + ", ".join(
+        f"{name}={seconds:.3f}s" for name, seconds in startup_timings.items()
+    ))
     yield
     # Shutdown
     print("Quest API shutting down...")
+    await agent_registry.stop()
+    await prefetcher.stop()
+    await idempotency.stop()
+    await article_indexes.stop()
+    await fact_batcher.stop()
+    await writer.drain()
+    # After the writer: its last flushes (sessions, fact syncs) use the pool
+    await asyncio.to_thread(db.close_pool)
+    await memory_mirror.stop()
+    shared_state.close()
+    await http_clients.close()
 
 
 app = FastAPI(
@@ -54,12 +171,53 @@ app = FastAPI(
     description="AI-powered relocation and placement assistant",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Instrument FastAPI with Logfire
 if logfire_token:
     logfire.instrument_fastapi(app)
 
+request_latency = metrics.histogram(
+    "quest_http_request_seconds",
+    "Time to response headers per route",
+    labels=("method", "route", "status"),
+)
+requests_inflight = metrics.gauge(
+    "quest_http_requests_inflight", "HTTP requests currently being handled"
+)
+metrics.gauge(
+    "quest_writeback_queue_depth", "Writes waiting in the write-behind queue", callback=writer.depth
+)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next) -> Response:
+    """Record per-route latency and in-flight requests; set the deadline and priority lane."""
+    requests_inflight.inc()
+    start = time.perf_counter()
+    status = 500
+    budget = REQUEST_DEADLINE
+    try:
+        budget = min(budget, float(request.headers.get("x-request-timeout", budget)))
+    except ValueError:
+        pass
+    try:
+        with deadline(budget), lane(route_lane(request.url.path)):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        request_latency.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+        requests_inflight.dec()
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -77,6 +235,75 @@ app.add_middleware(
 )
 
 
+async def get_session(session_id: str, user_id: str | None) -> Session | None:
+    """A session by id; 403 if it belongs to a different user."""
+    session = await sessions.get(session_id)
+    if session is not None and session.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Session belongs to another user")
+    return session
+
+
+async def load_conversation(
+    messages: list[dict],
+    message: dict | None,
+    session_id: str | None,
+    user_id: str | None,
+) -> tuple[Session | None, list[dict], list[dict]]:
+    """Resolve the conversation for a chat request.
+
+    With a single new ``message`` the history comes from the server-side
+    session. With full ``messages`` and a ``session_id`` the session is seeded
+    on first sight and then kept up to date, so later requests can send only
+    the new message; only turns past the stored tail are new, so a resent
+    history isn't recorded twice. Returns the session (if any), the messages
+    to use and the new turns, which are recorded with the reply
+    (record_exchange/record_reply) rather than here.
+    """
+    if message is not None:
+        if not session_id:
+            raise HTTPException(
+                status_code=400,
+                detail="session_id is required when sending only the new message",
+            )
+        session = await get_session(session_id, user_id)
+        if session is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Unknown session; resend the full message history",
+            )
+        pending = [{"role": message["role"], "content": message["content"]}]
+        return session, session.messages + pending, pending
+
+    if not session_id:
+        return None, messages, []
+    session = await get_session(session_id, user_id)
+    if session is None:
+        pending = messages[-1:]
+        session = await sessions.create(session_id, user_id, messages[:-1])
+    else:
+        pending = new_turns(session.messages, messages)
+    return session, session.messages + pending, pending
+
+
+def build_context(
+    session: Session | None,
+    pending: list[dict],
+    messages: list[dict],
+    memories: list[str],
+    facts: list[str],
+) -> AssembledContext:
+    """Assemble the prompt context, reusing a session's pre-rendered turns.
+
+    ``pending`` are the request's turns not yet added to the session.
+    """
+    if session:
+        lines, tokens = session.prompt_lines(pending)
+        return assemble_context(lines, memories, facts, history_tokens=tokens)
+    return assemble_context(
+        [render_turn(m["role"], m["content"]) for m in messages], memories, facts
+    )
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -85,165 +312,520 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """Health check endpoint, with upstream circuit breaker states."""
+    circuits = circuit_states()
+    degraded = any(c["state"] != "closed" for c in circuits.values())
+    return {"status": "degraded" if degraded else "healthy", "circuits": circuits}
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Prometheus metrics endpoint."""
+    return Response(
+        content=metrics.registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 @app.post("/chat")
 async def chat_streaming(request: Request) -> Response:
     """Stream AI responses to Next.js frontend via Vercel AI protocol.
 
-    This endpoint uses Pydantic AI's VercelAIAdapter to stream responses
-    compatible with the Vercel AI SDK.
+    Text is streamed token by token from the agent using the Vercel AI SDK
+    data-stream protocol, so the first words reach the user as soon as the
+    model produces them. Retries sharing an Idempotency-Key header replay
+    the same stream instead of running the agent again.
     """
+    started = time.perf_counter()
+    # Parse and validate the raw body in one pass
+    raw = await request.body()
     try:
-        from pydantic_ai.messages import UserPromptPart
+        body = ChatRequest.model_validate_json(raw)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+    return await idempotency.run(
+        "/chat",
+        request.headers.get(IDEMPOTENCY_HEADER),
+        body.user_id,
+        fingerprint(raw),
+        lambda: stream_chat(body, started),
+    )
 
-        body = await request.json()
-        messages = body.get("messages", [])
-        user_id = body.get("user_id")
-        app_type = body.get("app_type", "relocation")  # 'relocation' or 'placement'
 
-        if not messages:
+async def stream_chat(body: ChatRequest, started: float) -> Response:
+    """Start the /chat stream for a parsed request."""
+    try:
+        user_id = body.user_id
+        app_type = body.app_type
+
+        if not body.messages and not body.message:
             raise HTTPException(status_code=400, detail="No messages provided")
 
         # Get the last user message
-        last_message = messages[-1]
-        if last_message.get("role") != "user":
+        last_message = body.message or body.messages[-1]
+        if last_message["role"] != "user":
             raise HTTPException(status_code=400, detail="Last message must be from user")
 
-        user_content = last_message.get("content", "")
+        user_content = last_message["content"]
 
-        # Get relevant context from memory
-        context = ""
-        if user_id:
-            context = await get_relevant_context(user_id, user_content)
+        session, conversation_messages, pending = await load_conversation(
+            body.messages,
+            body.message,
+            body.session_id,
+            user_id,
+        )
 
-        # Build conversation history for the agent
-        conversation_messages = []
-        for msg in messages[-10:]:  # Last 10 messages
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            conversation_messages.append({"role": role, "content": content})
+        # Pack history, memories and user facts into the prompt budget
+        memories, facts = await gather_user_context(user_id, user_content)
+        assembled = build_context(session, pending, conversation_messages, memories, facts)
+        context, conversation = assembled.context, assembled.conversation
+
+        # Shed load before the stream starts, while a proper status can still be sent
+        model_limiter.admit()
 
         # Select agent based on app type
         if app_type == "placement":
-            response = await get_placement_response(conversation_messages, context)
+            deltas = stream_placement_response(conversation_messages, context, conversation)
         else:
-            response = await get_relocation_response(conversation_messages, context)
+            deltas = stream_relocation_response(conversation_messages, context, conversation)
 
-        # For now, return as JSON (non-streaming)
-        # TODO: Implement proper streaming with VercelAIAdapter
-        return Response(
-            content=response,
-            media_type="text/plain",
+        if session:
+            deltas = record_reply(sessions, session, pending, deltas)
+
+        return StreamingResponse(
+            data_stream(deltas, app_type, started),
+            media_type="text/plain; charset=utf-8",
+            headers=DATA_STREAM_HEADERS,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/prefetch", status_code=202)
+async def prefetch_context(request: PrefetchRequest) -> dict:
+    """Warm a user's graph, facts and memories when a chat is opened.
+
+    Call when the frontend opens a chat or the user starts typing; the next
+    /chat request then finds the user's context already cached.
+    """
+    query = request.query
+    if not query and request.session_id:
+        session = await get_session(request.session_id, request.user_id)
+        if session:
+            query = next(
+                (m["content"] for m in reversed(session.messages) if m["role"] == "user"), None
+            )
+    return {"status": await prefetcher.schedule(request.user_id, query)}
+
+
+async def prepare_chat(
+    request: ChatRequest,
+) -> tuple[Session | None, list[dict], list[dict], str, str]:
+    """Resolve a /chat/complete request's conversation and new user message.
+
+    Returns the session (if any), the messages, the new turns to record with
+    the reply, the user message content and the session id to store the
+    exchange under.
+    """
+    messages, message = request.messages, request.message
+
+    # Get the last user message
+    last_user_msg = message if message and message["role"] == "user" else next(
+        (m for m in reversed(messages) if m["role"] == "user"),
+        None
+    )
+    if not last_user_msg:
+        raise HTTPException(status_code=400, detail="No user message found")
+
+    session, messages, pending = await load_conversation(
+        messages, message, request.session_id, request.user_id
+    )
+    return (
+        session,
+        messages,
+        pending,
+        last_user_msg["content"],
+        request.session_id or str(uuid.uuid4()),
+    )
+
+
+def chat_stages(
+    name: str,
+    user_id: str | None,
+    user_content: str,
+    respond: Callable[[tuple[list[str], list[str]]], Awaitable[str]],
+) -> StageGraph:
+    """The /chat/complete pipeline around a response stage.
+
+    Fact extraction and recommendations only need the user message, so they
+    run alongside the context lookup and agent response.
+    """
+    stages = StageGraph(name)
+    stages.add(
+        "context",
+        lambda: gather_user_context(user_id, user_content),
+        timeout=CONTEXT_STAGE_TIMEOUT,
+        optional=True,
+        default=([], []),
+        enabled=bool(user_id),
+    )
+    stages.add(
+        "response",
+        respond,
+        depends_on=("context",),
+        timeout=RESPONSE_STAGE_TIMEOUT,
+    )
+    stages.add(
+        "facts",
+        lambda: extract_fact_changes(user_id, user_content),
+        timeout=FACTS_STAGE_TIMEOUT,
+        optional=True,
+        default=(FactExtractionResult(), FactDelta()),
+    )
+    stages.add(
+        "recommendations",
+        lambda: get_article_recommendations(user_id, user_content),
+        timeout=RECOMMENDATIONS_STAGE_TIMEOUT,
+        optional=True,
+        default=[],
+        enabled=bool(user_id),
+    )
+    return stages
+
+
 @app.post("/chat/complete", response_model=ChatResponse)
-async def chat_complete(request: ChatRequest) -> ChatResponse:
-    """Complete chat with fact extraction (non-streaming)."""
-    try:
-        messages = [{"role": m.role, "content": m.content} for m in request.messages]
-        user_id = request.user_id
-        session_id = request.session_id or str(uuid.uuid4())
+async def chat_complete(
+    request: ChatRequest,
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Response:
+    """Complete chat with fact extraction (non-streaming).
+
+    Retries sharing an Idempotency-Key header get the first response; the
+    agent, fact extraction and conversation storage run once.
+    """
+    return await idempotency.run(
+        "/chat/complete",
+        idempotency_key,
+        request.user_id,
+        fingerprint(request.model_dump_json()),
+        lambda: complete_chat(request),
+    )
 
-        # Get the last user message
-        last_user_msg = next(
-            (m for m in reversed(messages) if m["role"] == "user"),
-            None
-        )
-        if not last_user_msg:
-            raise HTTPException(status_code=400, detail="No user message found")
 
-        user_content = last_user_msg["content"]
+async def complete_chat(request: ChatRequest) -> Response:
+    """Run the /chat/complete pipeline for a request."""
+    try:
+        session, messages, pending, user_content, session_id = await prepare_chat(request)
+        user_id = request.user_id
 
-        # Get context and generate response
-        context = ""
-        if user_id:
-            context = await get_relevant_context(user_id, user_content)
+        async def respond(context: tuple[list[str], list[str]]) -> str:
+            memories, facts = context
+            assembled = build_context(session, pending, messages, memories, facts)
+            return await get_relocation_response(
+                messages, assembled.context, assembled.conversation
+            )
 
-        response = await get_relocation_response(messages, context)
+        results = await chat_stages("chat_complete", user_id, user_content, respond).run()
+        response = results["response"]
+        extraction_result, delta = results["facts"]
 
-        # Extract facts from the conversation
-        extraction_result = await extract_facts(user_content)
+        if session:
+            await record_exchange(sessions, session, pending, response)
 
-        # Get article recommendations if relevant
-        recommendations = []
+        # Store conversation in memory after the response is sent
         if user_id:
-            recommendations = await get_article_recommendations(user_id, user_content)
+            await queue_conversation(user_id, session_id, user_content, response)
 
-        # Store conversation in memory
-        if user_id:
-            await store_conversation(user_id, session_id, user_content, response)
-
-        # Create pending confirmations for low-confidence facts
-        pending = []
-        for fact in extraction_result.facts:
-            if fact.requires_confirmation:
-                pending.append(PendingConfirmation(
-                    user_id=user_id or "",
-                    fact_type=fact.type,
-                    new_value=fact.value,
-                    confidence=fact.confidence,
-                    context=fact.context,
-                ))
-
-        return ChatResponse(
+        # Facts are only synced from /extract-facts; here they are just reported
+        pending = delta.confirmations(user_id or "")
+
+        return FastJSONResponse(ChatResponse(
             content=response,
             extracted_facts=extraction_result.facts,
             pending_confirmations=pending,
-            recommendations=[],  # TODO: Map to ArticleRecommendation
-        )
+            recommendations=article_recommendations_adapter.validate_python(
+                results["recommendations"]
+            ),
+        ))
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def facts_event(result: FactExtractionResult) -> dict:
+    return {
+        "type": "facts",
+        "facts": extracted_facts_adapter.dump_python(result.facts, mode="json"),
+        "has_changes": result.has_changes,
+    }
+
+
+def confirmations_event(pending: list[PendingConfirmation]) -> dict:
+    return {
+        "type": "pending_confirmations",
+        "confirmations": pending_confirmations_adapter.dump_python(pending, mode="json"),
+    }
+
+
+def recommendations_event(articles: list[dict]) -> dict:
+    return {"type": "recommendations", "recommendations": articles}
+
+
+async def chat_events(
+    session: Session | None,
+    pending: list[dict],
+    messages: list[dict],
+    user_id: str | None,
+    user_content: str,
+    session_id: str,
+) -> AsyncIterator[str | dict]:
+    """Run the /chat/complete pipeline, yielding text deltas and typed events.
+
+    Each side result is yielded as soon as its stage resolves: extracted
+    facts, then the pending confirmations they call for, and article
+    recommendations. Text deltas are yielded as the model produces them.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def respond(context: tuple[list[str], list[str]]) -> str:
+        memories, facts = context
+        assembled = build_context(session, pending, messages, memories, facts)
+        parts = []
+        async for delta in stream_relocation_response(
+            messages, assembled.context, assembled.conversation
+        ):
+            parts.append(delta)
+            events.put_nowait(delta)
+        return "".join(parts)
+
+    async def confirm(facts: tuple[FactExtractionResult, FactDelta]) -> list[PendingConfirmation]:
+        _, delta = facts
+        return delta.confirmations(user_id or "")
+
+    stages = chat_stages("chat_complete_stream", user_id, user_content, respond)
+    stages.add("confirmations", confirm, depends_on=("facts",), optional=True, default=[])
+
+    def publish(name: str, result: Any) -> None:
+        if name == "facts":
+            events.put_nowait(facts_event(result[0]))
+        elif name == "confirmations":
+            events.put_nowait(confirmations_event(result))
+        elif name == "recommendations":
+            events.put_nowait(recommendations_event(result))
+
+    async def run() -> None:
+        try:
+            results = await stages.run(on_result=publish)
+            if session:
+                await record_exchange(sessions, session, pending, results["response"])
+            if user_id:
+                await queue_conversation(user_id, session_id, user_content, results["response"])
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (item := await events.get()) is not None:
+            yield item
+        await task
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+@app.post("/chat/complete/stream")
+async def chat_complete_stream(
+    request: ChatRequest,
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Response:
+    """Complete chat as a data stream with facts and recommendations as events.
+
+    Streams the assistant text like /chat and, on the same Vercel AI data
+    stream, emits data parts typed "facts", "pending_confirmations" and
+    "recommendations" as soon as each is ready, so panels can render before
+    the slowest stage finishes. Idempotency keys work as for /chat.
+    """
+    started = time.perf_counter()
+    return await idempotency.run(
+        "/chat/complete/stream",
+        idempotency_key,
+        request.user_id,
+        fingerprint(request.model_dump_json()),
+        lambda: stream_chat_events(request, started),
+    )
+
+
+async def stream_chat_events(request: ChatRequest, started: float) -> Response:
+    """Start the /chat/complete/stream stream for a request."""
+    session, messages, pending, user_content, session_id = await prepare_chat(request)
+    # Shed load before the stream starts, while a proper status can still be sent
+    model_limiter.admit()
+    return StreamingResponse(
+        data_stream(
+            chat_events(
+                session, pending, messages, request.user_id, user_content, session_id
+            ),
+            "relocation",
+            started,
+        ),
+        media_type="text/plain; charset=utf-8",
+        headers=DATA_STREAM_HEADERS,
+    )
+
+
 @app.post("/extract-facts", response_model=FactExtractionResult)
 async def extract_facts_endpoint(
     text: str,
     user_id: Optional[str] = None
-) -> FactExtractionResult:
-    """Extract structured facts from text using Pydantic schemas."""
+) -> Response:
+    """Extract structured facts from text using Pydantic schemas.
+
+    With a user_id, the user's known facts are given to the model and only
+    new or changed facts are synced to ZEP; changes await confirmation.
+    """
+    try:
+        result, delta = await extract_fact_changes(user_id, text)
+        if user_id:
+            await commit_fact_changes(user_id, [delta])
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/extract-facts/batch", response_model=FactExtractionBatchResponse)
+async def extract_facts_batch_endpoint(
+    request: FactExtractionBatchRequest
+) -> Response:
+    """Extract facts from many texts, several texts per model call.
+
+    Items are diffed in order against each user's known facts; each user's
+    new facts are synced with one queued write.
+    """
     try:
-        result = await extract_facts(text)
+        user_ids = sorted({item.user_id for item in request.items if item.user_id})
+        states = {
+            user_id: dict(state)
+            for user_id, state in zip(
+                user_ids, await asyncio.gather(*[get_fact_state(u) for u in user_ids])
+            )
+        }
+        results = await extract_facts_batch(
+            [item.text for item in request.items],
+            [list(states.get(item.user_id, {}).values()) or None for item in request.items],
+        )
+
+        deltas: dict[str, list[FactDelta]] = {}
+        for index, (item, result) in enumerate(zip(request.items, results)):
+            if not item.user_id:
+                continue
+            state = states[item.user_id]
+            delta = diff_facts(state, result.facts)
+            # Later texts for the same user are compared with what earlier ones added
+            state.update((fact_key(f.type, f.value), f) for f in delta.accepted)
+            deltas.setdefault(item.user_id, []).append(delta)
+            results[index] = result.model_copy(
+                update={"facts": delta.facts, "has_changes": delta.has_changes}
+            )
+        for user_id, user_deltas in deltas.items():
+            await commit_fact_changes(user_id, user_deltas)
+
+        return FastJSONResponse(FactExtractionBatchResponse(results=results))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Sync facts to ZEP if user_id provided
-        if user_id and result.facts:
-            await sync_user_facts(user_id, [
-                {
-                    "type": f.type.value,
-                    "value": f.value,
-                    "confidence": f.confidence
-                }
-                for f in result.facts
-            ])
 
-        return result
+@app.post("/conditions", response_model=UserConditions)
+async def user_conditions(request: ConditionsRequest) -> Response:
+    """Get a user's structured conditions, updated with the conversation so far.
 
+    Only turns not seen before are sent to the model; set ``rebuild`` to
+    re-read the whole conversation.
+    """
+    messages = request.messages
+    if request.session_id:
+        session = await get_session(request.session_id, request.user_id)
+        if session is not None:
+            messages = session.messages
+    try:
+        conditions = await get_user_conditions(
+            request.user_id, request.session_id or "", messages, rebuild=request.rebuild
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse(conditions)
 
 
 @app.post("/hitl/pending")
 async def create_pending_confirmation(confirmation: PendingConfirmation) -> dict:
     """Create HITL pending confirmation."""
-    # TODO: Store in Neon database
-    return {
-        "status": "created",
-        "id": str(uuid.uuid4()),
-        "confirmation": confirmation.model_dump()
-    }
+    try:
+        created = await confirmations.create(confirmation)
+        return {
+            "status": "created",
+            "id": created.id,
+            "confirmation": created.model_dump()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/hitl/pending")
+async def list_pending_confirmations(
+    user_id: str,
+    status: str = "pending",
+    limit: int = Query(20, ge=1, le=CONFIRMATION_PAGE_MAX),
+    cursor: str | None = None,
+) -> Response:
+    """List a user's confirmations, newest first, one page at a time."""
+    try:
+        items, next_cursor = await confirmations.list_for_user(user_id, status, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse({
+        "confirmations": pending_confirmations_adapter.dump_python(items, mode="json"),
+        "next_cursor": next_cursor,
+    })
+
+
+async def resolve_confirmation(
+    confirmation_id: str, user_id: str, status: str
+) -> PendingConfirmation:
+    """Resolve a pending confirmation, or 404 if it isn't pending for this user."""
+    try:
+        confirmation = await confirmations.resolve(confirmation_id, user_id, status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if confirmation is None:
+        raise HTTPException(status_code=404, detail="No pending confirmation with that id")
+    return confirmation
 
 
 @app.post("/hitl/approve/{confirmation_id}")
 async def approve_confirmation(confirmation_id: str, user_id: str) -> dict:
-    """Approve a pending confirmation."""
-    # TODO: Update in Neon database
+    """Approve a pending confirmation and sync the confirmed fact."""
+    confirmation = await resolve_confirmation(confirmation_id, user_id, "approved")
+    fact = ExtractedFact(
+        type=confirmation.fact_type, value=confirmation.new_value, confidence=1.0
+    )
+    await queue_fact_sync(user_id, [fact_payload(fact)])
+    apply_facts(user_id, [fact])
     return {
         "status": "approved",
         "id": confirmation_id
@@ -253,13 +835,17 @@ async def approve_confirmation(confirmation_id: str, user_id: str) -> dict:
 @app.post("/hitl/reject/{confirmation_id}")
 async def reject_confirmation(confirmation_id: str, user_id: str) -> dict:
     """Reject a pending confirmation."""
-    # TODO: Update in Neon database
+    await resolve_confirmation(confirmation_id, user_id, "rejected")
     return {
         "status": "rejected",
         "id": confirmation_id
     }
 
 
+startup_timings["import"] = time.perf_counter() - import_started
+startup_phases.set(startup_timings["import"], phase="import")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
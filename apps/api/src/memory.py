@@ -1,12 +1,52 @@
 """SuperMemory integration for long-term conversation context."""
 
+import asyncio
 import os
 import httpx
 from typing import Optional
 
+from . import metrics
+from .cache import normalize_query
+from .clients import UpstreamConfig, registry
+from .memory_mirror import memory_mirror
+from .metrics import track_upstream
+from .shared_state import shared_cache
 
 SUPERMEMORY_API = os.getenv("SUPERMEMORY_API_URL", "https://api.supermemory.ai/v1")
 SUPERMEMORY_API_KEY = os.getenv("SUPERMEMORY_API_KEY", "")
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "10000"))
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", "300"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "120"))
+# How long a chat waits for a live search before using prefetched memories
+PREFETCH_GRACE = float(os.getenv("PREFETCH_GRACE", "0.1"))
+
+UPSTREAM = "supermemory"
+registry.register(UpstreamConfig(
+    UPSTREAM,
+    SUPERMEMORY_API,
+    headers={
+        "Authorization": f"Bearer {SUPERMEMORY_API_KEY}",
+        "Content-Type": "application/json"
+    },
+))
+
+# Search results per (user, normalized query), invalidated when the user's memories change
+memory_cache = shared_cache("memory_search", MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL)
+# Memories found when a user's context was prefetched, for when a live search is slow
+prefetched = shared_cache("memory_prefetch", MEMORY_CACHE_SIZE, PREFETCH_TTL)
+
+prefetch_fallbacks = metrics.counter(
+    "quest_prefetch_memories_total",
+    "Memory searches with prefetched memories, by which result was used",
+    labels=("result",),
+)
+# Live searches still running after a fallback, so they can warm the cache
+_background: set[asyncio.Task] = set()
+
+
+def user_tag(user_id: str) -> str:
+    """Cache tag for everything derived from a user's memories."""
+    return f"user:{user_id}"
 
 
 async def store_memory(user_id: str, content: str, metadata: Optional[dict] = None) -> dict:
@@ -14,52 +54,111 @@ async def store_memory(user_id: str, content: str, metadata: Optional[dict] = No
     if not SUPERMEMORY_API_KEY:
         return {"status": "skipped", "reason": "No API key configured"}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{SUPERMEMORY_API}/memory",
+    try:
+        with track_upstream(UPSTREAM, "store"):
+            response = await registry.request(
+                UPSTREAM, "POST", "/memory",
+                kind="write",
+                operation="store",
                 json={
                     "user_id": user_id,
                     "content": content,
                     "metadata": metadata or {}
                 },
-                headers={
-                    "Authorization": f"Bearer {SUPERMEMORY_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                timeout=30.0
             )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            return {"status": "error", "error": str(e)}
+        await memory_mirror.add(user_id, [content])
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        await memory_cache.ainvalidate(user_tag(user_id))
+        await prefetched.ainvalidate(user_tag(user_id))
 
 
 async def search_memory(user_id: str, query: str, limit: int = 5) -> list[str]:
-    """Search user's memories using natural language."""
+    """Search user's memories using natural language.
+
+    Served from the local mirror once all of the user's memories are in it.
+    Until then SuperMemory is searched while the mirror backfills the user
+    in the background; mirrored users are re-synced the same way when due.
+    """
     if not SUPERMEMORY_API_KEY:
         return []
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{SUPERMEMORY_API}/memory/search",
-                json={
-                    "user_id": user_id,
-                    "query": query,
-                    "limit": limit
-                },
-                headers={
-                    "Authorization": f"Bearer {SUPERMEMORY_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("results", [])
-        except httpx.HTTPError:
-            return []
+    local = await memory_mirror.search(user_id, query, limit)
+    await memory_mirror.sync(user_id, _list_memories)
+    if local is not None:
+        return local
+
+    try:
+        results = await memory_cache.get_or_load(
+            (user_id, normalize_query(query), limit),
+            lambda: _search_memory(user_id, query, limit),
+            tags=(user_tag(user_id),),
+        )
+    except httpx.HTTPError:
+        return []
+    return results
+
+
+async def search_memory_prefetched(user_id: str, query: str, limit: int = 5) -> list[str]:
+    """Search memories, falling back to prefetched ones if the search is slow.
+
+    The live search keeps running after a fallback, so its result still
+    lands in the cache for the next turn.
+    """
+    found, warm = await prefetched.aget(user_id)
+    if not found or not warm:
+        return await search_memory(user_id, query, limit)
+
+    search = asyncio.ensure_future(search_memory(user_id, query, limit))
+    done, _ = await asyncio.wait({search}, timeout=PREFETCH_GRACE)
+    if done:
+        prefetch_fallbacks.inc(result="live")
+        return search.result()
+    _background.add(search)
+    search.add_done_callback(_background.discard)
+    prefetch_fallbacks.inc(result="prefetched")
+    return warm[:limit]
+
+
+async def _search_memory(user_id: str, query: str, limit: int) -> list[str]:
+    with track_upstream(UPSTREAM, "search"):
+        response = await registry.request(
+            UPSTREAM, "POST", "/memory/search",
+            operation="search",
+            hedge=True,
+            json={
+                "user_id": user_id,
+                "query": query,
+                "limit": limit
+            },
+        )
+    data = response.json()
+    return data.get("results", [])
+
+
+async def _list_memories(user_id: str, offset: int, limit: int) -> list[str]:
+    """One page of a user's memories, oldest first, for the memory mirror.
+
+    Assumes SuperMemory lists a user's memories at ``GET /memory`` with
+    ``user_id``, ``offset`` and ``limit`` parameters, answering like search
+    with a ``results`` list. This hasn't been confirmed against the API,
+    which is why the mirror is off by default; failures only delay the
+    mirror's backfill.
+    """
+    with track_upstream(UPSTREAM, "list"):
+        response = await registry.request(
+            UPSTREAM, "GET", "/memory",
+            operation="list",
+            params={
+                "user_id": user_id,
+                "offset": offset,
+                "limit": limit
+            },
+        )
+    data = response.json()
+    return [str(memory) for memory in data.get("results", [])]
 
 
 async def get_relevant_context(user_id: str, current_message: str) -> str:
@@ -80,7 +179,18 @@ async def store_conversation(
     assistant_response: str
 ) -> dict:
     """Store a conversation exchange in memory."""
-    content = f"User: {user_message}\nAssistant: {assistant_response}"
+    return await store_conversation_batch(user_id, session_id, [{
+        "user_message": user_message,
+        "assistant_response": assistant_response,
+    }])
+
+
+async def store_conversation_batch(user_id: str, session_id: str, exchanges: list[dict]) -> dict:
+    """Store several exchanges from one session as a single memory."""
+    content = "\n".join([
+        f"User: {e['user_message']}\nAssistant: {e['assistant_response']}"
+        for e in exchanges
+    ])
     metadata = {
         "session_id": session_id,
         "type": "conversation"
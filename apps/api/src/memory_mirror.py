@@ -0,0 +1,293 @@
+"""Local SQLite FTS5 mirror of user memories for on-box search.
+
+Every memory we store in SuperMemory is also written here, so memory search
+on the chat path is a local full-text query instead of a network round-trip.
+The first time a user is looked up, all of their memories are paged in from
+SuperMemory in the background; until that backfill completes, search stays
+remote. Each mirrored user is backfilled again at most once per
+MEMORY_MIRROR_RECONCILE_INTERVAL, which also picks up memories written by
+other instances; a user whose backfill failed is not retried for
+MEMORY_MIRROR_RETRY_AFTER seconds.
+
+The mirror is opt-in (MEMORY_MIRROR_ENABLED): backfills page through a
+listing endpoint (``GET /memory``) that has not been confirmed against the
+SuperMemory API, see ``memory._list_memories``.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from . import metrics
+from .admission import BACKGROUND, lane
+
+MEMORY_MIRROR_ENABLED = os.getenv("MEMORY_MIRROR_ENABLED", "false").lower() == "true"
+MEMORY_MIRROR_PATH = Path(os.getenv("MEMORY_MIRROR_PATH", "data/memory_mirror.db"))
+MEMORY_MIRROR_RECONCILE_INTERVAL = float(os.getenv("MEMORY_MIRROR_RECONCILE_INTERVAL", "3600"))
+MEMORY_MIRROR_RETRY_AFTER = float(os.getenv("MEMORY_MIRROR_RETRY_AFTER", "300"))
+# Oldest memories beyond this many per user are dropped from the mirror
+MEMORY_MIRROR_MAX_PER_USER = int(os.getenv("MEMORY_MIRROR_MAX_PER_USER", "1000"))
+# Memories fetched per request when backfilling a user
+MEMORY_MIRROR_PAGE_SIZE = int(os.getenv("MEMORY_MIRROR_PAGE_SIZE", "100"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (user_id, digest)
+);
+CREATE INDEX IF NOT EXISTS memories_user ON memories (user_id, id DESC);
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+    content, content='memories', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+    INSERT INTO memories_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+    INSERT INTO memories_fts (memories_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TABLE IF NOT EXISTS mirror_users (
+    user_id TEXT PRIMARY KEY,
+    reconciled_at REAL NOT NULL
+);
+"""
+
+_TERM = re.compile(r"\w+")
+
+# Fetches one page (user_id, offset, limit) of a user's memories, oldest
+# first, from the source of truth
+RemoteList = Callable[[str, int, int], Awaitable[list[str]]]
+
+searches = metrics.counter(
+    "quest_memory_mirror_searches_total",
+    "Memory searches by where they were served from",
+    labels=("source",),
+)
+writes = metrics.counter(
+    "quest_memory_mirror_writes_total",
+    "Memories written to the local mirror by origin",
+    labels=("origin",),
+)
+
+
+def _digest(content: str) -> str:
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def match_expression(query: str) -> str | None:
+    """An FTS5 query matching any of the query's words, or None if it has none."""
+    terms = {term.lower() for term in _TERM.findall(query) if len(term) > 1}
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in sorted(terms))
+
+
+class MemoryMirror:
+    """Per-user memories in a local SQLite database with full-text search.
+
+    The connection is shared by worker threads behind a lock; every public
+    method runs its query off the event loop. If the database can't be opened
+    (e.g. SQLite without FTS5) the mirror disables itself and callers fall
+    back to remote search.
+    """
+
+    def __init__(self, path: Path = MEMORY_MIRROR_PATH, enabled: bool = MEMORY_MIRROR_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._backfilling: set[str] = set()
+        self._retry_at: dict[str, float] = {}  # user -> when a failed backfill may rerun
+        self._tasks: set[asyncio.Task] = set()
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is None and self.enabled:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(SCHEMA)
+                self._conn = conn
+            except (sqlite3.Error, OSError) as e:
+                print(f"Memory mirror disabled: {e}")
+                self.enabled = False
+        return self._conn
+
+    def _run(self, fn: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            conn = self._connect()
+            return None if conn is None else fn(conn)
+
+    async def start(self) -> None:
+        """Open the database and create the schema."""
+        await asyncio.to_thread(self._run, lambda conn: None)
+
+    async def stop(self) -> None:
+        """Cancel backfills and close the database."""
+        tasks, self._tasks = set(self._tasks), set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _insert(
+        self, conn: sqlite3.Connection, user_id: str, contents: list[str], reconciled: bool
+    ) -> int:
+        now = time.time()
+        conn.execute("BEGIN")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO memories (user_id, digest, content, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(user_id, _digest(c), c, now) for c in contents],
+            )
+            added = conn.total_changes - before
+            conn.execute(
+                "DELETE FROM memories WHERE user_id = ? AND id NOT IN "
+                "(SELECT id FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT ?)",
+                (user_id, user_id, MEMORY_MIRROR_MAX_PER_USER),
+            )
+            if reconciled:
+                conn.execute(
+                    "INSERT INTO mirror_users (user_id, reconciled_at) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET reconciled_at = excluded.reconciled_at",
+                    (user_id, now),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    async def add(self, user_id: str, contents: list[str], origin: str = "store") -> None:
+        """Write memories for a user; duplicates are ignored.
+
+        A backfill (``origin="backfill"``) passes the user's complete set of
+        memories, so it also marks the user as mirrored as of now.
+        """
+        contents = [c for c in contents if c]
+        backfill = origin == "backfill"
+        # An empty backfill still records that the user has been mirrored
+        if not self.enabled or not (contents or backfill):
+            return
+        added = await asyncio.to_thread(
+            self._run, lambda conn: self._insert(conn, user_id, contents, backfill)
+        )
+        if added:
+            writes.inc(added, origin=origin)
+
+    def _search(
+        self, conn: sqlite3.Connection, user_id: str, query: str, limit: int
+    ) -> list[str] | None:
+        seeded = conn.execute(
+            "SELECT reconciled_at FROM mirror_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if seeded is None:
+            return None
+        rows = []
+        expression = match_expression(query)
+        if expression:
+            rows = conn.execute(
+                "SELECT m.content FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid "
+                "WHERE memories_fts MATCH ? AND m.user_id = ? "
+                "ORDER BY bm25(memories_fts) LIMIT ?",
+                (expression, user_id, limit),
+            ).fetchall()
+        if len(rows) < limit:
+            # Pad with the most recent memories, as a semantic search would
+            seen = {row[0] for row in rows}
+            recent = conn.execute(
+                "SELECT content FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit + len(rows)),
+            ).fetchall()
+            rows += [row for row in recent if row[0] not in seen][:limit - len(rows)]
+        return [row[0] for row in rows]
+
+    async def search(self, user_id: str, query: str, limit: int = 5) -> list[str] | None:
+        """Top-k memories for a user, or None until the user's backfill completes."""
+        results = None
+        if self.enabled:
+            try:
+                results = await asyncio.to_thread(
+                    self._run, lambda conn: self._search(conn, user_id, query, limit)
+                )
+            except sqlite3.Error as e:
+                print(f"Memory mirror search failed: {e}")
+        searches.inc(source="remote" if results is None else "local")
+        return results
+
+    def _backfill_due(self, conn: sqlite3.Connection, user_id: str) -> bool:
+        row = conn.execute(
+            "SELECT reconciled_at FROM mirror_users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row is None or time.time() - row[0] >= MEMORY_MIRROR_RECONCILE_INTERVAL
+
+    async def _backfill(self, user_id: str, remote: RemoteList) -> None:
+        # Only the newest MEMORY_MIRROR_MAX_PER_USER are kept, so older pages
+        # are dropped as newer ones arrive
+        contents: deque[str] = deque(maxlen=MEMORY_MIRROR_MAX_PER_USER)
+        offset = 0
+        while True:
+            page = await remote(user_id, offset, MEMORY_MIRROR_PAGE_SIZE)
+            contents.extend(page)
+            offset += len(page)
+            if len(page) < MEMORY_MIRROR_PAGE_SIZE:
+                break
+        await self.add(user_id, list(contents), origin="backfill")
+
+    async def sync(self, user_id: str, remote: RemoteList) -> None:
+        """Backfill all of a user's memories in the background, if due.
+
+        Due when the user isn't mirrored yet or was last backfilled more than
+        MEMORY_MIRROR_RECONCILE_INTERVAL ago. At most one backfill per user
+        runs at a time; one that fails leaves the user as it was, to be
+        retried on a search after MEMORY_MIRROR_RETRY_AFTER. The backfill
+        outlives the request, so it runs without the request's deadline, in
+        the background lane.
+        """
+        if not self.enabled or user_id in self._backfilling:
+            return
+        if time.monotonic() < self._retry_at.get(user_id, 0.0):
+            return
+        if not await asyncio.to_thread(self._run, lambda conn: self._backfill_due(conn, user_id)):
+            return
+        self._backfilling.add(user_id)
+
+        async def run() -> None:
+            try:
+                with lane(BACKGROUND):
+                    await self._backfill(user_id, remote)
+                self._retry_at.pop(user_id, None)
+            except Exception as e:
+                print(f"Memory mirror backfill failed for user {user_id}: {e}")
+                self._backoff(user_id)
+            finally:
+                self._backfilling.discard(user_id)
+
+        task = asyncio.create_task(run(), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _backoff(self, user_id: str) -> None:
+        now = time.monotonic()
+        # Forget users whose wait is over, so the map only holds recent failures
+        self._retry_at = {user: at for user, at in self._retry_at.items() if at > now}
+        self._retry_at[user_id] = now + MEMORY_MIRROR_RETRY_AFTER
+
+memory_mirror = MemoryMirror()
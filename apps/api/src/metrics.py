@@ -0,0 +1,272 @@
+"""In-process metrics with Prometheus text exposition."""
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+
+# Latency buckets in seconds, from cache hits up to slow model calls
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _label_key(label_names: tuple[str, ...], labels: dict) -> tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _format_labels(label_names: tuple[str, ...], key: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increment the counter for a label set."""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value for a label set."""
+        return self._values.get(_label_key(self.label_names, labels), 0.0)
+
+    def render(self) -> list[str]:
+        """Render as Prometheus sample lines."""
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge:
+    """A value that goes up and down, or is read from a callback on render."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        callback: Callable[[], float] | None = None,
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self.callback = callback
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase the gauge for a label set."""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        """Decrease the gauge for a label set."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        """Set the gauge for a label set."""
+        with self._lock:
+            self._values[_label_key(self.label_names, labels)] = value
+
+    def value(self, **labels) -> float:
+        """Current value for a label set."""
+        if self.callback is not None:
+            return float(self.callback())
+        return self._values.get(_label_key(self.label_names, labels), 0.0)
+
+    def render(self) -> list[str]:
+        """Render as Prometheus sample lines."""
+        if self.callback is not None:
+            return [f"{self.name} {float(self.callback())}"]
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram:
+    """A cumulative-bucket histogram of observed values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self.buckets = buckets
+        # label key -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Record an observation for a label set."""
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        """Render as Prometheus sample lines."""
+        lines = []
+        for key, series in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric so they can be rendered together."""
+
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(Counter, name, description, labels)
+
+    def gauge(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        callback: Callable[[], float] | None = None,
+    ) -> Gauge:
+        """Get or create a gauge, optionally computed by a callback."""
+        return self._get_or_create(Gauge, name, description, labels, callback)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] | None = None,
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self._get_or_create(
+            Histogram, name, description, labels, buckets or DEFAULT_BUCKETS
+        )
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+# Opens a tracing span around tracked work when an exporter is configured
+_span_factory: Callable | None = None
+
+
+def enable_tracing(span_factory: Callable) -> None:
+    """Open a span (e.g. logfire.span) around every tracked operation."""
+    global _span_factory
+    _span_factory = span_factory
+
+
+@contextmanager
+def track(
+    latency: Histogram,
+    inflight: Gauge | None = None,
+    span_name: str | None = None,
+    **labels,
+) -> Iterator[None]:
+    """Time a block into a histogram with an ``outcome`` label.
+
+    The outcome is "ok", "error" or "cancelled". An optional gauge counts the
+    blocks currently in flight.
+    """
+    span = (
+        _span_factory(span_name or latency.name, **labels)
+        if _span_factory else nullcontext()
+    )
+    if inflight is not None:
+        inflight.inc(**labels)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span:
+            yield
+        outcome = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        latency.observe(time.perf_counter() - start, outcome=outcome, **labels)
+        if inflight is not None:
+            inflight.dec(**labels)
+
+
+upstream_latency = histogram(
+    "quest_upstream_request_seconds",
+    "Latency of calls to upstream services (SuperMemory, ZEP, the model)",
+    labels=("upstream", "operation", "outcome"),
+)
+upstream_inflight = gauge(
+    "quest_upstream_inflight",
+    "Upstream calls currently in flight",
+    labels=("upstream", "operation"),
+)
+
+
+def track_upstream(upstream: str, operation: str):
+    """Time an upstream call and count it as in flight."""
+    return track(
+        upstream_latency,
+        upstream_inflight,
+        span_name=f"{upstream} {operation}",
+        upstream=upstream,
+        operation=operation,
+    )
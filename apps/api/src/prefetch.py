@@ -0,0 +1,86 @@
+"""Speculative prefetch of user context when a chat is opened."""
+
+import asyncio
+import os
+import time
+
+from . import metrics
+from .admission import BACKGROUND, lane
+from .facts import get_fact_state
+from .memory import prefetched, search_memory, user_tag
+from .resilience import deadline
+from .zep import get_user_graph
+
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("PREFETCH_MAX_CONCURRENCY", "16"))
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "10"))
+PREFETCH_DEFAULT_QUERY = os.getenv("PREFETCH_DEFAULT_QUERY", "recent conversations and plans")
+PREFETCH_MEMORY_LIMIT = int(os.getenv("PREFETCH_MEMORY_LIMIT", "5"))
+
+prefetches = metrics.counter(
+    "quest_prefetch_total", "Prefetch requests by outcome", labels=("result",)
+)
+prefetch_duration = metrics.histogram(
+    "quest_prefetch_seconds", "Time to warm a user's context"
+)
+
+
+class Prefetcher:
+    """Warms a user's graph, fact state and memories in background tasks.
+
+    At most ``max_concurrency`` users are prefetched at once; further
+    requests are skipped rather than queued, since a prefetch that arrives
+    after the chat message is worthless. A user prefetched within
+    PREFETCH_TTL is not prefetched again.
+    """
+
+    def __init__(self, max_concurrency: int = PREFETCH_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._running: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def schedule(self, user_id: str, query: str | None = None) -> str:
+        """Start prefetching a user's context; returns what happened."""
+        if (await prefetched.aget(user_id))[0]:
+            result = "cached"
+        elif user_id in self._running:
+            result = "in_progress"
+        elif len(self._running) >= self.max_concurrency:
+            result = "skipped"
+        else:
+            self._running.add(user_id)
+            task = asyncio.create_task(self._prefetch(user_id, query or PREFETCH_DEFAULT_QUERY))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            result = "scheduled"
+        prefetches.inc(result=result)
+        return result
+
+    async def _prefetch(self, user_id: str, query: str) -> None:
+        start = time.perf_counter()
+        try:
+            with lane(BACKGROUND), deadline(PREFETCH_TIMEOUT):
+                # Each of these fills its own cache; they swallow upstream errors
+                _, _, memories = await asyncio.gather(
+                    get_user_graph(user_id),
+                    get_fact_state(user_id),
+                    search_memory(user_id, query, limit=PREFETCH_MEMORY_LIMIT),
+                )
+            await prefetched.aset(
+                user_id, [str(memory) for memory in memories], tags=(user_tag(user_id),)
+            )
+            prefetch_duration.observe(time.perf_counter() - start)
+        except Exception as e:
+            print(f"Prefetch failed for user {user_id}: {e}")
+        finally:
+            self._running.discard(user_id)
+
+    async def stop(self) -> None:
+        """Cancel unfinished prefetches."""
+        tasks, self._tasks = set(self._tasks), set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+prefetcher = Prefetcher()
+
@@ -0,0 +1,225 @@
+"""Request deadlines, circuit breakers and hedged reads for upstream calls."""
+
+import asyncio
+import os
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+import httpx
+
+from . import metrics
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+HEDGED_READS_ENABLED = os.getenv("HEDGED_READS_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.02"))
+LATENCY_WINDOW = 200
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+transitions = metrics.counter(
+    "quest_circuit_transitions_total",
+    "Circuit breaker state changes",
+    labels=("upstream", "state"),
+)
+rejections = metrics.counter(
+    "quest_circuit_rejections_total",
+    "Upstream calls failed fast by an open circuit",
+    labels=("upstream",),
+)
+hedges = metrics.counter(
+    "quest_upstream_hedges_total",
+    "Hedged second requests by which request answered first",
+    labels=("upstream", "operation", "winner"),
+)
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """The upstream's circuit is open, so the call failed fast."""
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The request's deadline passed before the call could be made."""
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Bound every upstream call inside the block by ``seconds`` from now.
+
+    Nested deadlines can only shorten the budget. The deadline is carried
+    in a context variable, so tasks started inside the block inherit it.
+    """
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    expires = time.monotonic() + seconds
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline, or None without one."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def bounded_timeout(timeout: float | None) -> float | None:
+    """Clip a timeout to the remaining deadline; raises if it already passed."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive upstream failures.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    are rejected for ``reset_timeout`` seconds. Then a single probe call is
+    let through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            transitions.inc(upstream=self.name, state=state)
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        rejections.inc(upstream=self.name)
+        raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self) -> None:
+        """Give up a half-open probe slot without a verdict (e.g. on cancellation)."""
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        """State for health output."""
+        info = {"state": self.state, "consecutive_failures": self.failures}
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            info["retry_in"] = round(max(self.reset_timeout - elapsed, 0), 1)
+        return info
+
+
+class LatencyWindow:
+    """Recent successful call latencies, for picking a hedge delay."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    upstream: str,
+    operation: str,
+    hedge_call: Callable[[], Awaitable[T]] | None = None,
+) -> T:
+    """Run ``call``; if it hasn't finished after ``delay``, race a second copy.
+
+    The second copy runs ``hedge_call`` when given (e.g. ``call`` holding a
+    spare admission slot, failing if there is none). The first successful
+    result wins and the other request is cancelled. If one copy fails the
+    other is still awaited; if both fail, the primary's error is raised.
+    Whatever is still running when this returns or is cancelled is cancelled.
+    """
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future((hedge_call or call)())
+        pending.add(second)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedges.inc(upstream=upstream, operation=operation,
+                               winner="hedge" if task is second else "primary")
+                    return task.result()
+        raise first.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    """The circuit breaker for an upstream, created on first use."""
+    if name not in _breakers:
+        prefix = name.upper()
+        _breakers[name] = CircuitBreaker(
+            name,
+            int(os.getenv(f"{prefix}_CIRCUIT_FAILURE_THRESHOLD", CIRCUIT_FAILURE_THRESHOLD)),
+            float(os.getenv(f"{prefix}_CIRCUIT_RESET_TIMEOUT", CIRCUIT_RESET_TIMEOUT)),
+        )
+    return _breakers[name]
+
+
+def circuit_states() -> dict[str, dict]:
+    """Every breaker's state, by upstream."""
+    return {name: b.snapshot() for name, b in sorted(_breakers.items())}
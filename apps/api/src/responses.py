@@ -0,0 +1,41 @@
+"""Fast JSON responses: models and plain data are serialized straight to bytes."""
+
+from typing import Any
+
+import pydantic_core
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; pydantic-core's encoder is used instead
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON bytes.
+
+    Pydantic models go through their compiled serializer in one pass; plain
+    data uses orjson when installed. Anything orjson can't encode (e.g. a
+    dict holding models) falls back to pydantic-core.
+    """
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps``.
+
+    Used as the app's default response class. Endpoints on hot paths return
+    ``FastJSONResponse(model)`` directly, which skips FastAPI's
+    validate-dump-encode round trip of the response model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -2,8 +2,9 @@
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from typing_extensions import TypedDict
 
 
 class JobStatus(str, Enum):
@@ -80,6 +81,27 @@ class FactExtractionResult(BaseModel):
     summary: str = ""
 
 
+class BatchFactExtractionResult(BaseModel):
+    """Fact extraction results for several texts, in input order."""
+    results: list[FactExtractionResult] = Field(default_factory=list)
+
+
+class FactExtractionItem(BaseModel):
+    """A text to extract facts from, optionally tied to a user."""
+    text: str
+    user_id: str | None = None
+
+
+class FactExtractionBatchRequest(BaseModel):
+    """Request for the batch fact extraction endpoint."""
+    items: list[FactExtractionItem] = Field(min_length=1, max_length=1000)
+
+
+class FactExtractionBatchResponse(BaseModel):
+    """One extraction result per requested item, in order."""
+    results: list[FactExtractionResult] = Field(default_factory=list)
+
+
 class PendingConfirmation(BaseModel):
     """A pending confirmation for HITL workflow."""
     id: Optional[str] = None
@@ -93,17 +115,49 @@ class PendingConfirmation(BaseModel):
     created_at: Optional[datetime] = None
 
 
-class ChatMessage(BaseModel):
-    """A chat message."""
-    role: str = Field(pattern="^(user|assistant|system)$")
+class ChatMessage(TypedDict):
+    """A chat message.
+
+    A validated dict rather than a model: histories can be long, and the
+    rest of the app works with plain message dicts.
+    """
+    role: Literal["user", "assistant", "system"]
     content: str
 
 
 class ChatRequest(BaseModel):
-    """Request for chat endpoint."""
-    messages: list[ChatMessage]
+    """Request for chat endpoint.
+
+    Send the full ``messages`` history, or just the new ``message`` plus the
+    ``session_id`` of a session the server already holds.
+    """
+    messages: list[ChatMessage] = Field(default_factory=list)
+    message: ChatMessage | None = None
     user_id: Optional[str] = None
     session_id: Optional[str] = None
+    app_type: str = "relocation"  # 'relocation' or 'placement'; used by /chat
+
+
+class PrefetchRequest(BaseModel):
+    """Request to warm a user's context before their first message.
+
+    Without a ``query``, the last user message in the session is used.
+    """
+    user_id: str
+    session_id: str | None = None
+    query: str | None = None
+
+
+class ConditionsRequest(BaseModel):
+    """Request to bring a user's materialized conditions up to date.
+
+    With a ``session_id`` the server-side session history is used when the
+    session exists; otherwise send the full ``messages`` history.
+    """
+    user_id: str
+    session_id: str | None = None
+    messages: list[ChatMessage] = Field(default_factory=list)
+    rebuild: bool = False
 
 
 class ArticleRecommendation(BaseModel):
@@ -122,3 +176,9 @@ class ChatResponse(BaseModel):
     extracted_facts: list[ExtractedFact] = Field(default_factory=list)
     pending_confirmations: list[PendingConfirmation] = Field(default_factory=list)
     recommendations: list[ArticleRecommendation] = Field(default_factory=list)
+
+
+# Precompiled adapters for list payloads serialized on hot paths
+extracted_facts_adapter = TypeAdapter(list[ExtractedFact])
+pending_confirmations_adapter = TypeAdapter(list[PendingConfirmation])
+article_recommendations_adapter = TypeAdapter(list[ArticleRecommendation])
@@ -0,0 +1,108 @@
+"""Semantic response cache for generic first-turn questions."""
+
+import os
+import re
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+# Words that don't change what a question asks about; every other word,
+# entities included, must match for two questions to share an answer
+STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did to of in on at for from by with
+about into as and or but if so than then that this these those it its i me my we our you
+your he she they them their what which who whom how when where why can could would should
+will shall may might must have has had there here any some please just really tell know
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+lookups = metrics.counter(
+    "quest_semantic_cache_requests_total",
+    "Semantic cache lookups by result (hit, miss, bypass)",
+    labels=("app_type", "result"),
+)
+
+
+def content_words(question: str) -> frozenset[str]:
+    """The words of a question that aren't stopwords."""
+    return frozenset(w for w in _WORD.findall(question.lower()) if w not in STOPWORDS)
+
+
+def cacheable_question(messages: list[dict], context: str) -> str | None:
+    """The question to key on, or None if the response is user-specific.
+
+    Only first turns without memory context are cached: once there is history
+    or anything known about the user, the answer depends on more than the
+    question itself.
+    """
+    if context:
+        return None
+    turns = [m for m in messages if m["role"] != "system"]
+    if len(turns) != 1 or turns[0]["role"] != "user":
+        return None
+    return turns[0]["content"]
+
+
+class SemanticCache:
+    """Response cache keyed on a question's content words, partitioned by app type.
+
+    Two questions share an answer when they have the same content words:
+    rephrasings that only differ in stopwords, case, punctuation or word
+    order hit, while questions differing in any entity ("move to Portugal" /
+    "move to Spain") don't. Each partition is an LRU bounded by ``capacity``
+    with a per-entry TTL. Questions made only of stopwords aren't cached.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_SIZE, ttl: float = SEMANTIC_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        # app type -> content words -> (expires_at, response)
+        self._partitions: dict[str, OrderedDict[frozenset[str], tuple[float, str]]] = {}
+
+    def lookup(self, app_type: str, question: str) -> str | None:
+        """Return the cached response for a question with the same content words, if any."""
+        partition = self._partitions.get(app_type)
+        words = content_words(question)
+        entry = partition.get(words) if partition is not None and words else None
+        if entry is not None and entry[0] >= time.monotonic():
+            partition.move_to_end(words)
+            lookups.inc(app_type=app_type, result="hit")
+            return entry[1]
+        if entry is not None:
+            del partition[words]
+        lookups.inc(app_type=app_type, result="miss")
+        return None
+
+    def store(self, app_type: str, question: str, response: str) -> None:
+        """Cache a response, evicting the least recently used entry if full."""
+        words = content_words(question)
+        if not words:
+            return
+        partition = self._partitions.setdefault(app_type, OrderedDict())
+        partition.pop(words, None)
+        partition[words] = (time.monotonic() + self.ttl, response)
+        while len(partition) > self.capacity:
+            partition.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._partitions.clear()
+
+
+response_cache = SemanticCache()
+
+
+def cache_question(app_type: str, messages: list[dict], context: str) -> str | None:
+    """The question to look up for this request, or None to bypass the cache."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    question = cacheable_question(messages, context)
+    if question is None:
+        lookups.inc(app_type=app_type, result="bypass")
+    return question
@@ -0,0 +1,218 @@
+"""Server-side chat sessions so clients only send the newest message."""
+
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+
+from . import db
+from .context import estimate_tokens, render_turn
+from .writeback import writer
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # 'memory' or 'postgres'
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_session_turns (
+    id BIGSERIAL PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    user_id TEXT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS chat_session_turns_session_idx
+    ON chat_session_turns (session_id, id);
+"""
+
+
+class Session:
+    """A bounded ring buffer of turns with their rendered prompt lines.
+
+    Each turn is rendered and its tokens estimated once, when it is added, so
+    assembling a prompt never re-processes the history.
+    """
+
+    def __init__(self, session_id: str, user_id: str | None = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.turns: deque[dict] = deque(maxlen=SESSION_MAX_TURNS)
+        self.lines: deque[str] = deque(maxlen=SESSION_MAX_TURNS)
+        self.line_tokens: deque[int] = deque(maxlen=SESSION_MAX_TURNS)
+        self.touched = time.monotonic()
+
+    def add(self, role: str, content: str) -> dict:
+        """Append a turn and its rendered line."""
+        turn = {"role": role, "content": content}
+        line = render_turn(role, content)
+        self.turns.append(turn)
+        self.lines.append(line)
+        self.line_tokens.append(estimate_tokens(line))
+        self.touched = time.monotonic()
+        return turn
+
+    @property
+    def messages(self) -> list[dict]:
+        """Turns in the session, oldest first."""
+        return list(self.turns)
+
+    def prompt_lines(self, pending: list[dict] = ()) -> tuple[list[str], list[int]]:
+        """Rendered lines and their token estimates, followed by turns not added yet."""
+        extra = [render_turn(turn["role"], turn["content"]) for turn in pending]
+        return (
+            list(self.lines) + extra,
+            list(self.line_tokens) + [estimate_tokens(line) for line in extra],
+        )
+
+
+class SessionStore:
+    """In-memory sessions with LRU eviction and an idle timeout."""
+
+    def __init__(self):
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    async def start(self) -> None:
+        """Prepare the backend."""
+
+    async def load(self, session_id: str) -> Session | None:
+        """Load a session the store doesn't hold in memory."""
+        return None
+
+    async def persist(self, session: Session, turn: dict) -> None:
+        """Persist a newly added turn."""
+
+    async def get(self, session_id: str) -> Session | None:
+        """Get a session by id, or None if it doesn't exist or expired."""
+        session = self._sessions.get(session_id)
+        if session is not None and time.monotonic() - session.touched > SESSION_IDLE_TTL:
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            session = await self.load(session_id)
+            if session is None:
+                return None
+            self._remember(session)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def create(
+        self, session_id: str, user_id: str | None = None, messages: list[dict] = ()
+    ) -> Session:
+        """Create a session, optionally seeded with earlier messages."""
+        session = Session(session_id, user_id)
+        self._remember(session)
+        for message in messages:
+            await self.append(session, message["role"], message["content"])
+        return session
+
+    async def append(self, session: Session, role: str, content: str) -> None:
+        """Add a turn to a session and persist it."""
+        turn = session.add(role, content)
+        await self.persist(session, turn)
+
+    def _remember(self, session: Session) -> None:
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > SESSION_MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+
+
+class PostgresSessionStore(SessionStore):
+    """Sessions cached in memory and persisted to Postgres.
+
+    Turns are written through the write-behind queue, batched per session, so
+    the request never waits on the insert.
+    """
+
+    async def start(self) -> None:
+        await db.execute(SCHEMA)
+        writer.register("session_turns", _flush_turns)
+
+    async def load(self, session_id: str) -> Session | None:
+        def _load(conn) -> list[tuple]:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT user_id, role, content FROM chat_session_turns
+                    WHERE session_id = %s ORDER BY id DESC LIMIT %s""",
+                    (session_id, SESSION_MAX_TURNS),
+                )
+                return cur.fetchall()
+
+        rows = await db.run(_load)
+        if not rows:
+            return None
+        session = Session(session_id, rows[0][0])
+        for _, role, content in reversed(rows):
+            session.add(role, content)
+        return session
+
+    async def persist(self, session: Session, turn: dict) -> None:
+        await writer.submit("session_turns", session.session_id, {
+            "user_id": session.user_id,
+            **turn,
+        })
+
+
+async def _flush_turns(session_id: str, turns: list[dict]) -> None:
+    """Insert queued turns for a session in one round-trip."""
+    def _insert(conn) -> None:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """INSERT INTO chat_session_turns (session_id, user_id, role, content)
+                VALUES (%s, %s, %s, %s)""",
+                [(session_id, t["user_id"], t["role"], t["content"]) for t in turns],
+            )
+
+    await db.run(_insert)
+
+
+def new_turns(stored: list[dict], messages: list[dict]) -> list[dict]:
+    """The turns of a full client history that go past a session's stored tail.
+
+    The stored turns (possibly only the most recent ones) are aligned with
+    the end of a prefix of ``messages``; whatever follows is new. A history
+    that is already contained in the session, as when a request is retried
+    or resent, adds nothing. If the two don't line up at all (the client
+    edited its history), only the last message is taken as new.
+    """
+    if not stored:
+        return list(messages)
+    stored_keys = [(t["role"], t["content"]) for t in stored]
+    keys = [(m["role"], m["content"]) for m in messages]
+    for end in range(len(keys), 0, -1):
+        overlap = min(end, len(stored_keys))
+        if keys[end - overlap:end] == stored_keys[-overlap:]:
+            return list(messages[end:])
+    for end in range(len(stored_keys), 0, -1):
+        overlap = min(end, len(keys))
+        if stored_keys[end - overlap:end] == keys[-overlap:]:
+            return []
+    return list(messages[-1:])
+
+
+async def record_exchange(
+    store: SessionStore, session: Session, turns: list[dict], reply: str
+) -> None:
+    """Add a request's new turns and the assistant's reply to a session.
+
+    The turns are only added once there is a reply, so a failed or abandoned
+    generation leaves the session as it was and a retry lines up with it.
+    """
+    for turn in turns:
+        await store.append(session, turn["role"], turn["content"])
+    await store.append(session, "assistant", reply)
+
+
+async def record_reply(
+    store: SessionStore, session: Session, turns: list[dict], deltas: AsyncIterator[str]
+) -> AsyncIterator[str]:
+    """Pass streamed deltas through, then record the turns and the full reply."""
+    parts = []
+    async for delta in deltas:
+        parts.append(delta)
+        yield delta
+    await record_exchange(store, session, turns, "".join(parts))
+
+
+sessions = PostgresSessionStore() if SESSION_BACKEND == "postgres" else SessionStore()
@@ -0,0 +1,377 @@
+"""State shared by every worker process on a box.
+
+With a single uvicorn worker, caches and stores live in process memory.
+Running several workers (WEB_CONCURRENCY > 1) would give each one its own
+copy: a memory written through one worker would leave the others serving a
+stale search, and a HITL confirmation created on one worker would be
+invisible to the next request. In shared mode those live in one SQLite
+database in WAL mode instead, on tmpfs (/dev/shm) when available, which
+every worker opens: a local stand-in for a Redis-style store with no extra
+service to run.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable
+from typing import Any, TypeVar
+
+import orjson
+
+from . import metrics
+from .cache import AsyncCache, _Load, evictions
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# 'local' (in-process) or 'sqlite' (shared by workers); shared by default
+# whenever more than one worker runs
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite" if WEB_CONCURRENCY > 1 else "local")
+STATE_PATH = os.getenv(
+    "STATE_PATH", "/dev/shm/quest_state.db" if os.path.isdir("/dev/shm") else "data/state.db"
+)
+# How long a write waits for another worker's transaction, in milliseconds
+STATE_BUSY_TIMEOUT = int(os.getenv("STATE_BUSY_TIMEOUT", "1000"))
+# Expired and excess cache entries are pruned after this many writes per cache
+STATE_PRUNE_EVERY = int(os.getenv("STATE_PRUNE_EVERY", "256"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    cache TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (cache, key)
+);
+CREATE TABLE IF NOT EXISTS cache_tags (
+    cache TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (cache, tag, key)
+);
+CREATE TABLE IF NOT EXISTS tag_generations (
+    cache TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (cache, tag)
+);
+"""
+
+T = TypeVar("T")
+
+errors = metrics.counter(
+    "quest_shared_state_errors_total",
+    "Shared state operations that failed and fell back",
+    labels=("operation",),
+)
+
+
+def is_shared() -> bool:
+    """Whether state is shared across worker processes."""
+    return STATE_BACKEND == "sqlite"
+
+
+class SharedState:
+    """One SQLite connection per process to the shared state database.
+
+    Everything goes through ``run``, which uses a worker thread like db.run:
+    a write can wait up to STATE_BUSY_TIMEOUT for another worker's
+    transaction, which must not block the event loop.
+    """
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=STATE_BUSY_TIMEOUT / 1000,
+                check_same_thread=False, isolation_level=None,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def transaction(self, fn: Callable[[sqlite3.Connection], T], write: bool = False) -> T:
+        """Run fn(conn) in one transaction, taking the write lock up front if writing."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T], write: bool = False) -> T:
+        """Run fn(conn) in a transaction in a worker thread."""
+        return await asyncio.to_thread(self.transaction, fn, write)
+
+    async def execute_script(self, script: str) -> None:
+        """Run DDL, e.g. a store's CREATE TABLE IF NOT EXISTS schema."""
+        def _execute() -> None:
+            with self._lock:
+                self._connect().executescript(script)
+
+        await asyncio.to_thread(_execute)
+
+    async def start(self) -> None:
+        """Create the cache schema; every worker does this, which is idempotent."""
+        await self.execute_script(SCHEMA)
+
+    def close(self) -> None:
+        """Close this process's connection."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+state = SharedState()
+
+
+def _encode_key(key: Hashable) -> str:
+    return orjson.dumps(key).decode()
+
+
+class LocalCache(AsyncCache):
+    """An in-process AsyncCache that also has the async API of SharedCache.
+
+    Single-worker mode uses it in place of a SharedCache, so callers of
+    ``shared_cache`` work the same way in either mode.
+    """
+
+    async def aget(self, key: Hashable) -> tuple[bool, Any]:
+        return self.get(key)
+
+    async def aset(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        self.set(key, value, tags)
+
+    async def ainvalidate(self, tag: str) -> int:
+        return self.invalidate(tag)
+
+    async def aclear(self) -> None:
+        self.clear()
+
+    async def size(self) -> int:
+        return len(self)
+
+
+class SharedCache(AsyncCache):
+    """An AsyncCache whose entries live in the shared state database.
+
+    Every worker sees the same entries, and an invalidation in one worker
+    drops them for all. Concurrent loads are still coalesced per process.
+    Each tag has a generation bumped on invalidation; a load only stores its
+    value if its tags' generations are unchanged since it started, so a load
+    overlapping an invalidation in another worker doesn't store stale data.
+    Values must be JSON-serializable. Every operation is a transaction run
+    in a worker thread, so the API is async: ``aget``, ``aset``,
+    ``ainvalidate`` and ``aclear`` take the place of AsyncCache's methods,
+    which can't reach the database and raise NotImplementedError.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, shared: SharedState = state):
+        super().__init__(name, maxsize, ttl)
+        self.state = shared
+        self._writes = 0
+
+    async def size(self) -> int:
+        """Entries not yet expired, across all workers."""
+        try:
+            return await self.state.run(lambda conn: conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE cache = ? AND expires_at >= ?",
+                (self.name, time.time()),
+            ).fetchone()[0])
+        except Exception:
+            return 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        raise NotImplementedError("SharedCache is async: use aget")
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError("SharedCache is async: use aset")
+
+    def invalidate(self, tag: str) -> int:
+        raise NotImplementedError("SharedCache is async: use ainvalidate")
+
+    def clear(self) -> None:
+        raise NotImplementedError("SharedCache is async: use aclear")
+
+    async def aget(self, key: Hashable) -> tuple[bool, Any]:
+        try:
+            row = await self.state.run(lambda conn: conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?",
+                (self.name, _encode_key(key)),
+            ).fetchone())
+        except Exception as e:
+            errors.inc(operation="get")
+            print(f"Shared cache {self.name} get failed: {e}")
+            return False, None
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, orjson.loads(row[0])
+
+    async def aset(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        await self._store(key, value, tuple(tags), None)
+
+    def _generations(self, conn: sqlite3.Connection, tags: tuple[str, ...]) -> dict[str, int]:
+        if not tags:
+            return {}
+        rows = conn.execute(
+            f"SELECT tag, generation FROM tag_generations WHERE cache = ? "
+            f"AND tag IN ({','.join('?' * len(tags))})",
+            (self.name, *tags),
+        ).fetchall()
+        current = dict(rows)
+        return {tag: current.get(tag, 0) for tag in tags}
+
+    async def _store(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: tuple[str, ...],
+        generations: dict[str, int] | None,
+    ) -> None:
+        try:
+            encoded_key, encoded = _encode_key(key), orjson.dumps(value, default=str)
+        except TypeError as e:
+            print(f"Shared cache {self.name} can't store {key!r}: {e}")
+            return
+
+        def _write(conn) -> None:
+            if generations is not None and self._generations(conn, tags) != generations:
+                return  # invalidated while loading
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.name, encoded_key, encoded, time.time() + self.ttl),
+            )
+            conn.execute(
+                "DELETE FROM cache_tags WHERE cache = ? AND key = ?", (self.name, encoded_key)
+            )
+            conn.executemany(
+                "INSERT INTO cache_tags (cache, tag, key) VALUES (?, ?, ?)",
+                [(self.name, tag, encoded_key) for tag in tags],
+            )
+
+        try:
+            await self.state.run(_write, write=True)
+        except Exception as e:
+            errors.inc(operation="set")
+            print(f"Shared cache {self.name} set failed: {e}")
+            return
+        self._writes += 1
+        if self._writes % STATE_PRUNE_EVERY == 0:
+            await self.prune()
+
+    async def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        return await self.aget(key)
+
+    async def _begin_load(self, load: _Load) -> None:
+        load.generations = None
+        try:
+            load.generations = await self.state.run(
+                lambda conn: self._generations(conn, load.tags)
+            )
+        except Exception:
+            load.stale = True  # can't tell if an invalidation overlaps, so don't store
+
+    async def _finish_load(self, key: Hashable, value: Any, load: _Load) -> None:
+        if not load.stale:
+            await self._store(key, value, load.tags, load.generations)
+
+    async def ainvalidate(self, tag: str) -> int:
+        for load in self._inflight.values():
+            if tag in load.tags:
+                load.stale = True
+
+        def _invalidate(conn) -> int:
+            conn.execute(
+                "INSERT INTO tag_generations (cache, tag, generation) VALUES (?, ?, 1) "
+                "ON CONFLICT (cache, tag) DO UPDATE SET generation = generation + 1",
+                (self.name, tag),
+            )
+            removed = conn.execute(
+                "DELETE FROM cache_entries WHERE cache = ? AND key IN "
+                "(SELECT key FROM cache_tags WHERE cache = ? AND tag = ?)",
+                (self.name, self.name, tag),
+            ).rowcount
+            conn.execute("DELETE FROM cache_tags WHERE cache = ? AND tag = ?", (self.name, tag))
+            return removed
+
+        try:
+            removed = await self.state.run(_invalidate, write=True)
+        except Exception as e:
+            errors.inc(operation="invalidate")
+            print(f"Shared cache {self.name} invalidate failed: {e}")
+            return 0
+        if removed:
+            evictions.inc(removed, cache=self.name, reason="invalidated")
+        return removed
+
+    async def aclear(self) -> None:
+        for load in self._inflight.values():
+            load.stale = True
+
+        def _clear(conn) -> None:
+            conn.execute("DELETE FROM cache_entries WHERE cache = ?", (self.name,))
+            conn.execute("DELETE FROM cache_tags WHERE cache = ?", (self.name,))
+
+        try:
+            await self.state.run(_clear, write=True)
+        except Exception as e:
+            errors.inc(operation="clear")
+            print(f"Shared cache {self.name} clear failed: {e}")
+
+    async def prune(self) -> None:
+        """Drop expired entries, then the soonest-expiring ones beyond maxsize."""
+        def _prune(conn) -> tuple[int, int]:
+            expired = conn.execute(
+                "DELETE FROM cache_entries WHERE cache = ? AND expires_at < ?",
+                (self.name, time.time()),
+            ).rowcount
+            excess = conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE cache = ?", (self.name,)
+            ).fetchone()[0] - self.maxsize
+            evicted = 0
+            if excess > 0:
+                evicted = conn.execute(
+                    "DELETE FROM cache_entries WHERE cache = ? AND key IN "
+                    "(SELECT key FROM cache_entries WHERE cache = ? ORDER BY expires_at LIMIT ?)",
+                    (self.name, self.name, excess),
+                ).rowcount
+            conn.execute(
+                "DELETE FROM cache_tags WHERE cache = ? AND NOT EXISTS (SELECT 1 FROM "
+                "cache_entries e WHERE e.cache = cache_tags.cache AND e.key = cache_tags.key)",
+                (self.name,),
+            )
+            return expired, evicted
+
+        try:
+            expired, evicted = await self.state.run(_prune, write=True)
+        except Exception as e:
+            errors.inc(operation="prune")
+            print(f"Shared cache {self.name} prune failed: {e}")
+            return
+        if expired:
+            evictions.inc(expired, cache=self.name, reason="expired")
+        if evicted:
+            evictions.inc(evicted, cache=self.name, reason="size")
+
+
+def shared_cache(name: str, maxsize: int, ttl: float) -> SharedCache | LocalCache:
+    """A cache shared across workers in shared mode, in-process otherwise.
+
+    Either way use the async API: ``await cache.aget(key)``, ``await
+    cache.ainvalidate(tag)``.
+    """
+    return SharedCache(name, maxsize, ttl) if is_shared() else LocalCache(name, maxsize, ttl)
@@ -0,0 +1,132 @@
+"""Dependency-aware concurrent execution of request stages."""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from . import metrics
+from .resilience import remaining
+
+stage_latency = metrics.histogram(
+    "quest_stage_seconds",
+    "Latency of request pipeline stages",
+    labels=("pipeline", "stage", "outcome"),
+)
+
+
+class Stage:
+    """A unit of work in a request pipeline."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        depends_on: tuple[str, ...] = (),
+        timeout: float | None = None,
+        optional: bool = False,
+        default: Any = None,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.depends_on = depends_on
+        self.timeout = timeout
+        self.optional = optional
+        self.default = default
+        self.enabled = enabled
+
+
+class StageGraph:
+    """Run stages concurrently, each starting as soon as its dependencies finish.
+
+    A stage's function is called with its dependencies' results as keyword
+    arguments. Required stages propagate their exception (cancelling the rest
+    of the graph); optional stages that fail or miss their deadline resolve to
+    their default value so dependents and the response can still proceed.
+    Disabled stages resolve to their default without running.
+
+    ``run`` can be given an ``on_result`` callback, called with each stage's
+    name and result the moment it resolves, to report progress early.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: dict[str, Stage] = {}
+        self.timings: dict[str, float] = {}
+        self.degraded: list[str] = []
+        self._on_result: Callable[[str, Any], None] | None = None
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *,
+        depends_on: tuple[str, ...] = (),
+        timeout: float | None = None,
+        optional: bool = False,
+        default: Any = None,
+        enabled: bool = True,
+    ) -> "StageGraph":
+        """Add a stage. Dependencies must already be in the graph."""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [dep for dep in depends_on if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self.stages[name] = Stage(name, func, depends_on, timeout, optional, default, enabled)
+        return self
+
+    def _resolve(self, stage: Stage, futures: dict[str, asyncio.Future], result: Any) -> None:
+        futures[stage.name].set_result(result)
+        if self._on_result is not None:
+            self._on_result(stage.name, result)
+
+    async def _run_stage(self, stage: Stage, futures: dict[str, asyncio.Future]) -> None:
+        if not stage.enabled:
+            self._resolve(stage, futures, stage.default)
+            return
+        inputs = {dep: await futures[dep] for dep in stage.depends_on}
+        start = time.perf_counter()
+        outcome = "ok"
+        # The request deadline caps every stage's own timeout
+        timeout, left = stage.timeout, remaining()
+        if left is not None:
+            timeout = max(left, 0) if timeout is None else max(min(timeout, left), 0)
+        try:
+            async with asyncio.timeout(timeout):
+                result = await stage.func(**inputs)
+        except Exception as e:
+            if not stage.optional:
+                outcome = "error"
+                futures[stage.name].set_exception(e)
+                # Mark retrieved: the TaskGroup reports the error, not the future
+                futures[stage.name].exception()
+                raise
+            outcome = "degraded"
+            self.degraded.append(stage.name)
+            result = stage.default
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage.name] = elapsed
+            stage_latency.observe(elapsed, pipeline=self.name, stage=stage.name, outcome=outcome)
+        self._resolve(stage, futures, result)
+
+    async def run(
+        self, on_result: Callable[[str, Any], None] | None = None
+    ) -> dict[str, Any]:
+        """Execute the graph and return every stage's result by name."""
+        self._on_result = on_result
+        loop = asyncio.get_running_loop()
+        futures = {name: loop.create_future() for name in self.stages}
+        try:
+            async with asyncio.TaskGroup() as group:
+                for stage in self.stages.values():
+                    group.create_task(self._run_stage(stage, futures))
+        except ExceptionGroup as eg:
+            # Surface the first required-stage failure as a plain exception
+            raise eg.exceptions[0] from None
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,136 @@
+"""Vercel AI SDK data-stream protocol encoding for streamed agent output."""
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator
+
+from . import metrics
+
+# Max buffered deltas between the model stream and the client socket. When the
+# client reads slowly the buffer fills and the model stream is paused.
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "64"))
+# Upper bound on characters sent in one text part when catching up on a backlog
+STREAM_MAX_CHUNK_CHARS = int(os.getenv("STREAM_MAX_CHUNK_CHARS", "2048"))
+
+DATA_STREAM_HEADER = "x-vercel-ai-data-stream"
+DATA_STREAM_HEADERS = {
+    DATA_STREAM_HEADER: "v1",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+time_to_first_token = metrics.histogram(
+    "quest_time_to_first_token_seconds",
+    "Time from request start to the first streamed text part",
+    labels=("app_type",),
+)
+stream_duration = metrics.histogram(
+    "quest_stream_duration_seconds",
+    "Time from request start to the end of the stream",
+    labels=("app_type", "outcome"),
+)
+
+_DONE = object()
+
+
+def text_part(text: str) -> str:
+    """Encode a text delta (type 0)."""
+    return f"0:{json.dumps(text)}\n"
+
+
+def data_part(items: list) -> str:
+    """Encode data items (type 2), e.g. typed events alongside the text."""
+    return f"2:{json.dumps(items)}\n"
+
+
+def error_part(message: str) -> str:
+    """Encode an error (type 3)."""
+    return f"3:{json.dumps(message)}\n"
+
+
+def finish_message_part(finish_reason: str = "stop") -> str:
+    """Encode the end of the message (type d)."""
+    return f"d:{json.dumps({'finishReason': finish_reason})}\n"
+
+
+def stream_failed(body: str) -> bool:
+    """Whether an encoded data stream ended with an error part.
+
+    The status is already 200 when the error happens, so a failure only
+    shows in the stream itself.
+    """
+    return body.rstrip("\n").rpartition("\n")[2].startswith("3:")
+
+
+async def _pump(deltas: AsyncIterator[str | dict], buffer: asyncio.Queue) -> None:
+    """Move deltas from the model stream into the bounded buffer."""
+    try:
+        async for delta in deltas:
+            if delta:
+                await buffer.put(delta)
+        await buffer.put(_DONE)
+    except Exception as e:
+        await buffer.put(e)
+
+
+async def data_stream(
+    deltas: AsyncIterator[str | dict], app_type: str, started: float
+) -> AsyncIterator[str]:
+    """Encode model deltas as a Vercel AI data stream.
+
+    Deltas are sent one per part while the client keeps up. If the client
+    falls behind, whatever has accumulated is merged into a single part so the
+    socket isn't flooded with tiny frames. Dicts in the stream are events
+    (facts, confirmations, ...) and go out as data parts, in order with the
+    text. When the client disconnects the response generator is closed and
+    the upstream model call is cancelled.
+    """
+    buffer: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+    producer = asyncio.create_task(_pump(deltas, buffer))
+    first = True
+    outcome = "cancelled"
+    held = None  # an item taken while merging text, sent next
+    try:
+        while True:
+            if held is not None:
+                item, held = held, None
+            else:
+                item = await buffer.get()
+            if item is _DONE:
+                outcome = "ok"
+                yield finish_message_part()
+                break
+            if isinstance(item, Exception):
+                outcome = "error"
+                yield error_part(str(item))
+                break
+            if isinstance(item, dict):
+                yield data_part([item])
+                continue
+
+            chunk = [item]
+            size = len(item)
+            while size < STREAM_MAX_CHUNK_CHARS and not buffer.empty():
+                pending = buffer.get_nowait()
+                if not isinstance(pending, str):
+                    # Send events and the terminal marker after this text
+                    held = pending
+                    break
+                chunk.append(pending)
+                size += len(pending)
+
+            if first:
+                time_to_first_token.observe(time.perf_counter() - started, app_type=app_type)
+                first = False
+            yield text_part("".join(chunk))
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        stream_duration.observe(
+            time.perf_counter() - started, app_type=app_type, outcome=outcome
+        )
@@ -0,0 +1,224 @@
+"""Write-behind queue for upstream writes that don't affect the response."""
+
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from . import metrics
+from .admission import BACKGROUND, lane
+from .memory import store_conversation_batch
+from .schemas import FactType
+from .zep import sync_user_facts
+
+WRITEBACK_QUEUE_SIZE = int(os.getenv("WRITEBACK_QUEUE_SIZE", "1000"))
+WRITEBACK_BATCH_SIZE = int(os.getenv("WRITEBACK_BATCH_SIZE", "50"))
+WRITEBACK_FLUSH_INTERVAL = float(os.getenv("WRITEBACK_FLUSH_INTERVAL", "0.5"))
+WRITEBACK_MAX_RETRIES = int(os.getenv("WRITEBACK_MAX_RETRIES", "3"))
+WRITEBACK_RETRY_BACKOFF = float(os.getenv("WRITEBACK_RETRY_BACKOFF", "0.5"))
+WRITEBACK_DRAIN_TIMEOUT = float(os.getenv("WRITEBACK_DRAIN_TIMEOUT", "10"))
+
+# A flush handler writes every queued payload of one kind for one user. It
+# may remove payloads it has written from the list before raising, so a
+# retry only writes the rest.
+FlushHandler = Callable[[str, list[Any]], Awaitable[None]]
+
+enqueued = metrics.counter(
+    "quest_writeback_enqueued_total", "Writes accepted by the write-behind queue", labels=("kind",)
+)
+inline_writes = metrics.counter(
+    "quest_writeback_inline_total",
+    "Writes performed inline because the queue was full or stopped",
+    labels=("kind",),
+)
+flushed = metrics.counter(
+    "quest_writeback_flushes_total",
+    "Coalesced upstream writes by outcome",
+    labels=("kind", "outcome"),
+)
+retries = metrics.counter(
+    "quest_writeback_retries_total", "Retried upstream writes", labels=("kind",)
+)
+
+
+class WriteError(Exception):
+    """An upstream write reported failure."""
+
+
+class WriteBehindQueue:
+    """Queue writes, then coalesce and flush them per user in the background.
+
+    Payloads are grouped by (kind, user_id) within each batch window so a
+    burst of writes for one user becomes a single upstream call. Failed
+    flushes are retried with exponential backoff. When the queue is full or
+    the worker isn't running, writes fall back to being awaited inline so
+    nothing is dropped.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = WRITEBACK_QUEUE_SIZE,
+        batch_size: int = WRITEBACK_BATCH_SIZE,
+        flush_interval: float = WRITEBACK_FLUSH_INTERVAL,
+        max_retries: int = WRITEBACK_MAX_RETRIES,
+        retry_backoff: float = WRITEBACK_RETRY_BACKOFF,
+    ):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._handlers: dict[str, FlushHandler] = {}
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    def register(self, kind: str, handler: FlushHandler) -> None:
+        """Register the flush handler for a kind of write."""
+        self._handlers[kind] = handler
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def depth(self) -> int:
+        """Number of writes waiting to be flushed."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        """Start the background flush worker."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, kind: str, user_id: str, payload: Any) -> None:
+        """Queue a write, or perform it inline if the queue can't take it."""
+        if self.running:
+            try:
+                self._queue.put_nowait((kind, user_id, payload))
+                enqueued.inc(kind=kind)
+                return
+            except asyncio.QueueFull:
+                pass
+        inline_writes.inc(kind=kind)
+        await self._flush_group(kind, user_id, [payload])
+
+    async def drain(self, timeout: float = WRITEBACK_DRAIN_TIMEOUT) -> None:
+        """Stop accepting writes and flush everything still queued."""
+        if not self.running:
+            return
+        worker, self._worker = self._worker, None
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(worker, timeout)
+        except TimeoutError:
+            print(f"Write-behind drain timed out with {self.depth()} writes pending")
+
+    async def _next_batch(self) -> tuple[list[tuple[str, str, Any]], bool]:
+        """Collect up to batch_size writes within one flush interval."""
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            groups: dict[tuple[str, str], list[Any]] = {}
+            for kind, user_id, payload in batch:
+                groups.setdefault((kind, user_id), []).append(payload)
+            await asyncio.gather(*[
+                self._flush_group(kind, user_id, payloads)
+                for (kind, user_id), payloads in groups.items()
+            ])
+
+    async def _flush_group(self, kind: str, user_id: str, payloads: list[Any]) -> None:
+        handler = self._handlers[kind]
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Deferred writes queue behind interactive reads for upstream slots
+                with lane(BACKGROUND):
+                    await handler(user_id, payloads)
+                flushed.inc(kind=kind, outcome="ok")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    flushed.inc(kind=kind, outcome="failed")
+                    print(f"Write-behind {kind} for {user_id} failed: {e}")
+                    return
+                retries.inc(kind=kind)
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+
+async def _flush_conversations(user_id: str, exchanges: list[dict]) -> None:
+    """Store queued exchanges, one memory per session.
+
+    Sessions that were stored are removed from ``exchanges``, so a retry
+    after a partial failure doesn't store them twice.
+    """
+    by_session: dict[str, list[dict]] = {}
+    for exchange in exchanges:
+        by_session.setdefault(exchange["session_id"], []).append(exchange)
+    stored, error = set(), None
+    for session_id, session_exchanges in by_session.items():
+        result = await store_conversation_batch(user_id, session_id, session_exchanges)
+        if result.get("status") == "error":
+            error = result.get("error", "store failed")
+        else:
+            stored.add(session_id)
+    exchanges[:] = [e for e in exchanges if e["session_id"] not in stored]
+    if error is not None:
+        raise WriteError(error)
+
+
+async def _flush_facts(user_id: str, fact_lists: list[list[dict]]) -> None:
+    """Sync queued facts in one call, keeping the latest value per fact."""
+    # Imported here: facts queues its syncs through this module
+    from .facts import fact_key
+
+    merged: dict[str, dict] = {}
+    for facts in fact_lists:
+        for fact in facts:
+            merged[fact_key(FactType(fact["type"]), fact["value"])] = fact
+    result = await sync_user_facts(user_id, list(merged.values()))
+    if result.get("status") == "error":
+        raise WriteError(result.get("error", "sync failed"))
+
+
+writer = WriteBehindQueue()
+writer.register("conversation", _flush_conversations)
+writer.register("facts", _flush_facts)
+
+
+async def queue_conversation(
+    user_id: str,
+    session_id: str,
+    user_message: str,
+    assistant_response: str
+) -> None:
+    """Queue a conversation exchange for storage in memory."""
+    await writer.submit("conversation", user_id, {
+        "session_id": session_id,
+        "user_message": user_message,
+        "assistant_response": assistant_response,
+    })
+
+
+async def queue_fact_sync(user_id: str, facts: list[dict]) -> None:
+    """Queue user facts for sync to the ZEP knowledge graph."""
+    await writer.submit("facts", user_id, facts)
@@ -4,6 +4,11 @@ import os
 import httpx
 from typing import Optional
 
+from .article_index import article_indexes
+from .cache import normalize_query
+from .clients import UpstreamConfig, registry
+from .metrics import track_upstream
+from .shared_state import shared_cache
 
 ZEP_API_URL = os.getenv("ZEP_API_URL", "https://api.getzep.com/api/v2")
 ZEP_API_KEY = os.getenv("ZEP_API_KEY", "")
@@ -13,6 +18,26 @@ RELOCATION_GRAPH_ID = os.getenv("ZEP_RELOCATION_GRAPH_ID", "")
 PLACEMENT_GRAPH_ID = os.getenv("ZEP_PLACEMENT_GRAPH_ID", "")
 USERS_GRAPH_ID = os.getenv("ZEP_USERS_GRAPH_ID", "")
 
+# Queries used to enumerate articles when building the local article index
+ARTICLE_SEED_QUERIES = {
+    "relocation": os.getenv(
+        "ARTICLE_SEED_QUERIES_RELOCATION",
+        "visa,residency,cost of living,healthcare,taxes,housing,schools,"
+        "retirement abroad,digital nomad,moving abroad,banking,language",
+    ).split(","),
+    "placement": os.getenv(
+        "ARTICLE_SEED_QUERIES_PLACEMENT",
+        "jobs,work permit,salary,remote work,resume,interview,career,"
+        "hiring,skills,relocation package,recruiters,contracts",
+    ).split(","),
+}
+ARTICLE_FETCH_LIMIT = int(os.getenv("ARTICLE_FETCH_LIMIT", "100"))
+
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "10000"))
+GRAPH_CACHE_TTL = float(os.getenv("GRAPH_CACHE_TTL", "600"))
+USER_GRAPH_CACHE_SIZE = int(os.getenv("USER_GRAPH_CACHE_SIZE", "10000"))
+USER_GRAPH_CACHE_TTL = float(os.getenv("USER_GRAPH_CACHE_TTL", "120"))
+
 
 def get_headers() -> dict:
     """Get headers for ZEP API requests."""
@@ -22,27 +47,56 @@ def get_headers() -> dict:
     }
 
 
+UPSTREAM = "zep"
+registry.register(UpstreamConfig(UPSTREAM, ZEP_API_URL, headers=get_headers()))
+
+# Search results per (graph, normalized query); graph content is shared across
+# users, so popular questions are served from here for everyone.
+graph_cache = shared_cache("graph_search", GRAPH_CACHE_SIZE, GRAPH_CACHE_TTL)
+
+
+# A user's own graph, invalidated whenever we write to it
+user_graph_cache = shared_cache("user_graph", USER_GRAPH_CACHE_SIZE, USER_GRAPH_CACHE_TTL)
+
+
+def user_graph_tag(user_id: str) -> str:
+    """Cache tag for a user's graph."""
+    return f"user_graph:{user_id}"
+
+
+def graph_tag(graph_id: str) -> str:
+    """Cache tag for every search against a graph."""
+    return f"graph:{graph_id}"
+
+
 async def search_graph(graph_id: str, query: str, limit: int = 10) -> list[dict]:
     """Search a ZEP knowledge graph."""
     if not ZEP_API_KEY or not graph_id:
         return []
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{ZEP_API_URL}/graphs/{graph_id}/search",
-                json={
-                    "query": query,
-                    "limit": limit
-                },
-                headers=get_headers(),
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("results", [])
-        except httpx.HTTPError:
-            return []
+    try:
+        return await graph_cache.get_or_load(
+            (graph_id, normalize_query(query), limit),
+            lambda: _search_graph(graph_id, query, limit),
+            tags=(graph_tag(graph_id),),
+        )
+    except httpx.HTTPError:
+        return []
+
+
+async def _search_graph(graph_id: str, query: str, limit: int) -> list[dict]:
+    with track_upstream(UPSTREAM, "search"):
+        response = await registry.request(
+            UPSTREAM, "POST", f"/graphs/{graph_id}/search",
+            operation="search",
+            hedge=True,
+            json={
+                "query": query,
+                "limit": limit
+            },
+        )
+    data = response.json()
+    return data.get("results", [])
 
 
 async def search_relocation_content(query: str, limit: int = 5) -> list[dict]:
@@ -60,17 +114,45 @@ async def get_user_graph(user_id: str) -> Optional[dict]:
     if not ZEP_API_KEY or not USERS_GRAPH_ID:
         return None
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{ZEP_API_URL}/graphs/{USERS_GRAPH_ID}/users/{user_id}",
-                headers=get_headers(),
-                timeout=30.0
+    try:
+        return await load_user_graph(user_id)
+    except httpx.HTTPError:
+        return None
+
+
+async def load_user_graph(user_id: str) -> dict | None:
+    """Get a user's graph through the cache; raises on upstream errors."""
+    return await user_graph_cache.get_or_load(
+        user_id, lambda: _get_user_graph(user_id), tags=(user_graph_tag(user_id),)
+    )
+
+
+async def _get_user_graph(user_id: str) -> dict | None:
+    """Fetch a user's graph; None if the user has none yet, raises on other errors."""
+    try:
+        with track_upstream(UPSTREAM, "get_user"):
+            response = await registry.request(
+                UPSTREAM, "GET", f"/graphs/{USERS_GRAPH_ID}/users/{user_id}",
+                operation="get_user",
+                hedge=True,
             )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError:
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
             return None
+        raise
+    return response.json()
+
+
+async def get_user_facts(user_id: str) -> list[str]:
+    """Get the facts in a user's graph as "type: value" lines."""
+    graph = await get_user_graph(user_id)
+    if not graph:
+        return []
+    return [
+        f"{fact.get('type', 'fact')}: {fact.get('value', '')}"
+        if isinstance(fact, dict) else str(fact)
+        for fact in graph.get("facts", [])
+    ]
 
 
 async def sync_user_facts(user_id: str, facts: list[dict]) -> dict:
@@ -78,19 +160,21 @@ async def sync_user_facts(user_id: str, facts: list[dict]) -> dict:
     if not ZEP_API_KEY or not USERS_GRAPH_ID:
         return {"status": "skipped", "reason": "ZEP not configured"}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            # Add facts as nodes/edges in the user's graph
-            response = await client.post(
-                f"{ZEP_API_URL}/graphs/{USERS_GRAPH_ID}/users/{user_id}/facts",
+    try:
+        # Add facts as nodes/edges in the user's graph
+        with track_upstream(UPSTREAM, "sync_facts"):
+            response = await registry.request(
+                UPSTREAM, "POST", f"/graphs/{USERS_GRAPH_ID}/users/{user_id}/facts",
+                kind="write",
+                operation="sync_facts",
                 json={"facts": facts},
-                headers=get_headers(),
-                timeout=30.0
             )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            return {"status": "error", "error": str(e)}
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        await graph_cache.ainvalidate(graph_tag(USERS_GRAPH_ID))
+        await user_graph_cache.ainvalidate(user_graph_tag(user_id))
 
 
 async def add_memory_to_graph(user_id: str, content: str, metadata: Optional[dict] = None) -> dict:
@@ -98,41 +182,70 @@ async def add_memory_to_graph(user_id: str, content: str, metadata: Optional[dic
     if not ZEP_API_KEY or not USERS_GRAPH_ID:
         return {"status": "skipped", "reason": "ZEP not configured"}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{ZEP_API_URL}/graphs/{USERS_GRAPH_ID}/users/{user_id}/memory",
+    try:
+        with track_upstream(UPSTREAM, "add_memory"):
+            response = await registry.request(
+                UPSTREAM, "POST", f"/graphs/{USERS_GRAPH_ID}/users/{user_id}/memory",
+                kind="write",
+                operation="add_memory",
                 json={
                     "content": content,
                     "metadata": metadata or {}
                 },
-                headers=get_headers(),
-                timeout=30.0
             )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            return {"status": "error", "error": str(e)}
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        await graph_cache.ainvalidate(graph_tag(USERS_GRAPH_ID))
+        await user_graph_cache.ainvalidate(user_graph_tag(user_id))
+
+
+def _to_article(result: dict) -> dict:
+    """Transform a graph search result into an article recommendation."""
+    return {
+        "id": result.get("id", ""),
+        "title": result.get("title", ""),
+        "slug": result.get("slug", ""),
+        "summary": result.get("summary", ""),
+        "relevance_score": result.get("score", 0.0),
+        "tags": result.get("tags", [])
+    }
+
+
+async def fetch_articles(graph_type: str) -> list[dict]:
+    """Collect every article reachable from the seed queries for a graph type.
+
+    Used to build the local article index, not on the request path.
+    """
+    graph_id = PLACEMENT_GRAPH_ID if graph_type == "placement" else RELOCATION_GRAPH_ID
+    if not ZEP_API_KEY or not graph_id:
+        return []
+
+    articles: dict[str, dict] = {}
+    for query in ARTICLE_SEED_QUERIES[graph_type]:
+        try:
+            results = await _search_graph(graph_id, query, ARTICLE_FETCH_LIMIT)
+        except httpx.HTTPError:
+            continue
+        for result in results:
+            if result.get("type") == "article":
+                article = _to_article(result)
+                articles[article["id"] or article["slug"]] = article
+    return list(articles.values())
 
 
 async def get_article_recommendations(user_id: str, query: str, graph_type: str = "relocation") -> list[dict]:
     """Get article recommendations based on user context and query."""
+    # Served in-process from the local index when it has been built
+    index = article_indexes.get(graph_type)
+    if index is not None:
+        return index.search(query)
+
     if graph_type == "placement":
         results = await search_placement_content(query)
     else:
         results = await search_relocation_content(query)
 
     # Transform results to article recommendations
-    articles = []
-    for result in results:
-        if result.get("type") == "article":
-            articles.append({
-                "id": result.get("id", ""),
-                "title": result.get("title", ""),
-                "slug": result.get("slug", ""),
-                "summary": result.get("summary", ""),
-                "relevance_score": result.get("score", 0.0),
-                "tags": result.get("tags", [])
-            })
-
-    return articles
+    return [_to_article(result) for result in results if result.get("type") == "article"]
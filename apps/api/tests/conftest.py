@@ -0,0 +1,10 @@
+"""Shared test setup.
+
+src.agents builds its models from GEMINI_API_KEY at import time, so a
+placeholder is set before any test module imports the app. No test calls
+a model or an upstream service.
+"""
+
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
@@ -0,0 +1,152 @@
+"""Limiter: priority handoff, queue limits, timeouts and cancellation."""
+
+import asyncio
+
+import pytest
+
+from src.admission import (
+    BACKGROUND,
+    INTERACTIVE,
+    Limiter,
+    Overloaded,
+    lane,
+    route_lane,
+)
+from src.resilience import deadline
+
+
+def waiter(limiter: Limiter, name: str, order: list[str], in_lane: str = INTERACTIVE):
+    """Start a task that takes a slot in a lane and records when it got it."""
+
+    async def run() -> None:
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0)
+
+    with lane(in_lane):
+        return asyncio.create_task(run())
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_slots_up_to_the_limit_are_immediate():
+    limiter = Limiter("test", limit=2, max_queue=4)
+    async with limiter.slot(), limiter.slot():
+        assert limiter.active == 2
+        assert limiter.queued() == 0
+    assert limiter.active == 0
+
+
+async def test_interactive_waiters_go_before_background():
+    limiter = Limiter("test", limit=1, max_queue=8)
+    order: list[str] = []
+    async with limiter.slot():
+        tasks = [
+            waiter(limiter, "bg1", order, BACKGROUND),
+            waiter(limiter, "ui1", order),
+            waiter(limiter, "bg2", order, BACKGROUND),
+            waiter(limiter, "ui2", order),
+        ]
+        await settle()
+        assert limiter.queued(INTERACTIVE) == 2
+        assert limiter.queued(BACKGROUND) == 2
+    await asyncio.gather(*tasks)
+    assert order == ["ui1", "ui2", "bg1", "bg2"]
+    assert limiter.active == 0
+    assert limiter.queued() == 0
+
+
+async def test_new_calls_queue_behind_waiters():
+    limiter = Limiter("test", limit=1, max_queue=8)
+    order: list[str] = []
+    async with limiter.slot():
+        first = waiter(limiter, "first", order)
+        await settle()
+    # The released slot was handed to the waiter, not left free for newcomers
+    assert limiter.active == 1
+    await asyncio.gather(first, waiter(limiter, "second", order))
+    assert order == ["first", "second"]
+
+
+async def test_cancelled_waiter_is_skipped():
+    limiter = Limiter("test", limit=1, max_queue=8)
+    order: list[str] = []
+    async with limiter.slot():
+        gone = waiter(limiter, "gone", order)
+        kept = waiter(limiter, "kept", order)
+        await settle()
+        gone.cancel()
+        await settle()
+        assert limiter.queued() == 1
+    await kept
+    assert gone.cancelled()
+    assert order == ["kept"]
+    assert limiter.active == 0
+
+
+async def test_waiter_cancelled_after_handoff_passes_the_slot_on():
+    limiter = Limiter("test", limit=1, max_queue=8)
+    order: list[str] = []
+    async with limiter.slot():
+        gone = waiter(limiter, "gone", order)
+        kept = waiter(limiter, "kept", order)
+        await settle()
+    # The slot is handed to "gone", which is cancelled before it runs
+    gone.cancel()
+    await kept
+    assert order == ["kept"]
+    assert limiter.active == 0
+
+
+async def test_wait_times_out():
+    limiter = Limiter("test", limit=1, max_queue=8, max_wait=0.01)
+    async with limiter.slot():
+        with pytest.raises(Overloaded) as raised:
+            async with limiter.slot():
+                pass
+        assert limiter.queued() == 0
+    assert raised.value.status_code == 503
+    assert limiter.active == 0
+
+
+async def test_wait_is_bounded_by_the_deadline():
+    limiter = Limiter("test", limit=1, max_queue=8, max_wait=10)
+    async with limiter.slot():
+        with deadline(0.01), pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+
+
+async def test_full_queue_rejects_straight_away():
+    limiter = Limiter("test", limit=1, max_queue=2)
+    order: list[str] = []
+    async with limiter.slot():
+        tasks = [waiter(limiter, str(i), order) for i in range(2)]
+        await settle()
+        with pytest.raises(Overloaded):
+            limiter.admit(INTERACTIVE)
+        with lane(BACKGROUND), pytest.raises(Overloaded) as raised:
+            async with limiter.slot():
+                pass
+        assert raised.value.status_code == 429
+    await asyncio.gather(*tasks)
+
+
+async def test_background_only_fills_its_share():
+    limiter = Limiter("test", limit=1, max_queue=4)
+    order: list[str] = []
+    async with limiter.slot():
+        tasks = [waiter(limiter, f"bg{i}", order, BACKGROUND) for i in range(2)]
+        await settle()
+        with pytest.raises(Overloaded):
+            limiter.admit(BACKGROUND)
+        limiter.admit(INTERACTIVE)
+    await asyncio.gather(*tasks)
+
+
+def test_route_lane():
+    assert route_lane("/extract-facts/batch") == BACKGROUND
+    assert route_lane("/chat") == INTERACTIVE
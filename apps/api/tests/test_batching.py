@@ -0,0 +1,123 @@
+"""MicroBatcher: batching by size and time, errors, and shutdown."""
+
+import asyncio
+
+import pytest
+
+from src.batching import MicroBatcher
+
+
+class Recorder:
+    """A batch handler that doubles its items and records each batch."""
+
+    def __init__(self, delay: float = 0.0):
+        self.batches: list[list[int]] = []
+        self.delay = delay
+
+    async def __call__(self, items: list[int]) -> list[int]:
+        self.batches.append(items)
+        await asyncio.sleep(self.delay)
+        return [item * 2 for item in items]
+
+
+async def started(handler, max_size: int = 4, max_wait: float = 0.05) -> MicroBatcher:
+    batcher = MicroBatcher("test", handler, max_size, max_wait)
+    await batcher.start()
+    return batcher
+
+
+async def test_inline_when_not_running():
+    handler = Recorder()
+    batcher = MicroBatcher("test", handler, 4, 0.05)
+    assert await batcher.submit(3) == 6
+    assert handler.batches == [[3]]
+
+
+async def test_full_batch_dispatches_without_waiting():
+    handler = Recorder()
+    batcher = await started(handler, max_size=3, max_wait=10)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(i) for i in range(3))), timeout=1
+    )
+    assert results == [0, 2, 4]
+    assert handler.batches == [[0, 1, 2]]
+    await batcher.stop()
+
+
+async def test_partial_batch_dispatches_after_max_wait():
+    handler = Recorder()
+    batcher = await started(handler, max_size=10, max_wait=0.02)
+    assert await asyncio.gather(batcher.submit(1), batcher.submit(2)) == [2, 4]
+    assert handler.batches == [[1, 2]]
+    await batcher.stop()
+
+
+async def test_handler_error_reaches_every_caller():
+    async def failing(items):
+        raise RuntimeError("model down")
+
+    batcher = await started(failing)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    await batcher.stop()
+
+
+async def test_wrong_result_count_is_an_error():
+    async def short(items):
+        return items[:1]
+
+    batcher = await started(short)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    await batcher.stop()
+
+
+async def test_stop_handles_the_batch_being_collected():
+    handler = Recorder()
+    batcher = await started(handler, max_size=10, max_wait=10)
+    submitted = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+    await asyncio.sleep(0.01)  # the worker has taken them off the queue
+
+    await asyncio.wait_for(batcher.stop(), timeout=1)
+    assert [task.result() for task in submitted] == [0, 2, 4]
+    assert handler.batches == [[0, 1, 2]]
+
+
+async def test_stop_waits_for_dispatched_batches():
+    handler = Recorder(delay=0.05)
+    batcher = await started(handler, max_size=2)
+    submitted = [asyncio.create_task(batcher.submit(i)) for i in range(2)]
+    await asyncio.sleep(0.01)
+    await batcher.stop()
+    assert all(task.done() for task in submitted)
+
+
+async def test_cancelled_worker_still_dispatches_its_items():
+    handler = Recorder()
+    batcher = await started(handler, max_size=10, max_wait=10)
+    submitted = [asyncio.create_task(batcher.submit(i)) for i in range(2)]
+    await asyncio.sleep(0.01)
+    batcher._worker.cancel()
+    assert await asyncio.wait_for(asyncio.gather(*submitted), timeout=1) == [0, 2]
+
+
+async def test_submit_after_stop_runs_inline():
+    handler = Recorder()
+    batcher = await started(handler)
+    await batcher.stop()
+    assert not batcher.running
+    assert await batcher.submit(5) == 10
+
+
+async def test_cancelled_caller_is_left_out_of_the_batch():
+    handler = Recorder()
+    batcher = await started(handler, max_size=10, max_wait=0.05)
+    gone = asyncio.create_task(batcher.submit(1))
+    kept = asyncio.create_task(batcher.submit(2))
+    await asyncio.sleep(0)
+    gone.cancel()
+    assert await kept == 4
+    with pytest.raises(asyncio.CancelledError):
+        await gone
+    assert handler.batches == [[2]]
+    await batcher.stop()
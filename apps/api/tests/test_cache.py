@@ -0,0 +1,133 @@
+"""AsyncCache: single-flight loading, invalidation, TTL and LRU."""
+
+import asyncio
+
+import pytest
+
+from src.cache import AsyncCache, normalize_query
+
+
+class Loader:
+    """Counts calls and returns a value once released."""
+
+    def __init__(self, value="value"):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_hit_after_load():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader()
+    loader.release.set()
+    assert await cache.get_or_load("k", loader) == "value"
+    assert await cache.get_or_load("k", loader) == "value"
+    assert loader.calls == 1
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader()
+    tasks = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(5)]
+    await settle()
+    loader.release.set()
+    assert await asyncio.gather(*tasks) == ["value"] * 5
+    assert loader.calls == 1
+
+
+async def test_load_error_reaches_every_caller_and_is_not_cached():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader(RuntimeError("boom"))
+    tasks = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(3)]
+    await settle()
+    loader.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert loader.calls == 1
+    assert cache.get("k") == (False, None)
+
+
+async def test_cancelled_leader_hands_the_load_to_a_waiter():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader()
+    leader = asyncio.create_task(cache.get_or_load("k", loader))
+    await settle()
+    follower = asyncio.create_task(cache.get_or_load("k", loader))
+    await settle()
+    leader.cancel()
+    await settle()
+    loader.release.set()
+    assert await follower == "value"
+    assert leader.cancelled()
+    assert loader.calls == 2
+
+
+async def test_cancelled_waiter_leaves_the_load_running():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader()
+    leader = asyncio.create_task(cache.get_or_load("k", loader))
+    await settle()
+    follower = asyncio.create_task(cache.get_or_load("k", loader))
+    await settle()
+    follower.cancel()
+    loader.release.set()
+    assert await leader == "value"
+    with pytest.raises(asyncio.CancelledError):
+        await follower
+    assert loader.calls == 1
+
+
+async def test_invalidation_during_a_load_is_not_overwritten():
+    cache = AsyncCache("test", 10, 60)
+    loader = Loader()
+    task = asyncio.create_task(cache.get_or_load("k", loader, tags=("user:1",)))
+    await settle()
+    cache.invalidate("user:1")
+    loader.release.set()
+    assert await task == "value"
+    assert cache.get("k") == (False, None)
+
+
+async def test_invalidate_drops_tagged_entries():
+    cache = AsyncCache("test", 10, 60)
+    cache.set("a", 1, tags=("user:1",))
+    cache.set("b", 2, tags=("user:1", "user:2"))
+    cache.set("c", 3, tags=("user:2",))
+    assert cache.invalidate("user:1") == 2
+    assert cache.get("c") == (True, 3)
+    assert cache.invalidate("user:2") == 1
+    assert len(cache) == 0
+
+
+def test_entries_expire():
+    cache = AsyncCache("test", 10, -1)
+    cache.set("k", 1)
+    assert cache.get("k") == (False, None)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = AsyncCache("test", 2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_normalize_query():
+    assert normalize_query("  Moving to   LISBON? ") == "moving to lisbon"
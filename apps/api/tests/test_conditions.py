@@ -0,0 +1,112 @@
+"""Materialized UserConditions: incremental merges, rebuilds and capped sessions."""
+
+import pytest
+
+from src import conditions
+from src.conditions import get_user_conditions, materialized, merge_conditions
+from src.schemas import BudgetRange, DestinationPreference, UserConditions
+from src.sessions import SESSION_MAX_TURNS, Session
+
+
+class Extractor:
+    """Stands in for the model, recording which turns each call was given."""
+
+    def __init__(self):
+        self.rebuilds: list[list[str]] = []
+        self.updates: list[list[str]] = []
+
+    async def rebuild(self, messages: list[dict]) -> UserConditions:
+        self.rebuilds.append([m["content"] for m in messages])
+        return UserConditions(timeline=messages[-1]["content"])
+
+    async def update(self, current: UserConditions, messages: list[dict]) -> UserConditions:
+        self.updates.append([m["content"] for m in messages])
+        return UserConditions(timeline=messages[-1]["content"])
+
+
+@pytest.fixture
+def extractor(monkeypatch) -> Extractor:
+    extractor = Extractor()
+    monkeypatch.setattr(conditions, "extract_user_conditions", extractor.rebuild)
+    monkeypatch.setattr(conditions, "extract_conditions_update", extractor.update)
+    materialized.clear()
+    return extractor
+
+
+def turns(start: int, stop: int) -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"}
+        for i in range(start, stop)
+    ]
+
+
+async def test_only_new_turns_are_merged(extractor):
+    history = turns(0, 4)
+    await get_user_conditions("u1", "s1", history)
+    history += turns(4, 6)
+    result = await get_user_conditions("u1", "s1", history)
+    assert extractor.rebuilds == [[f"turn {i}" for i in range(4)]]
+    assert extractor.updates == [["turn 4", "turn 5"]]
+    assert result.timeline == "turn 5"
+
+
+async def test_unchanged_history_skips_the_model(extractor):
+    history = turns(0, 4)
+    await get_user_conditions("u1", "s1", history)
+    await get_user_conditions("u1", "s1", history)
+    assert len(extractor.rebuilds) == 1
+    assert extractor.updates == []
+
+
+async def test_edited_history_is_rebuilt(extractor):
+    await get_user_conditions("u1", "s1", turns(0, 4))
+    edited = turns(0, 2) + [{"role": "user", "content": "something else"}]
+    await get_user_conditions("u1", "s1", edited)
+    assert len(extractor.rebuilds) == 2
+    assert extractor.updates == []
+
+
+async def test_due_rebuild_runs_even_without_new_turns(extractor, monkeypatch):
+    history = turns(0, 4)
+    await get_user_conditions("u1", "s1", history)
+    monkeypatch.setattr(conditions, "CONDITIONS_REBUILD_INTERVAL", 0)
+    await get_user_conditions("u1", "s1", history)
+    assert len(extractor.rebuilds) == 2
+
+
+async def test_new_turns_past_the_session_cap_are_merged(extractor):
+    session = Session("s1", "u1")
+    for turn in turns(0, SESSION_MAX_TURNS + 10):
+        session.add(turn["role"], turn["content"])
+    await get_user_conditions("u1", "s1", session.messages)
+    assert len(session.messages) == SESSION_MAX_TURNS
+
+    for turn in turns(SESSION_MAX_TURNS + 10, SESSION_MAX_TURNS + 12):
+        session.add(turn["role"], turn["content"])
+    result = await get_user_conditions("u1", "s1", session.messages)
+    assert extractor.updates == [
+        [f"turn {SESSION_MAX_TURNS + 10}", f"turn {SESSION_MAX_TURNS + 11}"]
+    ]
+    assert result.timeline == f"turn {SESSION_MAX_TURNS + 11}"
+
+
+def test_merge_keeps_fields_the_update_left_out():
+    current = UserConditions(
+        destination_preferences=[
+            DestinationPreference(country="Portugal", priority=1, reasons=["climate"])
+        ],
+        budget=BudgetRange(monthly_min=1000, monthly_max=2000),
+        timeline="next year",
+    )
+    update = UserConditions(
+        destination_preferences=[
+            DestinationPreference(country="portugal", priority=2, reasons=["taxes"])
+        ],
+        budget=BudgetRange(monthly_max=3000),
+    )
+    merged = merge_conditions(current, update)
+    [destination] = merged.destination_preferences
+    assert (destination.country, destination.priority) == ("Portugal", 2)
+    assert destination.reasons == ["climate", "taxes"]
+    assert (merged.budget.monthly_min, merged.budget.monthly_max) == (1000, 3000)
+    assert merged.timeline == "next year"
@@ -0,0 +1,91 @@
+"""HITL confirmation stores: server-assigned ids, paging and the memory cap."""
+
+from datetime import UTC, datetime
+
+import pytest
+
+from src import confirmations, shared_state
+from src.confirmations import ConfirmationStore, SharedConfirmationStore
+from src.schemas import FactType, PendingConfirmation
+
+
+def confirmation(user_id: str = "u1", value: str = "Lisbon", **fields) -> PendingConfirmation:
+    return PendingConfirmation(
+        user_id=user_id,
+        fact_type=FactType.CURRENT_LOCATION,
+        new_value=value,
+        confidence=0.6,
+        context="said so",
+        **fields,
+    )
+
+
+@pytest.fixture
+async def shared_store(tmp_path, monkeypatch) -> SharedConfirmationStore:
+    state = shared_state.SharedState(str(tmp_path / "state.db"))
+    monkeypatch.setattr(shared_state, "state", state)
+    store = SharedConfirmationStore()
+    await store.start()
+    yield store
+    state.close()
+
+
+@pytest.fixture(params=["memory", "shared"])
+async def store(request, shared_store) -> ConfirmationStore:
+    return ConfirmationStore() if request.param == "memory" else shared_store
+
+
+async def test_server_assigns_id_status_and_timestamp(store):
+    sent = confirmation(
+        id="client-id", status="accepted", created_at=datetime(2001, 1, 1, tzinfo=UTC)
+    )
+    created = await store.create(sent)
+    assert created.id != "client-id"
+    assert created.status == "pending"
+    assert created.created_at.year > 2001
+
+
+async def test_pages_newest_first_with_cursor(store):
+    for i in range(5):
+        await store.create(confirmation(value=f"city {i}"))
+    await store.create(confirmation(user_id="someone else"))
+
+    page, cursor = await store.list_for_user("u1", limit=3)
+    rest, end = await store.list_for_user("u1", limit=3, cursor=cursor)
+    assert [c.new_value for c in page + rest] == [f"city {i}" for i in range(4, -1, -1)]
+    assert end is None
+
+
+async def test_resolve_checks_owner_and_status(store):
+    created = await store.create(confirmation())
+    assert await store.resolve(created.id, "someone else", "accepted") is None
+    resolved = await store.resolve(created.id, "u1", "accepted")
+    assert resolved is not None and resolved.status == "accepted"
+    assert await store.resolve(created.id, "u1", "rejected") is None
+    assert await store.list_for_user("u1") == ([], None)
+
+
+async def test_memory_store_evicts_resolved_before_pending():
+    store = ConfirmationStore(maxsize=3)
+    first, second = await store.create_many([confirmation(value="a"), confirmation(value="b")])
+    await store.resolve(second.id, "u1", "accepted")
+    await store.create_many([confirmation(value="c"), confirmation(value="d")])
+
+    assert len(store._items) == 3
+    assert second.id not in store._items
+    assert first.id in store._items
+
+
+async def test_memory_store_drops_oldest_pending_when_full():
+    store = ConfirmationStore(maxsize=2)
+    created = await store.create_many([confirmation(value=v) for v in "abc"])
+    assert list(store._items) == [c.id for c in created[1:]]
+
+
+def test_cursor_round_trip():
+    created = confirmations._prepare(confirmation())
+    assert confirmations.decode_cursor(confirmations.encode_cursor(created)) == (
+        created.created_at, created.id
+    )
+    with pytest.raises(ValueError):
+        confirmations.decode_cursor("no-separator")
@@ -0,0 +1,45 @@
+"""Diffing extracted facts against a user's known facts."""
+
+from src.facts import diff_facts, fact_key
+from src.schemas import ExtractedFact, FactType
+
+
+def fact(fact_type: FactType, value: str, confirm: bool = False) -> ExtractedFact:
+    return ExtractedFact(type=fact_type, value=value, confidence=0.9, requires_confirmation=confirm)
+
+
+def known(*facts: ExtractedFact) -> dict[str, ExtractedFact]:
+    return {fact_key(f.type, f.value): f for f in facts}
+
+
+def test_classifies_added_changed_unchanged():
+    state = known(fact(FactType.TIMELINE, "Next year"), fact(FactType.LANGUAGE, "English"))
+    delta = diff_facts(state, [
+        fact(FactType.TIMELINE, "next  year"),
+        fact(FactType.LANGUAGE, "Spanish"),
+        fact(FactType.BUDGET_RANGE, "2000 EUR"),
+    ])
+    assert [f.value for f in delta.unchanged] == ["next  year"]
+    assert [(old.value, new.value) for old, new in delta.changed] == [("English", "Spanish")]
+    assert [f.value for f in delta.added] == ["2000 EUR"]
+    assert delta.has_changes
+    assert [f.value for f in delta.facts] == ["next  year", "Spanish", "2000 EUR"]
+
+
+def test_custom_facts_are_keyed_by_value():
+    state = known(fact(FactType.CUSTOM, "Has a dog"))
+    delta = diff_facts(state, [fact(FactType.CUSTOM, "Plays piano")])
+    assert [f.value for f in delta.added] == ["Plays piano"]
+
+
+def test_keeps_the_extractor_confirmation_flag():
+    state = known(fact(FactType.LANGUAGE, "English"), fact(FactType.TIMELINE, "Next year"))
+    delta = diff_facts(state, [
+        fact(FactType.LANGUAGE, "Spanish"),
+        fact(FactType.TIMELINE, "In a month", confirm=True),
+    ])
+    assert [f.value for f in delta.accepted] == ["Spanish"]
+    [pending] = delta.confirmations("u1")
+    assert (pending.user_id, pending.old_value, pending.new_value) == (
+        "u1", "Next year", "In a month"
+    )
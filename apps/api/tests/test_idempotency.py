@@ -0,0 +1,160 @@
+"""IdempotencyStore: one run per key, replays, and abandoned streams."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.responses import JSONResponse, Response, StreamingResponse
+
+from src import idempotency as idempotency_module
+from src.idempotency import IdempotencyStore
+
+
+class Handler:
+    """Counts runs; streams ``chunks``, pausing until ``release`` if told to."""
+
+    def __init__(self, chunks: list[str], wait: bool = False, status: int = 200):
+        self.chunks = chunks
+        self.wait = wait
+        self.status = status
+        self.runs = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def body(self):
+        try:
+            for chunk in self.chunks:
+                if self.wait:
+                    await self.release.wait()
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    async def stream(self) -> Response:
+        self.runs += 1
+        return StreamingResponse(self.body(), status_code=self.status)
+
+    async def json(self) -> Response:
+        self.runs += 1
+        await asyncio.sleep(0.01)
+        return JSONResponse({"run": self.runs}, status_code=self.status)
+
+
+async def read(response: Response) -> bytes:
+    if isinstance(response, StreamingResponse):
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return response.body
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_without_a_key_every_request_runs():
+    store, handler = IdempotencyStore(), Handler([])
+    await store.run("/chat/complete", None, "u1", "fp", handler.json)
+    await store.run("/chat/complete", None, "u1", "fp", handler.json)
+    assert handler.runs == 2
+
+
+async def test_retry_after_completion_is_replayed():
+    store, handler = IdempotencyStore(), Handler([])
+    first = await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    retry = await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    assert handler.runs == 1
+    assert retry.body == first.body
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_concurrent_retry_attaches_to_the_run():
+    store, handler = IdempotencyStore(), Handler([])
+    first, retry = await asyncio.gather(
+        store.run("/chat/complete", "k", "u1", "fp", handler.json),
+        store.run("/chat/complete", "k", "u1", "fp", handler.json),
+    )
+    assert handler.runs == 1
+    assert first.body == retry.body
+
+
+async def test_key_reused_for_another_request_is_rejected():
+    store, handler = IdempotencyStore(), Handler([])
+    await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    with pytest.raises(HTTPException) as raised:
+        await store.run("/chat/complete", "k", "u1", "other", handler.json)
+    assert raised.value.status_code == 422
+
+
+async def test_keys_are_scoped_per_user():
+    store, handler = IdempotencyStore(), Handler([])
+    await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    await store.run("/chat/complete", "k", "u2", "fp", handler.json)
+    assert handler.runs == 2
+
+
+async def test_error_responses_are_not_stored():
+    store, handler = IdempotencyStore(), Handler([], status=500)
+    await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    await store.run("/chat/complete", "k", "u1", "fp", handler.json)
+    assert handler.runs == 2
+
+
+async def test_stream_is_replayed_to_an_attached_retry():
+    store, handler = IdempotencyStore(), Handler(["a", "b", "c"], wait=True)
+    first = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    reading = asyncio.create_task(read(first))
+    await settle()
+    retry = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    handler.release.set()
+    assert await reading == b"abc"
+    assert await read(retry) == b"abc"
+    await settle()
+    replayed = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    assert replayed.body == b"abc"
+    assert handler.runs == 1
+
+
+async def test_abandoned_stream_is_cancelled(monkeypatch):
+    monkeypatch.setattr(idempotency_module, "IDEMPOTENCY_ABANDON_GRACE", 0.01)
+    store, handler = IdempotencyStore(), Handler(["a", "b"], wait=True)
+    response = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    body = response.body_iterator
+    reading = asyncio.create_task(body.__anext__())
+    await settle()
+    reading.cancel()
+    await asyncio.gather(reading, return_exceptions=True)
+    await body.aclose()
+    await asyncio.sleep(0.05)
+    assert handler.cancelled
+    assert not store._inflight
+
+    # Nothing was stored, so a retry runs again
+    handler.release.set()
+    retry = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    assert await read(retry) == b"ab"
+    assert handler.runs == 2
+
+
+async def test_stream_nobody_reads_is_cancelled(monkeypatch):
+    monkeypatch.setattr(idempotency_module, "IDEMPOTENCY_ABANDON_GRACE", 0.01)
+    store, handler = IdempotencyStore(), Handler(["a"], wait=True)
+    await store.run("/chat", "k", "u1", "fp", handler.stream)
+    await asyncio.sleep(0.05)
+    assert handler.cancelled
+    assert not store._inflight
+
+
+async def test_retry_within_the_grace_keeps_the_stream(monkeypatch):
+    monkeypatch.setattr(idempotency_module, "IDEMPOTENCY_ABANDON_GRACE", 0.05)
+    store, handler = IdempotencyStore(), Handler(["a", "b"], wait=True)
+    first = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    await first.body_iterator.aclose()
+    await asyncio.sleep(0.01)
+    retry = await store.run("/chat", "k", "u1", "fp", handler.stream)
+    reading = asyncio.create_task(read(retry))
+    await asyncio.sleep(0.1)
+    handler.release.set()
+    assert await reading == b"ab"
+    assert not handler.cancelled
+    assert handler.runs == 1
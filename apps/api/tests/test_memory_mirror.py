@@ -0,0 +1,70 @@
+"""MemoryMirror: backfill, local search and retrying failed backfills."""
+
+import asyncio
+
+import pytest
+
+from src import memory_mirror as mirror_module
+from src.memory_mirror import MemoryMirror
+
+
+class Remote:
+    """A paged memory listing that can be told to fail."""
+
+    def __init__(self, memories: list[str], fail: bool = False):
+        self.memories = memories
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self, user_id: str, offset: int, limit: int) -> list[str]:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("listing unavailable")
+        return self.memories[offset:offset + limit]
+
+
+@pytest.fixture
+async def mirror(tmp_path):
+    mirror = MemoryMirror(tmp_path / "mirror.db", enabled=True)
+    await mirror.start()
+    yield mirror
+    await mirror.stop()
+
+
+async def finished(mirror: MemoryMirror) -> None:
+    await asyncio.gather(*mirror._tasks)
+
+
+async def test_search_is_local_after_backfill(mirror):
+    assert await mirror.search("u1", "lisbon") is None
+    await mirror.sync("u1", Remote(["Wants to move to Lisbon", "Has two kids"]))
+    await finished(mirror)
+    assert await mirror.search("u1", "lisbon", limit=1) == ["Wants to move to Lisbon"]
+    assert await mirror.search("u2", "lisbon") is None
+
+
+async def test_failed_backfill_waits_before_retrying(mirror, monkeypatch):
+    remote = Remote(["Has two kids"], fail=True)
+    await mirror.sync("u1", remote)
+    await finished(mirror)
+    await mirror.sync("u1", remote)
+    await finished(mirror)
+    assert remote.calls == 1
+
+    monkeypatch.setattr(mirror_module, "MEMORY_MIRROR_RETRY_AFTER", 0)
+    mirror._retry_at.clear()
+    remote.fail = False
+    await mirror.sync("u1", remote)
+    await finished(mirror)
+    assert remote.calls == 2
+    assert await mirror.search("u1", "kids") == ["Has two kids"]
+    assert "u1" not in mirror._retry_at
+
+
+async def test_backfill_pages_through_every_memory(mirror, monkeypatch):
+    monkeypatch.setattr(mirror_module, "MEMORY_MIRROR_PAGE_SIZE", 2)
+    remote = Remote([f"memory {i}" for i in range(5)])
+    await mirror.sync("u1", remote)
+    await finished(mirror)
+    assert remote.calls == 3
+    assert len(await mirror.search("u1", "", limit=10)) == 5
@@ -0,0 +1,163 @@
+"""Circuit breaker probing and hedged calls."""
+
+import asyncio
+
+import pytest
+
+from src.admission import Limiter, UpstreamBusy
+from src.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    hedged,
+)
+
+
+def opened(reset_timeout: float = 0.0) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = opened(reset_timeout=60)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = opened()
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = opened()
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.allow()
+    breaker.allow()
+
+
+def test_probe_failure_reopens():
+    breaker = opened()
+    breaker.reset_timeout = 60
+    breaker.opened_at -= 60
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_release_frees_the_probe():
+    breaker = opened()
+    breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    breaker.allow()
+
+
+class Upstream:
+    """Answers calls in order with the given delays, failing where told to."""
+
+    def __init__(self, *delays: float, fail: tuple[int, ...] = ()):
+        self.delays = list(delays)
+        self.fail = fail
+        self.calls = 0
+        self.cancelled: list[int] = []
+
+    async def __call__(self) -> int:
+        index = self.calls
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        if index in self.fail:
+            raise RuntimeError(f"call {index} failed")
+        return index
+
+
+async def test_fast_primary_is_not_hedged():
+    upstream = Upstream(0.0)
+    assert await hedged(upstream, 0.05, "test", "read") == 0
+    assert upstream.calls == 1
+
+
+async def test_hedge_wins_and_primary_is_cancelled():
+    upstream = Upstream(1.0, 0.0)
+    assert await hedged(upstream, 0.01, "test", "read") == 1
+    await asyncio.sleep(0)
+    assert upstream.cancelled == [0]
+
+
+async def test_failed_hedge_waits_for_primary():
+    upstream = Upstream(0.05, 0.0, fail=(1,))
+    assert await hedged(upstream, 0.01, "test", "read") == 0
+
+
+async def test_both_failing_raises_the_primary_error():
+    upstream = Upstream(0.05, 0.0, fail=(0, 1))
+    with pytest.raises(RuntimeError, match="call 0"):
+        await hedged(upstream, 0.01, "test", "read")
+
+
+async def test_cancelling_before_the_hedge_cancels_the_primary():
+    upstream = Upstream(1.0)
+    task = asyncio.ensure_future(hedged(upstream, 0.5, "test", "read"))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert upstream.cancelled == [0]
+
+
+async def test_cancelling_after_the_hedge_cancels_both():
+    upstream = Upstream(1.0, 1.0)
+    task = asyncio.ensure_future(hedged(upstream, 0.01, "test", "read"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert sorted(upstream.cancelled) == [0, 1]
+
+
+async def test_hedge_needs_a_spare_slot():
+    limiter = Limiter("test", limit=1, max_queue=4, error=UpstreamBusy)
+    upstream = Upstream(0.05, 0.0)
+
+    async def spare():
+        async with limiter.spare_slot():
+            return await upstream()
+
+    async with limiter.slot():
+        assert await hedged(upstream, 0.01, "test", "read", spare) == 0
+    assert upstream.calls == 1
+    assert limiter.active == 0
+
+
+async def test_hedge_holds_its_spare_slot():
+    limiter = Limiter("test", limit=2, max_queue=4, error=UpstreamBusy)
+    upstream = Upstream(1.0, 0.05)
+    seen: list[int] = []
+
+    async def spare():
+        async with limiter.spare_slot():
+            seen.append(limiter.active)
+            return await upstream()
+
+    async with limiter.slot():
+        assert await hedged(upstream, 0.01, "test", "read", spare) == 1
+    assert seen == [2]
+    assert limiter.active == 0
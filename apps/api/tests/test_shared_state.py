@@ -0,0 +1,56 @@
+"""SharedCache and LocalCache behind the async API of shared_cache."""
+
+import pytest
+
+from src.shared_state import LocalCache, SharedCache, SharedState
+
+
+@pytest.fixture
+async def shared(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    await state.start()
+    yield state
+    state.close()
+
+
+@pytest.fixture(params=["local", "shared"])
+def cache(request, shared):
+    if request.param == "local":
+        return LocalCache("test", 10, 60)
+    return SharedCache("test", 10, 60, shared)
+
+
+async def test_set_get_invalidate(cache):
+    await cache.aset("a", {"value": 1}, tags=("user:1",))
+    await cache.aset("b", [2], tags=("user:2",))
+    assert await cache.aget("a") == (True, {"value": 1})
+    assert await cache.ainvalidate("user:1") == 1
+    assert await cache.aget("a") == (False, None)
+    assert await cache.size() == 1
+    await cache.aclear()
+    assert await cache.aget("b") == (False, None)
+
+
+async def test_get_or_load_stores_the_value(cache):
+    async def load():
+        return ["memory"]
+
+    assert await cache.get_or_load("k", load) == ["memory"]
+    assert await cache.aget("k") == (True, ["memory"])
+
+
+async def test_invalidation_reaches_other_workers(shared):
+    one = SharedCache("test", 10, 60, shared)
+    two = SharedCache("test", 10, 60, shared)
+    await one.aset("a", 1, tags=("user:1",))
+    assert await two.aget("a") == (True, 1)
+    await two.ainvalidate("user:1")
+    assert await one.aget("a") == (False, None)
+
+
+def test_shared_cache_has_no_sync_api(shared):
+    cache = SharedCache("test", 10, 60, shared)
+    with pytest.raises(NotImplementedError):
+        cache.get("a")
+    with pytest.raises(NotImplementedError):
+        cache.invalidate("user:1")